@@ -0,0 +1,132 @@
+import math
+from dataclasses import dataclass, field
+from enbio_wifi_machine.common import ProcessLine
+
+ANTOINE_A = 8.14019
+ANTOINE_B = 1810.94
+ANTOINE_C = 244.485
+""" Antoine equation constants of water for 99-374 *C, pressure in mmHg """
+
+MMHG_PER_BAR = 750.0616827
+
+F0_REFERENCE_TEMPERATURE = 121.1
+F0_Z_VALUE = 10.0
+
+
+def saturation_temperature(pressure_bar: float) -> float | None:
+    """ Saturated steam temperature in *C at absolute pressure, None outside of Antoine constants validity """
+    if pressure_bar <= 0:
+        return None
+    temperature = ANTOINE_B / (ANTOINE_A - math.log10(pressure_bar * MMHG_PER_BAR)) - ANTOINE_C
+    return temperature if 99.0 <= temperature <= 374.0 else None
+
+
+def lethality_rate(temperature: float) -> float:
+    """ F0 lethality per minute at temperature, z = 10 *C, reference 121.1 *C """
+    return 10 ** ((temperature - F0_REFERENCE_TEMPERATURE) / F0_Z_VALUE)
+
+
+@dataclass
+class RunningStats:
+    """ Welford's online mean and variance, constant memory """
+    count: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+    minimum: float = math.inf
+    maximum: float = -math.inf
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    def __str__(self):
+        if self.count == 0:
+            return "-"
+        return f"{self.mean:.2f} +- {self.std:.2f} [{self.minimum:.2f}, {self.maximum:.2f}]"
+
+
+@dataclass
+class PhaseStats:
+    phase: int
+    duration: float = 0.0
+    time_above_threshold: float = 0.0
+    f0: float = 0.0
+    t_proc: RunningStats = field(default_factory=RunningStats)
+    p_proc: RunningStats = field(default_factory=RunningStats)
+    saturation_deviation: RunningStats = field(default_factory=RunningStats)
+    """ t_proc minus saturated steam temperature at p_proc, below zero suggests air in chamber, above superheat """
+
+
+class CycleAnalytics:
+    """
+    Streaming statistics of a cycle updated with every sample: per phase Welford statistics of process temperature,
+    pressure and deviation from saturated steam temperature, time above temperature threshold and accumulated F0.
+    Time between samples is assigned to the previous sample (sample and hold), nothing is re-read from file.
+    """
+
+    def __init__(self, temperature_threshold: float = 134.0):
+        self.temperature_threshold = temperature_threshold
+        self.phases: dict[int, PhaseStats] = {}
+        self.f0 = 0.0
+        self._previous: tuple[float, ProcessLine] | None = None
+
+    def add(self, proctime: float, pline: ProcessLine) -> None:
+        if self._previous is not None:
+            self._integrate(proctime - self._previous[0], self._previous[1])
+        self._previous = proctime, pline
+
+        stats = self.phases.setdefault(pline.phase, PhaseStats(pline.phase))
+        t_proc, p_proc = pline.sensors_msrs.t_proc, pline.sensors_msrs.p_proc
+        stats.t_proc.add(t_proc)
+        stats.p_proc.add(p_proc)
+
+        saturation = saturation_temperature(p_proc)
+        if saturation is not None:
+            stats.saturation_deviation.add(t_proc - saturation)
+
+    def _integrate(self, dt: float, pline: ProcessLine) -> None:
+        stats = self.phases[pline.phase]
+        stats.duration += dt
+        if pline.sensors_msrs.t_proc >= self.temperature_threshold:
+            stats.time_above_threshold += dt
+
+        f0 = lethality_rate(pline.sensors_msrs.t_proc) * dt / 60.0
+        stats.f0 += f0
+        self.f0 += f0
+
+    def gap(self) -> None:
+        """ Samples are missing (e.g. reconnecting), time until next sample is not integrated """
+        self._previous = None
+
+    @property
+    def current_phase(self) -> PhaseStats | None:
+        return None if self._previous is None else self.phases[self._previous[1].phase]
+
+    def live(self) -> str:
+        phase = self.current_phase
+        if phase is None:
+            return f"F0 {self.f0:.2f} min"
+        return (f"F0 {self.f0:.2f} min, phase {phase.phase} {phase.duration:.0f} s, t_proc {phase.t_proc}, "
+                f"above {self.temperature_threshold} *C {phase.time_above_threshold:.0f} s")
+
+    def summary(self) -> str:
+        lines = [f"{'Phase':>5}{'Time s':>8}{'Above s':>9}{'F0':>8}  {'ProcTempr *C':<34}{'ProcPress bar':<30}"
+                 f"Sat. deviation *C"]
+        for stats in self.phases.values():
+            lines.append(f"{stats.phase:>5}{stats.duration:>8.0f}{stats.time_above_threshold:>9.0f}{stats.f0:>8.2f}  "
+                         f"{str(stats.t_proc):<34}{str(stats.p_proc):<30}{stats.saturation_deviation}")
+        lines.append(f"Total F0 {self.f0:.2f} min, above {self.temperature_threshold} *C "
+                     f"{sum(stats.time_above_threshold for stats in self.phases.values()):.0f} s")
+        return "\n".join(lines)
@@ -0,0 +1,42 @@
+from enbio_wifi_machine.machine import EnbioWiFiMachine
+from enbio_wifi_machine.scheduler import TransactionScheduler, ScheduledTransport
+from enbio_wifi_machine.transport import ModbusTransport, SerialTransport
+
+
+class ModbusBus:
+    """
+    Single RS-485 link (one USB Serial port handle) shared by many Enbio machines with different slave addresses.
+    Transactions of all slaves go through one TransactionScheduler, so there is no port contention and each
+    slave gets its weighted share of the bus.
+    """
+
+    def __init__(self, port: str, weights: dict[int, int] | None = None, max_rate: float | None = None):
+        self.port = port
+        self.scheduler = TransactionScheduler(weights, max_rate)
+        self._serial = None
+        self._transports: dict[int, ScheduledTransport] = {}
+
+    def _create_transport(self, address: int) -> ModbusTransport:
+        transport = SerialTransport(self.port if self._serial is None else self._serial, address,
+                                    close_port_after_each_call=False)
+        self._serial = transport.instrument.serial
+        return transport
+
+    def transport(self, address: int) -> ScheduledTransport:
+        if address not in self._transports:
+            self._transports[address] = ScheduledTransport(self._create_transport(address), self.scheduler, address)
+        return self._transports[address]
+
+    def machine(self, address: int) -> EnbioWiFiMachine:
+        """ Machine view of one slave on this bus """
+        return EnbioWiFiMachine(address=address, transport=self.transport(address))
+
+    def machines(self, addresses: list[int]) -> dict[int, EnbioWiFiMachine]:
+        return {address: self.machine(address) for address in addresses}
+
+    def set_weight(self, address: int, weight: int) -> None:
+        self.scheduler.weights[address] = weight
+
+    def close(self) -> None:
+        if self._serial is not None:
+            self._serial.close()
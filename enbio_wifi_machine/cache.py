@@ -0,0 +1,149 @@
+import math
+import threading
+import time
+from dataclasses import dataclass
+from enbio_wifi_machine.modbus_registers import ModbusRegister
+from enbio_wifi_machine.transport import ModbusTransport
+
+
+default_ttl_policies = {
+    register: ttl
+    for first, count, ttl in [
+        (ModbusRegister.FIRMWARE_VERSION, 1, math.inf),
+        (ModbusRegister.BOARD_NUM, 1, math.inf),
+        (ModbusRegister.DEVICE_ID, 32, math.inf),
+        (ModbusRegister.SCALE_FACTORS_PRESS_PROC_B, 8, math.inf),
+        (ModbusRegister.SCALE_FACTORS_PRESS_PROC_A, 8, math.inf),
+        (ModbusRegister.DIP_SWITCH, 1, 10.0),
+    ]
+    for register in range(first.value, first.value + count)
+}
+""" TTL in seconds by register. Infinite TTL values change only by our writes or after reboot """
+
+flushing_registers = {ModbusRegister.STM_REBOOT.value, ModbusRegister.USE_DEFAULT_MODBUS_PARAMS.value}
+""" Writing these registers may change any other register """
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    saved_time: float = 0.0
+    """ Estimated bus time saved, hits times mean duration of reads after miss """
+
+    @property
+    def hit_ratio(self) -> float:
+        return self.hits / (self.hits + self.misses) if self.hits + self.misses else 0.0
+
+
+class RegisterCache:
+    """ Values of registers with TTL policy, entries of not listed registers are never stored """
+
+    def __init__(self, policies: dict[int, float] | None = None):
+        self.policies = dict(default_ttl_policies if policies is None else policies)
+        self._entries: dict[int, tuple[int, float]] = {}
+        self._generations: dict[int, int] = {}
+        """ Invalidation count by register, values read before invalidation are not stored """
+        self._flushes = 0
+        self._hits = 0
+        self._misses = 0
+        self._read_time = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> CacheStats:
+        with self._lock:
+            mean_read_time = self._read_time / self._misses if self._misses else 0.0
+            return CacheStats(self._hits, self._misses, self._hits * mean_read_time)
+
+    def lookup(self, registers: range) -> list[int] | None:
+        """ Values of all registers if every one is cached and fresh, None otherwise """
+        now = time.monotonic()
+        with self._lock:
+            values = []
+            for register in registers:
+                entry = self._entries.get(register)
+                if entry is None or now - entry[1] > self.policies[register]:
+                    self._misses += 1
+                    return None
+                values.append(entry[0])
+
+            self._hits += 1
+            return values
+
+    def _generation(self, registers: range) -> tuple[int, ...]:
+        return self._flushes, *(self._generations.get(register, 0) for register in registers)
+
+    def generation(self, registers: range) -> tuple[int, ...]:
+        """ Taken before read from device, changes whenever any of registers is invalidated or cache is flushed """
+        with self._lock:
+            return self._generation(registers)
+
+    def store(self, registers: range, values: list[int], read_time: float, generation: tuple[int, ...]) -> None:
+        """
+        Keep values read from device after miss, read time is used to estimate time saved by hits. Values are dropped
+        if registers were invalidated since generation was taken, they may be older than the write.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._read_time += read_time
+            if generation != self._generation(registers):
+                return
+            for register, value in zip(registers, values):
+                if register in self.policies:
+                    self._entries[register] = (value, now)
+
+    def is_cacheable(self, registers: range) -> bool:
+        return all(register in self.policies for register in registers)
+
+    def invalidate(self, registers) -> None:
+        with self._lock:
+            for register in registers:
+                self._entries.pop(register, None)
+                self._generations[register] = self._generations.get(register, 0) + 1
+
+    def flush(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._flushes += 1
+
+
+class CachingTransport(ModbusTransport):
+    """ Serves reads of cacheable registers from RegisterCache, any write invalidates written registers """
+
+    def __init__(self, inner: ModbusTransport, cache: RegisterCache):
+        self.inner = inner
+        self.cache = cache
+
+    def read_registers(self, registeraddress: int, number_of_registers: int) -> list[int]:
+        registers = range(registeraddress, registeraddress + number_of_registers)
+        if not self.cache.is_cacheable(registers):
+            return self.inner.read_registers(registeraddress, number_of_registers)
+
+        values = self.cache.lookup(registers)
+        if values is None:
+            generation = self.cache.generation(registers)
+            start_time = time.perf_counter()
+            values = self.inner.read_registers(registeraddress, number_of_registers)
+            self.cache.store(registers, values, time.perf_counter() - start_time, generation)
+        return values
+
+    def write_registers(self, registeraddress: int, values: list[int]) -> None:
+        registers = range(registeraddress, registeraddress + len(values))
+        # Invalidated before and after, concurrent read started before either invalidation does not store its values
+        self.cache.invalidate(registers)
+        try:
+            self.inner.write_registers(registeraddress, values)
+        finally:
+            if any(register in flushing_registers for register in registers):
+                self.cache.flush()
+            self.cache.invalidate(registers)
+
+    def hold_open(self) -> None:
+        self.inner.hold_open()
+
+    def release_open(self) -> None:
+        self.inner.release_open()
+
+    def close(self) -> None:
+        self.inner.close()
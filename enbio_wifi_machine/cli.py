@@ -1,11 +1,25 @@
 import argparse
+import shlex
+import sys
+import time
 from datetime import datetime
 from .machine import EnbioWiFiMachine
 from .common import process_labels, EnbioDeviceInternalException, ScaleFactors
+from .transport import TcpTransport, MODBUS_TCP_DEFAULT_PORT
+from .cache import RegisterCache
 
 
 def initialize_parser():
     parser = argparse.ArgumentParser(description="CLI tool to set and get device name via Modbus.")
+    parser.add_argument("--tcp", type=str, default=None,
+                        help="Use Modbus TCP gateway 'host[:port]' instead of USB Serial port.")
+    parser.add_argument("-a", "--address", type=int, default=1, help="Modbus slave address.")
+    parser.add_argument("--cache", action="store_true",
+                        help="Cache static registers (device id, firmware, board number, scales) until written.")
+    parser.add_argument("--sink", type=str, action="append", default=[],
+                        help="Also publish samples of run, monitor and record to sink, can be repeated: "
+                             "jsonl:<file>, csv:<file>, sqlite:<file>, udp:<host>:<port>, "
+                             "optional '?batch=<samples>&flush=<sec>'.")
     subparsers = parser.add_subparsers(dest="command")
 
     # Subcommand for setting device ID
@@ -31,6 +45,8 @@ def initialize_parser():
     _ = subparsers.add_parser("doordrvfwd", help="Drive the door forward.")
     _ = subparsers.add_parser("doordrvbwd", help="Drive the door backward.")
     _ = subparsers.add_parser("doordrvnone", help="Stop door driving.")
+    doorbench_parser = subparsers.add_parser("doorbench", help="Lock/unlock door many times, report stop latency.")
+    doorbench_parser.add_argument("-n", "--cycles", default=20, type=int, help="Number of lock/unlock cycles.")
 
     _ = subparsers.add_parser("dtsetnow", help="todo.")
 
@@ -46,7 +62,22 @@ def initialize_parser():
     runparser.add_argument("-i", "--interval", default=1.0, type=float, help="Interval of sampling in sec")
     runparser.add_argument("-l", "--label", default="PA", type=str, help="Label to mark measurements")
 
-    _ = subparsers.add_parser("monitor", help="todo.")
+    monitor_parser = subparsers.add_parser("monitor", help="Print and plot process parameters, check interlocks.")
+    monitor_parser.add_argument("--headless", action="store_true",
+                                help="Do not plot, only print samples and interlock events.")
+
+    record_parser = subparsers.add_parser("record", help="Record continuously (also standby) into rotating segments.")
+    record_parser.add_argument("-i", "--interval", default=1.0, type=float, help="Interval of sampling in sec")
+    record_parser.add_argument("-l", "--label", type=str, default="PA", help="Label in segments names.")
+    record_parser.add_argument("-o", "--output", type=str, default="measurements/continuous",
+                               help="Segments directory.")
+    record_parser.add_argument("--segment-minutes", type=float, default=60.0, help="Segment duration in minutes.")
+    record_parser.add_argument("--segment-mb", type=float, default=None, help="Segment size limit in MB.")
+    record_parser.add_argument("--keep", type=int, default=168, help="Closed segments kept, oldest are deleted.")
+    record_parser.add_argument("--keep-days", type=float, default=None, help="Delete segments older than days.")
+    record_parser.add_argument("--keep-mb", type=float, default=None, help="Disk space of all segments in MB.")
+    record_parser.add_argument("--compress-after", type=int, default=24,
+                               help="Newest segments kept plain, older are gzipped.")
 
     # Scale factors commands
     scales_get_parser = subparsers.add_parser("scales", help="Manage scale factors.")
@@ -55,25 +86,292 @@ def initialize_parser():
 
     _ = subparsers.add_parser("htoglcheck", help="todo.")
 
+    explore_parser = subparsers.add_parser("explore", help="Map readable registers and find live ones.")
+    explore_parser.add_argument("--start", type=int, default=0, help="First register address.")
+    explore_parser.add_argument("--stop", type=int, default=4000, help="Register address after last one.")
+    explore_parser.add_argument("-n", "--sweeps", type=int, default=3, help="Number of sweeps.")
+    explore_parser.add_argument("-i", "--interval", type=float, default=0.5, help="Time between sweeps in sec.")
+    explore_parser.add_argument("-o", "--output", type=str, default=None, help="Save registers activity to json.")
+
+    config_parser = subparsers.add_parser("config", help="Snapshot, diff or restore machine configuration.")
+    config_parser.add_argument("action", choices=["snapshot", "diff", "restore"],
+                               help="'snapshot' to file, 'diff' file with machine or other file, 'restore' from file")
+    config_parser.add_argument("filepath", type=str, help="Snapshot file path.")
+    config_parser.add_argument("other", type=str, nargs="?", default=None,
+                               help="Other snapshot to diff with, without it live machine is used.")
+    config_parser.add_argument("--all", action="store_true", help="Restore all fields, not only changed ones.")
+
+    daemon_parser = subparsers.add_parser("daemon", help="Own the machine and serve local clients over Unix socket.")
+    daemon_parser.add_argument("-s", "--socket", type=str, default=None, help="Unix socket path.")
+    daemon_parser.add_argument("-i", "--interval", default=1.0, type=float, help="Interval of sampling in sec")
+    daemon_parser.add_argument("--allow-control", action="store_true",
+                               help="Serve control methods too (door drive, process start and interrupt).")
+
+    watch_parser = subparsers.add_parser("watch", help="Print live samples served by running daemon.")
+    watch_parser.add_argument("-s", "--socket", type=str, default=None, help="Unix socket path.")
+
+    fleet_parser = subparsers.add_parser("fleet", help="Record all connected machines at once, print their health.")
+    fleet_parser.add_argument("-i", "--interval", default=1.0, type=float, help="Interval of sampling in sec")
+    fleet_parser.add_argument("-l", "--label", type=str, default="fleet", help="Label in recordings names.")
+    fleet_parser.add_argument("-d", "--duration", type=float, default=None, help="Recording time in sec.")
+    fleet_parser.add_argument("--health", type=float, default=5.0, help="Health view interval in sec.")
+
+    provision_parser = subparsers.add_parser("provision", help="Provision many machines at once from json spec.")
+    provision_parser.add_argument("-f", "--filepath", type=str, required=True, help="Provisioning spec file path.")
+
+    envelope_parser = subparsers.add_parser("envelope", help="Compare many recordings of process in one figure.")
+    envelope_parser.add_argument("procname", type=str, nargs="?", default=None,
+                                 help=f"Process of recordings {process_labels}, all recordings if not given.")
+    envelope_parser.add_argument("-d", "--dir", type=str, default="measurements", help="Recordings directory.")
+    envelope_parser.add_argument("-c", "--column", type=str, default="ProcTempr *C", help="Compared CSV column.")
+    envelope_parser.add_argument("--align", choices=["phase", "start"], default="phase",
+                                 help="Align runs on phase boundaries or start time.")
+    envelope_parser.add_argument("--step", type=float, default=None,
+                                 help="Grid step in sec, finest recording interval if not given.")
+    envelope_parser.add_argument("-o", "--output", type=str, default=None,
+                                 help="Save figure to file instead of showing.")
+
+    interlocks_parser = subparsers.add_parser("interlocks", help="Check interlock rules over recordings.")
+    interlocks_parser.add_argument("sources", type=str, nargs="+", help="Recordings directories or glob patterns.")
+
+    wear_parser = subparsers.add_parser("wear", help="Heater, valve and pump wear over recordings archive.")
+    wear_parser.add_argument("sources", type=str, nargs="+", help="Recordings directories or glob patterns.")
+    wear_parser.add_argument("--cache-file", type=str, default="wear_cache.json",
+                             help="Per recording results cache, only new or changed recordings are read.")
+    wear_parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes, all cores if not given.")
+    wear_parser.add_argument("--reconcile", action="store_true",
+                             help="Compare recorded heater switch-ons with toggle counters of connected machine.")
+
+    extract_parser = subparsers.add_parser("extract", help="Extract and plot many recordings in parallel, headless.")
+    extract_parser.add_argument("sources", type=str, nargs="+", help="Recordings directories or glob patterns.")
+    extract_parser.add_argument("-o", "--output", type=str, default="extractions", help="Extractions directory.")
+    extract_parser.add_argument("--format", type=str, nargs="+", choices=["png", "svg"], default=["png"],
+                                help="Plot file formats.")
+    extract_parser.add_argument("--start", type=float, default=None, help="Start of extracted time range in sec.")
+    extract_parser.add_argument("--end", type=float, default=None, help="End of extracted time range in sec.")
+    extract_parser.add_argument("-j", "--jobs", type=int, default=None,
+                                help="Worker processes, all cores if not given.")
+    extract_parser.add_argument("--force", action="store_true",
+                                help="Extract also recordings unchanged since last extraction.")
+
+    batch_parser = subparsers.add_parser("batch", help="Run many commands reusing one connection.")
+    batch_parser.add_argument("-f", "--filepath", type=str, default=None,
+                              help="Script with one command per line, without it commands are read from stdin.")
+    batch_parser.add_argument("--stop-on-error", action="store_true", help="Stop at first failed command.")
+
     return parser
 
 
+def create_machine(args) -> EnbioWiFiMachine:
+    cache = RegisterCache() if args.cache else None
+    if args.tcp is None:
+        return EnbioWiFiMachine(address=args.address, cache=cache)
+
+    host, _, port = args.tcp.partition(":")
+    return EnbioWiFiMachine(address=args.address, cache=cache,
+                            transport=TcpTransport(host, int(port) if port else MODBUS_TCP_DEFAULT_PORT, args.address))
+
+
+def create_sinks(args):
+    from .sinks import SinkGroup, create_sink
+    return SinkGroup([create_sink(spec) for spec in args.sink])
+
+
+def run_batch(tool: EnbioWiFiMachine, parser: argparse.ArgumentParser, lines, stop_on_error: bool = False,
+              prompt: str | None = None) -> list[tuple[str, float, bool]]:
+    """ Run CLI commands line by line on already opened machine. Returns (command, duration, success) of each """
+    timings = []
+
+    def next_lines():
+        if prompt is None:
+            yield from lines
+            return
+        while True:
+            try:
+                yield input(prompt)
+            except EOFError:
+                return
+
+    for line in next_lines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line in ("exit", "quit"):
+            break
+
+        try:
+            args = parser.parse_args(shlex.split(line))
+        except SystemExit:
+            print(f"Bad command: {line}")
+            timings.append((line, 0.0, False))
+            if stop_on_error:
+                break
+            continue
+
+        start_time = time.perf_counter()
+        try:
+            # Commands handled only by main() (own connections, offline files, servers) are not run in batch
+            result = run_command(tool, args) if args.command not in (None, "batch") else None
+            if result is None:
+                print(f"Not allowed in batch: {line}")
+            success = bool(result)
+        except Exception as e:
+            print(f"Command failed: {e}")
+            success = False
+        duration = time.perf_counter() - start_time
+
+        print(f"[{line}] {'done' if success else 'failed'} in {duration * 1000:.1f} ms")
+        timings.append((line, duration, success))
+        if not success and stop_on_error:
+            break
+
+    return timings
+
+
+def print_batch_summary(timings: list[tuple[str, float, bool]], total_time: float):
+    print(f"{'Command':<40} {'Time (ms)':>10} Status")
+    for line, duration, success in timings:
+        print(f"{line[:40]:<40} {duration * 1000:>10.1f} {'ok' if success else 'FAILED'}")
+    print(f"{len(timings)} commands in {total_time:.3f} s including connecting")
+
+
+def print_config_diff(differences) -> None:
+    for difference in differences:
+        print(difference)
+    print(f"{len(differences)} fields differ")
+
+
 def main():
     parser = initialize_parser()
     args = parser.parse_args()
+    start_time = time.perf_counter()
+
+    # Daemon clients do not touch the port
+    if args.command == "watch":
+        from .daemon import DaemonClient, default_socket_path
+        try:
+            for message in DaemonClient(args.socket or default_socket_path).subscribe():
+                print(message)
+        except KeyboardInterrupt:
+            print("Stopped")
+        return
+
+    # Fleet discovers and opens all machines by itself
+    if args.command == "fleet":
+        from .fleet import FleetRecorder, discover_fleet
+        machines = discover_fleet(args.address)
+        if not machines:
+            print("No Enbio device found on any available port.")
+            return
+        try:
+            FleetRecorder(machines, args.interval, label=args.label).run(args.duration, args.health)
+        except KeyboardInterrupt:
+            print("Stopped")
+        return
+
+    # Provisioning opens all machines listed in spec by itself
+    if args.command == "provision":
+        from .provisioning import load_provisioning_file, provision_many, print_provisioning_summary
+        try:
+            units = {port: (EnbioWiFiMachine(port, args.address), spec)
+                     for port, spec in load_provisioning_file(args.filepath).items()}
+        except (EnbioDeviceInternalException, IOError) as e:
+            print(f"Enbio Mosbus failed, reason: {e}")
+            return
+        print_provisioning_summary(provision_many(units), time.perf_counter() - start_time)
+        return
+
+    # Offline analysis of recordings
+    if args.command == "envelope":
+        from .envelope import load_runs, compute_envelope, plot_envelope
+        runs = load_runs(args.dir, args.procname, args.column)
+        try:
+            envelope = compute_envelope(runs, args.column, args.align, args.step)
+        except ValueError as e:
+            print(f"Envelope failed: {e}")
+            return
+        print(envelope.report())
+        plot_envelope(envelope, args.output)
+        return
+
+    if args.command == "interlocks":
+        from .extractor import find_measurements
+        from .interlocks import RuleEngine
+        for filepath in find_measurements(args.sources):
+            events = RuleEngine().evaluate_file(filepath)
+            print(f"{filepath}: {len(events)} events")
+            for event in events:
+                print(f"    {event}")
+        return
+
+    if args.command == "wear":
+        from .extractor import find_measurements
+        from .wear import archive_wear
+        report = archive_wear(find_measurements(args.sources), args.cache_file, args.jobs)
+        print(report)
+        if args.reconcile:
+            try:
+                counts = create_machine(args).get_heater_toggle_cnts()
+            except EnbioDeviceInternalException as e:
+                print(f"Enbio Mosbus failed, reason: {e}")
+                return
+            print(f"{'Counter':<10}{'Device':>10}{'Recorded':>10}{'Not recorded':>14}")
+            for name, device_value, recorded in report.reconcile(counts):
+                print(f"{name:<10}{device_value:>10}{recorded:>10}{device_value - recorded:>14}")
+        return
+
+    if args.command == "extract":
+        from .extractor import find_measurements, extract_many
+        filepaths = find_measurements(args.sources)
+        time_range = (args.start, args.end) if args.start is not None or args.end is not None else None
+        print(extract_many(filepaths, args.output, tuple(args.format), time_range, args.jobs, args.force))
+        print(f"Done in {time.perf_counter() - start_time:.1f} s")
+        return
+
+    # Diff of two snapshot files does not need the machine
+    if args.command == "config" and args.action == "diff" and args.other is not None:
+        from .config import ConfigSnapshot, diff_snapshots
+        print_config_diff(diff_snapshots(ConfigSnapshot.load(args.filepath), ConfigSnapshot.load(args.other)))
+        return
 
     # Initialize the ModbusTool instance
     try:
-        tool = EnbioWiFiMachine()
+        tool = create_machine(args)
     except EnbioDeviceInternalException as e:
         print(f"Enbio Mosbus failed, reason: {e}")
+        return
+
+    if args.command == "batch":
+        with tool.keep_open():
+            if args.filepath is not None:
+                with open(args.filepath, "r") as f:
+                    timings = run_batch(tool, parser, f.readlines(), args.stop_on_error)
+            else:
+                prompt = "enbio> " if sys.stdin.isatty() else ""
+                timings = run_batch(tool, parser, [], args.stop_on_error, prompt=prompt)
+        print_batch_summary(timings, time.perf_counter() - start_time)
+
+    elif args.command == "daemon":
+        from .daemon import MachineDaemon, default_socket_path
+        try:
+            MachineDaemon(tool, args.socket or default_socket_path, args.interval,
+                          args.allow_control).serve_forever()
+        except KeyboardInterrupt:
+            print("Stopped")
+
+    elif run_command(tool, args) is None:
+        parser.print_help()
+
 
+def run_command(tool: EnbioWiFiMachine, args) -> bool | None:
+    """ Execute single parsed command, returns False when command failed and None for command not handled here """
     if args.command == "devidset":
         try:
             tool.set_device_id(args.devid)
             print(f"Device ID set to: {args.devid} success")
         except EnbioDeviceInternalException as e:
             print(f"Device ID set to: {args.devid} failed : {e}")
+            return False
 
     elif args.command == "devidget":
         print(tool.get_device_id())
@@ -89,6 +387,7 @@ def main():
             tool.save_all()
         except EnbioDeviceInternalException as e:
             print(f"Saved all failed: {e}")
+            return False
 
     elif args.command == "isdooropen":
         print(f"Door open: {tool.is_door_open()}")
@@ -102,8 +401,10 @@ def main():
             print(f"Door got locked")
         except EnbioDeviceInternalException as e:
             print(f"Door locking failed: {e}")
+            return False
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
+            return False
 
     elif args.command == "doorunlock":
         try:
@@ -111,61 +412,106 @@ def main():
             print(f"Door got unlocked")
         except EnbioDeviceInternalException as e:
             print(f"Door unlocking failed: {e}")
+            return False
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
+            return False
 
     elif args.command == "doordrvfwd":
         try:
             tool.door_drv_fwd()
         except EnbioDeviceInternalException as e:
             print(f"Device Error: {e}")
+            return False
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
+            return False
 
     elif args.command == "doordrvbwd":
         try:
             tool.door_drv_bwd()
         except EnbioDeviceInternalException as e:
             print(f"Device Error: {e}")
+            return False
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
+            return False
 
     elif args.command == "doordrvnone":
         try:
             tool.door_drv_none()
         except EnbioDeviceInternalException as e:
             print(f"Device Error: {e}")
+            return False
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
+            return False
+
+    elif args.command == "doorbench":
+        try:
+            print(tool.door_overshoot_report(args.cycles))
+        except EnbioDeviceInternalException as e:
+            print(f"Device Error: {e}")
+            return False
+        except Exception as e:
+            print(f"An unexpected error occurred: {e}")
+            return False
 
     elif args.command == "dtsetnow":
         try:
             tool.set_datetime(datetime.now())
         except EnbioDeviceInternalException as e:
             print(f"Device Error: {e}")
+            return False
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
+            return False
 
     elif args.command == "run":
         print(f"Run {args.procname}")
         try:
-            tool.runmonitor(args.procname, args.plotting, args.interval, args.label)
+            tool.runmonitor(args.procname, args.plotting, args.interval, args.label, sinks=create_sinks(args))
         except KeyboardInterrupt:
             print("Interrupted")
         except EnbioDeviceInternalException as e:
             print(f"Device Error: {e}")
+            return False
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
+            return False
 
     elif args.command == "monitor":
         try:
-            tool.monitor()
+            tool.monitor(plotting=not args.headless, sinks=create_sinks(args))
         except KeyboardInterrupt:
             print("Stopped")
         except EnbioDeviceInternalException as e:
             print(f"Device Error: {e}")
+            return False
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
+            return False
+
+    elif args.command == "record":
+        from .recording import SegmentedRecorder, RetentionPolicy
+        retention = RetentionPolicy(
+            max_segments=args.keep,
+            max_age=args.keep_days * 86400 if args.keep_days is not None else None,
+            max_bytes=int(args.keep_mb * 1e6) if args.keep_mb is not None else None,
+            compress_after=args.compress_after,
+        )
+        recorder = SegmentedRecorder(args.output, args.interval, args.label, args.segment_minutes * 60,
+                                     int(args.segment_mb * 1e6) if args.segment_mb is not None else None, retention)
+        try:
+            tool.record(recorder, args.interval, sinks=create_sinks(args))
+        except KeyboardInterrupt:
+            print(f"Stopped, segments in: {args.output}")
+        except ValueError as e:
+            print(f"Sink Error: {e}")
+            return False
+        except EnbioDeviceInternalException as e:
+            print(f"Device Error: {e}")
+            return False
 
     elif args.command == "scales":
         if args.action == "get":
@@ -185,8 +531,40 @@ def main():
     elif args.command == "htoglcheck":
         print(tool.get_heater_toggle_cnts())
 
+    elif args.command == "explore":
+        from .explorer import RegisterExplorer
+        start_time = time.perf_counter()
+        explorer = RegisterExplorer(tool)
+        with tool.keep_open():
+            explorer.explore(args.start, args.stop, args.sweeps, args.interval)
+        print(explorer.report())
+        print(f"Explored in {time.perf_counter() - start_time:.1f} s")
+        if args.output is not None:
+            explorer.save(args.output)
+
+    elif args.command == "config":
+        from .config import ConfigSnapshot, take_snapshot, diff_snapshots, restore_snapshot
+        start_time = time.perf_counter()
+        try:
+            if args.action == "snapshot":
+                take_snapshot(tool).save(args.filepath)
+                print(f"Configuration saved to: {args.filepath}")
+
+            elif args.action == "diff":
+                print_config_diff(diff_snapshots(ConfigSnapshot.load(args.filepath), take_snapshot(tool)))
+
+            elif args.action == "restore":
+                written = restore_snapshot(tool, ConfigSnapshot.load(args.filepath), only_changed=not args.all)
+                print(f"Restored fields: {', '.join(written) if written else 'none, configuration is the same'}")
+        except EnbioDeviceInternalException as e:
+            print(f"Device Error: {e}")
+            return False
+        print(f"Done in {(time.perf_counter() - start_time) * 1000:.0f} ms")
+
     else:
-        parser.print_help()
+        return None
+
+    return True
 
 
 if __name__ == "__main__":
@@ -1,8 +1,10 @@
 from enum import Enum
 import time
+import queue
 import struct
 import minimalmodbus
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, fields, is_dataclass
+from datetime import datetime
 import json
 
 cfg = {
@@ -27,15 +29,72 @@ def float_to_ints(float_value):
     return low, high
 
 
-def await_value(function, value, timeout: [float | None] = None) -> bool:
-    start_time = time.time()
+@dataclass
+class AwaitResult:
+    success: bool
+    value: object
+    elapsed: float
+    polls: int
+
+    def __bool__(self):
+        return self.success
+
+
+def await_condition(function, condition, timeout: [float | None] = None, initial_interval: float = 0.005,
+                    max_interval: float = 0.25, backoff: float = 2.0) -> AwaitResult:
+    """
+    Call function until condition(result) is met or deadline passes. Interval between polls grows exponentially
+    from initial_interval up to max_interval, so fast acknowledge is noticed fast and long waits don't flood the bus.
+    """
+    start_time = time.monotonic()
+    interval = initial_interval
+    polls = 0
     while True:
-        if function() == value:
-            return True
-        if timeout is not None and (time.time() - start_time) > timeout:
-            return False
+        value = function()
+        polls += 1
+        elapsed = time.monotonic() - start_time
+        if condition(value):
+            return AwaitResult(True, value, elapsed, polls)
+        if timeout is not None and elapsed > timeout:
+            return AwaitResult(False, value, elapsed, polls)
 
-        time.sleep(0.25)
+        sleep_time = interval if timeout is None else min(interval, max(0.0, timeout - elapsed))
+        time.sleep(sleep_time)
+        interval = min(interval * backoff, max_interval)
+
+
+def await_value(function, value, timeout: [float | None] = None) -> bool:
+    return await_condition(function, lambda result: result == value, timeout).success
+
+
+def to_jsonable(value):
+    """ Convert dataclasses (e.g. ProcessLine), enums and tuples to plain JSON types """
+    if is_dataclass(value):
+        return {field.name: to_jsonable(getattr(value, field.name)) for field in fields(value)}
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key.name if isinstance(key, Enum) else key): to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def put_drop_oldest(bounded_queue: queue.Queue, item) -> int:
+    """ Put item without blocking producer, oldest items are dropped when queue is full. Returns dropped count """
+    dropped = 0
+    while True:
+        try:
+            bounded_queue.put_nowait(item)
+            return dropped
+        except queue.Full:
+            try:
+                bounded_queue.get_nowait()
+                dropped += 1
+            except queue.Empty:
+                pass
 
 
 def read_float_register(device: minimalmodbus.Instrument, register):
@@ -146,6 +205,12 @@ process_type_values = {
 reverse_process_type_values = {value: key for key, value in process_type_values.items()}
 
 
+process_final_phase = {
+    None: 12,  # Ending phase of sterilization processes
+    ProcessType.TVAC: 5,  # Ending phase of vacuum test
+}
+
+
 def get_process_type_by_value(value):
     return reverse_process_type_values.get(value, None)
 
@@ -237,3 +302,63 @@ class HeatersToggleCounts:
     sg_ab: int | None
     ch_ab: int | None
     sg_c: int | None
+
+
+@dataclass
+class DoorDriveReport:
+    action: str
+    duration: float
+    polls: int
+    stop_latency: float
+    """ Time from reading changed switch to stop command acknowledged """
+    overshoot_bound: float
+    """ Upper bound of motor running after switch changed: last poll round trip plus stop latency """
+
+
+@dataclass
+class LatencyStats:
+    count: int
+    min: float
+    mean: float
+    p95: float
+    max: float
+
+    @staticmethod
+    def from_values(values: list[float]) -> "LatencyStats":
+        ordered = sorted(values)
+        return LatencyStats(
+            count=len(ordered),
+            min=ordered[0],
+            mean=sum(ordered) / len(ordered),
+            p95=ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))],
+            max=ordered[-1],
+        )
+
+    def __str__(self):
+        return (f"n={self.count} min={self.min * 1000:.1f} ms mean={self.mean * 1000:.1f} ms "
+                f"p95={self.p95 * 1000:.1f} ms max={self.max * 1000:.1f} ms")
+
+
+@dataclass
+class DoorOvershootReport:
+    cycles: int
+    stop_latency: dict[str, LatencyStats]
+    overshoot_bound: dict[str, LatencyStats]
+
+    @staticmethod
+    def from_reports(reports: list[DoorDriveReport], cycles: int) -> "DoorOvershootReport":
+        actions = sorted({report.action for report in reports})
+        return DoorOvershootReport(
+            cycles=cycles,
+            stop_latency={action: LatencyStats.from_values(
+                [report.stop_latency for report in reports if report.action == action]) for action in actions},
+            overshoot_bound={action: LatencyStats.from_values(
+                [report.overshoot_bound for report in reports if report.action == action]) for action in actions},
+        )
+
+    def __str__(self):
+        lines = [f"Door overshoot report, {self.cycles} lock/unlock cycles"]
+        for action in self.stop_latency:
+            lines.append(f"{action} stop latency:    {self.stop_latency[action]}")
+            lines.append(f"{action} overshoot bound: {self.overshoot_bound[action]}")
+        return "\n".join(lines)
@@ -0,0 +1,120 @@
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from enbio_wifi_machine.common import ints_to_float, EnbioDeviceInternalException
+from enbio_wifi_machine.machine import EnbioWiFiMachine
+from enbio_wifi_machine.modbus_registers import ModbusRegister
+
+CONFIG_FORMAT = "enbio_config"
+CONFIG_FORMAT_VERSION = 1
+
+config_fields = {
+    "device_id": (ModbusRegister.DEVICE_ID.value, EnbioWiFiMachine.device_id_max_length),
+    "boardnumber": (ModbusRegister.BOARD_NUM.value, 1),
+    "scales_b": (ModbusRegister.SCALE_FACTORS_PRESS_PROC_B.value, 8),
+    "scales_a": (ModbusRegister.SCALE_FACTORS_PRESS_PROC_A.value, 8),
+    "standby_cooling_thrsh": (ModbusRegister.STANDBY_COOLING_THRSH.value, 1),
+    "relays_valves": (ModbusRegister.RELAY_STEAMGEN_AB.value, 8),
+    "relay_steamgen_c": (ModbusRegister.RELAY_STEAMGEN_C.value, 1),
+    "backlight": (ModbusRegister.BACKLIGHT.value, 1),
+    "pump_wtr_interval_on_time": (ModbusRegister.PUMP_WTR_INTERVAL.value, 2),
+}
+""" Configuration registers as (first register, count) by field name, values are kept raw for exact restore """
+
+
+def _field_registers(name: str) -> range:
+    first, count = config_fields[name]
+    return range(first, first + count)
+
+
+def _decode_field(name: str, values: list[int]):
+    """ Human readable field value, used only for printing """
+    if name == "device_id":
+        return b"".join(value.to_bytes(2, "big") for value in values).decode("latin1").rstrip(" ").rstrip("\0")
+    if name == "boardnumber":
+        return "{}.{:02d}.{:02d}".format(chr((values[0] >> 11) + ord('A')), (values[0] >> 4) & 0x7F, values[0] & 0xF)
+    if name.startswith("scales"):
+        return [round(ints_to_float(values[index], values[index + 1]), 6) for index in range(0, len(values), 2)]
+    return values[0] if len(values) == 1 else values
+
+
+@dataclass
+class ConfigSnapshot:
+    fields: dict[str, list[int]]
+    taken: str
+    version: int = CONFIG_FORMAT_VERSION
+
+    def to_json(self) -> str:
+        return json.dumps({"format": CONFIG_FORMAT, "version": self.version, "taken": self.taken,
+                           "fields": self.fields}, separators=(",", ":"))
+
+    @staticmethod
+    def from_json(json_data: str) -> "ConfigSnapshot":
+        data = json.loads(json_data)
+        if data.get("format") != CONFIG_FORMAT or data.get("version") != CONFIG_FORMAT_VERSION:
+            raise EnbioDeviceInternalException(f"Not supported config snapshot {data.get('format')} "
+                                               f"version {data.get('version')}")
+        return ConfigSnapshot(fields=data["fields"], taken=data["taken"], version=data["version"])
+
+    def save(self, filepath: str) -> None:
+        with open(filepath, "w") as f:
+            f.write(self.to_json())
+
+    @staticmethod
+    def load(filepath: str) -> "ConfigSnapshot":
+        with open(filepath, "r") as f:
+            return ConfigSnapshot.from_json(f.read())
+
+    def decoded(self) -> dict:
+        return {name: _decode_field(name, values) for name, values in self.fields.items()}
+
+    def register_values(self, names=None) -> dict[int, int]:
+        values = {}
+        for name in names or self.fields:
+            values.update(zip(_field_registers(name), self.fields[name]))
+        return values
+
+
+@dataclass
+class ConfigDifference:
+    field: str
+    old: object
+    new: object
+
+    def __str__(self):
+        return f"{self.field}: {self.old} -> {self.new}"
+
+
+def take_snapshot(machine: EnbioWiFiMachine) -> ConfigSnapshot:
+    """ Read all configuration fields with block reads planned over all their registers """
+    registers = [register for name in config_fields for register in _field_registers(name)]
+    values = machine.read_register_map(registers)
+    return ConfigSnapshot(
+        fields={name: [values[register] for register in _field_registers(name)] for name in config_fields},
+        taken=datetime.now().isoformat(timespec="seconds"),
+    )
+
+
+def diff_snapshots(old: ConfigSnapshot, new: ConfigSnapshot) -> list[ConfigDifference]:
+    old_decoded, new_decoded = old.decoded(), new.decoded()
+    return [ConfigDifference(name, old_decoded.get(name), new_decoded.get(name))
+            for name in config_fields if old.fields.get(name) != new.fields.get(name)]
+
+
+def restore_snapshot(machine: EnbioWiFiMachine, snapshot: ConfigSnapshot, only_changed: bool = True,
+                     save: bool = True) -> list[str]:
+    """
+    Write snapshot back with coalesced block writes and save. With only_changed live configuration is read first and
+    only differing fields are written. Returns names of written fields.
+    """
+    names = list(snapshot.fields)
+    if only_changed:
+        differences = diff_snapshots(take_snapshot(machine), snapshot)
+        names = [difference.field for difference in differences if difference.field in snapshot.fields]
+
+    if names:
+        machine.write_register_map(snapshot.register_values(names))
+        if save:
+            machine.save_all()
+    return names
+
@@ -0,0 +1,288 @@
+import getpass
+import json
+import os
+import queue
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from enbio_wifi_machine.common import to_jsonable, put_drop_oldest, label_to_process_type, EnbioDeviceInternalException
+
+
+
+def runtime_dir() -> str:
+    """ Per-user directory of daemon socket, XDG_RUNTIME_DIR when available """
+    if os.environ.get("XDG_RUNTIME_DIR"):
+        return os.environ["XDG_RUNTIME_DIR"]
+    user = os.getuid() if hasattr(os, "getuid") else getpass.getuser()
+    return os.path.join(tempfile.gettempdir(), f"enbio_wifi_machine-{user}")
+
+
+default_socket_path = os.path.join(runtime_dir(), "enbio_wifi_machine.sock")
+
+coalesced_methods = {
+    "get_device_id", "get_firmware_version", "get_boardnumber", "get_datetime", "get_dpi_switch",
+    "get_standby_cooling_thrsh_tmpr", "get_process_counter", "get_process_status", "get_process_seconds",
+    "get_phase_id", "get_backlight", "get_do_state", "get_pwr_state", "get_sensors_measurements",
+    "get_scale_factors", "get_heater_toggle_cnts", "get_pressure", "get_temperature", "get_raw_temperature",
+    "is_door_open", "is_door_unlocked", "poll_process_line", "lane_stats", "cache_stats",
+}
+""" Read only methods, identical concurrent calls share one bus transaction """
+
+control_methods = {
+    "set_device_id", "set_backlight", "set_standby_cooling_thrsh_tmpr", "save_all", "door_drv_fwd", "door_drv_bwd",
+    "door_drv_none", "door_lock_with_feedback", "door_unlock_with_feedback", "start_process", "interrupt_process",
+}
+""" Methods changing machine state or driving actuators, served only when daemon allows control """
+
+_argument_converters = {
+    "start_process": lambda label: label_to_process_type[label],
+}
+
+
+class _DaemonServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, daemon: "MachineDaemon"):
+        self.machine_daemon = daemon
+        super().__init__(socket_path, _ClientHandler)
+
+    def server_bind(self):
+        super().server_bind()
+        # Only owner may connect
+        os.chmod(self.server_address, 0o600)
+
+
+class _ClientHandler(socketserver.StreamRequestHandler):
+    def _send(self, message: dict):
+        self.wfile.write(json.dumps(message).encode() + b"\n")
+        self.wfile.flush()
+
+    def handle(self):
+        daemon = self.server.machine_daemon
+        for raw_line in self.rfile:
+            try:
+                request = json.loads(raw_line)
+                method = request["method"]
+            except (ValueError, KeyError):
+                self._send({"error": "Bad request"})
+                continue
+
+            if method == "subscribe":
+                self._send({"id": request.get("id"), "result": "subscribed"})
+                self._stream(daemon)
+                return
+
+            try:
+                result = daemon.call(method, request.get("args", []))
+                self._send({"id": request.get("id"), "result": to_jsonable(result)})
+            except Exception as e:
+                self._send({"id": request.get("id"), "error": f"{type(e).__name__}: {e}"})
+
+    def _stream(self, daemon: "MachineDaemon"):
+        subscription = daemon.subscribe()
+        try:
+            while not daemon.is_stopping:
+                try:
+                    self.wfile.write(subscription.get(timeout=0.5))
+                    self.wfile.flush()
+                except queue.Empty:
+                    continue
+        except OSError:
+            pass
+        finally:
+            daemon.unsubscribe(subscription)
+
+
+class MachineDaemon:
+    """
+    Owns EnbioWiFiMachine connection and serves many local clients with JSON lines over Unix socket.
+    All subscribers are fed from one poll loop, so many viewers cost one bus poll per interval.
+    Identical concurrent read requests are coalesced into one bus transaction. Control methods (door drive,
+    process start) are refused unless allow_control is set.
+    """
+
+    subscriber_queue_size = 100
+
+    def __init__(self, machine, socket_path: str = default_socket_path, interval: float = 1.0,
+                 allow_control: bool = False):
+        self.machine = machine
+        self.socket_path = socket_path
+        self.interval = interval
+        self.allow_control = allow_control
+        self.latest_sample: dict | None = None
+        """ Last polled sample with its poll time: {"time": ..., "data": ...} """
+        self.is_stopping = False
+        self.polls = 0
+        self.coalesced = 0
+        """ Read requests served by joining identical request already in flight """
+
+        self._inflight: dict[tuple, Future] = {}
+        self._inflight_lock = threading.Lock()
+        self._subscribers: list[queue.Queue] = []
+        self._subscribers_lock = threading.Lock()
+        self._server: _DaemonServer | None = None
+        self._poller: threading.Thread | None = None
+
+    def call(self, method: str, args: list):
+        if method == "latest":
+            return self.latest()
+        if method not in coalesced_methods and method not in control_methods:
+            raise EnbioDeviceInternalException(f"Method not available: {method}")
+        if method in control_methods and not self.allow_control:
+            raise EnbioDeviceInternalException(f"Control not allowed: {method}, start daemon with --allow-control")
+
+        converter = _argument_converters.get(method)
+        if converter is not None:
+            args = [converter(arg) for arg in args]
+
+        if method not in coalesced_methods:
+            return getattr(self.machine, method)(*args)
+
+        key = (method, json.dumps(args))
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if is_owner:
+            try:
+                future.set_result(getattr(self.machine, method)(*args))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self._inflight_lock:
+                    del self._inflight[key]
+
+        return future.result()
+
+    def _poll_sample(self, poll_time: float) -> tuple:
+        """ Poll process line, returns it with sample message data, which becomes latest sample """
+        pline = self.call("poll_process_line", [])
+        self.polls += 1
+        sample = {"time": poll_time, "data": to_jsonable(pline)}
+        self.latest_sample = sample
+        return pline, sample
+
+    def latest(self) -> dict:
+        """ Latest sample, polled now if there is none younger than interval (e.g. without subscribers) """
+        sample = self.latest_sample
+        if sample is None or time.time() - sample["time"] >= self.interval:
+            _, sample = self._poll_sample(time.time())
+        return sample
+
+    def subscribe(self) -> queue.Queue:
+        subscription = queue.Queue(maxsize=self.subscriber_queue_size)
+        with self._subscribers_lock:
+            self._subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: queue.Queue) -> None:
+        with self._subscribers_lock:
+            self._subscribers.remove(subscription)
+
+    def _broadcast(self, message: dict) -> None:
+        payload = json.dumps(message).encode() + b"\n"
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+
+        for subscription in subscribers:
+            # Slow viewer loses oldest samples instead of stalling others
+            put_drop_oldest(subscription, payload)
+
+    def _poll_procedure(self):
+        while not self.is_stopping:
+            start_time = time.time()
+
+            with self._subscribers_lock:
+                has_subscribers = len(self._subscribers) > 0
+
+            if has_subscribers:
+                try:
+                    pline, sample = self._poll_sample(start_time)
+                    self._broadcast({"event": "sample", **sample})
+
+                    for event in self.machine.track_lifecycle(pline):
+                        self._broadcast({"event": "process", "time": event.timestamp, "data": to_jsonable(event)})
+                except Exception as e:
+                    print(f"Polling failed: {e}")
+
+            time.sleep(max(0.0, self.interval - (time.time() - start_time)))
+
+    def start(self) -> None:
+        dirname = os.path.dirname(os.path.abspath(self.socket_path))
+        os.makedirs(dirname, mode=0o700, exist_ok=True)
+        # Shared temp dir fallback could be created in advance by other user
+        if dirname == runtime_dir() and hasattr(os, "getuid") and os.stat(dirname).st_uid != os.getuid():
+            raise EnbioDeviceInternalException(f"Socket directory {dirname} is not owned by current user")
+
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+        self._server = _DaemonServer(self.socket_path, self)
+        self._poller = threading.Thread(target=self._poll_procedure, daemon=True)
+        self._poller.start()
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"Daemon listening on {self.socket_path}")
+
+    def serve_forever(self) -> None:
+        self.start()
+        try:
+            while True:
+                time.sleep(1)
+        finally:
+            self.shutdown()
+
+    def shutdown(self) -> None:
+        self.is_stopping = True
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+class DaemonClient:
+    """ Client of MachineDaemon, machine methods are called by name, e.g. client.get_device_id() """
+
+    def __init__(self, socket_path: str = default_socket_path, timeout: float | None = 10.0):
+        self.socket_path = socket_path
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        self._socket.connect(socket_path)
+        self._file = self._socket.makefile("rwb")
+        self._next_id = 0
+
+    def _request(self, method: str, args: list) -> dict:
+        self._next_id += 1
+        self._file.write(json.dumps({"id": self._next_id, "method": method, "args": args}).encode() + b"\n")
+        self._file.flush()
+
+        response = json.loads(self._file.readline())
+        if "error" in response:
+            raise EnbioDeviceInternalException(response["error"])
+        return response
+
+    def call(self, method: str, *args):
+        return self._request(method, list(args))["result"]
+
+    def __getattr__(self, method: str):
+        if method.startswith("_"):
+            raise AttributeError(method)
+        return lambda *args: self.call(method, *args)
+
+    def subscribe(self):
+        """ Generator of daemon messages: live samples ('sample') and process lifecycle events ('process') """
+        self._request("subscribe", [])
+        self._socket.settimeout(None)
+        for raw_line in self._file:
+            yield json.loads(raw_line)
+
+    def close(self) -> None:
+        self._file.close()
+        self._socket.close()
@@ -0,0 +1,112 @@
+import numpy as np
+
+
+def minmax_downsample(x: np.ndarray, y: np.ndarray, buckets: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Keep minimum and maximum of each of buckets equal sized buckets in original order, so spikes survive any
+    reduction. Result has at most 2 * buckets points, series shorter than that are returned unchanged.
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    if len(y) <= 2 * buckets:
+        return x, y
+
+    size = -(-len(y) // buckets)
+    padded = np.full(size * buckets, np.nan)
+    padded[:len(y)] = y
+    rows = padded.reshape(buckets, size)
+
+    # NaN (gap rows, padding) never wins, bucket of only NaN keeps its first point
+    offsets = np.arange(buckets) * size
+    minimums = offsets + np.argmin(np.where(np.isnan(rows), np.inf, rows), axis=1)
+    maximums = offsets + np.argmax(np.where(np.isnan(rows), -np.inf, rows), axis=1)
+    indices = np.unique(np.concatenate((minimums, maximums)))
+    indices = indices[indices < len(y)]
+    return x[indices], y[indices]
+
+
+def lttb_downsample(x: np.ndarray, y: np.ndarray, threshold: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Largest Triangle Three Buckets: keeps first, last and from each bucket the point forming largest triangle with
+    previously kept point and average of next bucket. Visually closer to original than min/max for smooth series.
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    if threshold < 3 or len(y) <= threshold:
+        return x, y
+
+    edges = np.linspace(1, len(y) - 1, threshold - 1).astype(int)
+    indices = np.empty(threshold, dtype=int)
+    indices[0], indices[-1] = 0, len(y) - 1
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_stop = edges[bucket + 2] if bucket + 2 < len(edges) else len(y)
+        next_x, next_y = x[stop:next_stop].mean(), y[stop:next_stop].mean()
+
+        areas = np.abs((x[previous] - next_x) * (y[start:stop] - y[previous])
+                       - (x[previous] - x[start:stop]) * (next_y - y[previous]))
+        previous = start + int(np.nanargmax(areas)) if not np.all(np.isnan(areas)) else start
+        indices[bucket + 1] = previous
+    return x[indices], y[indices]
+
+
+def downsample(x, y, points: int, method: str = "minmax") -> tuple[np.ndarray, np.ndarray]:
+    """ Reduce series to about points points, 'minmax' keeps every peak, 'lttb' keeps shape """
+    if method == "minmax":
+        return minmax_downsample(x, y, max(1, points // 2))
+    if method == "lttb":
+        return lttb_downsample(x, y, points)
+    raise ValueError(f"Unknown downsampling method '{method}', use 'minmax' or 'lttb'.")
+
+
+def visible_slice(x: np.ndarray, xmin: float, xmax: float) -> slice:
+    """ Indices of x (sorted) within [xmin, xmax] with one point of margin on each side, so lines reach the edges """
+    start = max(0, int(np.searchsorted(x, xmin, side="left")) - 1)
+    stop = min(len(x), int(np.searchsorted(x, xmax, side="right")) + 1)
+    return slice(start, stop)
+
+
+def state_spans(x, states) -> list[tuple[float, float]]:
+    """ Merged (start, end) of consecutive samples with state on, sample on covers time from previous sample """
+    x, states = np.asarray(x, dtype=float), np.asarray(states, dtype=bool)
+    if len(x) < 2:
+        return []
+    on = np.concatenate(([False], states[1:], [False]))
+    changes = np.flatnonzero(np.diff(on.astype(np.int8)))
+    return [(x[start], x[stop]) for start, stop in zip(changes[::2], changes[1::2])]
+
+
+class LODLine:
+    """
+    Line drawn from downsampled series. Full series is kept, detail is recomputed for visible x range whenever
+    axes limits change (zoom, pan), so zooming in reveals original samples. Series may be replaced with set_data(),
+    e.g. by live plot.
+    """
+
+    def __init__(self, ax, x, y, method: str = "minmax", **kwargs):
+        self.ax = ax
+        self.method = method
+        self.line, = ax.plot([], [], **kwargs)
+        self.set_data(x, y)
+        self.update((self.x[0], self.x[-1]) if len(self.x) else None)
+        # Full range sets data limits for autoscaling, downsampled line keeps every extreme anyway
+        ax.update_datalim(np.column_stack((self.x, self.y))[~np.isnan(self.y)])
+        ax.callbacks.connect("xlim_changed", lambda axes: self.update())
+
+    def set_data(self, x, y) -> None:
+        """ Replace series, line is recomputed on next update() """
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self._detail_xlim = None
+
+    def _detail(self, xmin: float, xmax: float) -> tuple[np.ndarray, np.ndarray]:
+        visible = visible_slice(self.x, xmin, xmax)
+        points = max(100, int(self.ax.bbox.width))
+        return downsample(self.x[visible], self.y[visible], points, self.method)
+
+    def update(self, xlim: tuple[float, float] | None = None) -> None:
+        """ Recompute detail for xlim (current axes limits by default), skipped if series and xlim did not change """
+        xlim = tuple(xlim or self.ax.get_xlim())
+        if len(self.x) and xlim != self._detail_xlim:
+            self._detail_xlim = xlim
+            self.line.set_data(*self._detail(*xlim))
@@ -0,0 +1,166 @@
+import glob
+import os
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from enbio_wifi_machine.recording import parse_measurement_filename
+
+
+@dataclass
+class Run:
+    name: str
+    time: np.ndarray
+    """ Seconds from first sample """
+    values: np.ndarray
+    phase: np.ndarray | None
+    """ None for recordings without Phase column (format v1) """
+
+
+@dataclass
+class Envelope:
+    column: str
+    alignment: str
+    grid: np.ndarray
+    """ Seconds from start, with phase alignment time of reference run (median of phase durations) """
+    names: list[str]
+    matrix: np.ndarray
+    """ Runs x grid resampled values, NaN past end of run """
+    mean: np.ndarray
+    low: np.ndarray
+    median: np.ndarray
+    high: np.ndarray
+    scores: np.ndarray
+    """ RMS of deviation from median in units of envelope half width, 1 means run is typically at envelope edge """
+    phase_boundaries: np.ndarray | None = None
+
+    def ranking(self) -> list[tuple[str, float]]:
+        """ Runs by deviation score, most deviating first """
+        order = np.argsort(-self.scores)
+        return [(self.names[index], float(self.scores[index])) for index in order]
+
+    def report(self, limit: int = 10) -> str:
+        lines = [f"{len(self.names)} runs of {self.column} aligned by {self.alignment}, "
+                 f"{len(self.grid)} points, step {self.grid[1] - self.grid[0]:.3f} s"]
+        lines += [f"{score:>8.2f}  {name}" for name, score in self.ranking()[:limit]]
+        return "\n".join(lines)
+
+
+def load_runs(measurement_dir: str = "measurements", process: str | None = None, column: str = "ProcTempr *C",
+              pattern: str = "meas_*.csv") -> list[Run]:
+    """ Recordings of process (all if None) with time, column and phase as arrays, gap rows are dropped """
+    runs = []
+    for filepath in sorted(glob.glob(os.path.join(measurement_dir, pattern))):
+        info = parse_measurement_filename(filepath)
+        if info is None or (process is not None and info.process != process):
+            continue
+
+        df = pd.read_csv(filepath).dropna(subset=[column])
+        if len(df) < 2:
+            continue
+        time = df["Time (sec)"].to_numpy(dtype=float)
+        runs.append(Run(name=os.path.basename(filepath),
+                        time=time - time[0],
+                        values=df[column].to_numpy(dtype=float),
+                        phase=df["Phase"].to_numpy(dtype=int) if "Phase" in df.columns else None))
+    return runs
+
+
+def _phase_starts(run: Run) -> dict[int, float]:
+    """ Time of first sample of every phase """
+    changes = np.concatenate(([0], np.flatnonzero(np.diff(run.phase)) + 1))
+    starts = {}
+    for index in changes:
+        starts.setdefault(int(run.phase[index]), float(run.time[index]))
+    return starts
+
+
+def _phase_warps(runs: list[Run]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Boundaries of every run (runs x boundaries) and reference boundaries: start, first sample of each phase common to
+    all runs and end. Run time is warped piecewise linearly so its boundaries land on reference ones.
+    """
+    if any(run.phase is None for run in runs):
+        raise ValueError("Phase alignment needs recordings with 'Phase' column, use start alignment.")
+
+    starts = [_phase_starts(run) for run in runs]
+    common = set.intersection(*(set(run_starts) for run_starts in starts))
+    # Phase running from the first sample in every run is the start boundary itself
+    common = {phase for phase in common if any(run_starts[phase] > 0 for run_starts in starts)}
+    phases = sorted(common, key=lambda phase: np.median([run_starts[phase] for run_starts in starts]))
+
+    boundaries = np.array([[0.0] + [run_starts[phase] for phase in phases] + [run.time[-1]]
+                           for run, run_starts in zip(runs, starts)])
+    # Phase order can differ between runs (e.g. aborted run), keep boundaries non decreasing
+    boundaries = np.maximum.accumulate(boundaries, axis=1)
+    return boundaries, np.median(boundaries, axis=0)
+
+
+def compute_envelope(runs: list[Run], column: str = "ProcTempr *C", alignment: str = "phase",
+                     step: float | None = None, percentiles: tuple[float, float] = (5, 95)) -> Envelope:
+    """
+    Resample all runs onto common grid and compute mean, median and percentile envelope at every grid point.
+    Without step grid uses the finest sampling interval of runs, so runs of different intervals can be mixed.
+    """
+    if len(runs) < 2:
+        raise ValueError("Envelope needs at least 2 runs.")
+    if step is None:
+        step = min(float(np.median(np.diff(run.time))) for run in runs)
+
+    reference = None
+    if alignment == "phase":
+        boundaries, reference = _phase_warps(runs)
+        times = [np.interp(run.time, run_boundaries, reference) for run, run_boundaries in zip(runs, boundaries)]
+    elif alignment == "start":
+        times = [run.time for run in runs]
+    else:
+        raise ValueError(f"Unknown alignment '{alignment}', use 'phase' or 'start'.")
+
+    grid = np.arange(0.0, max(time[-1] for time in times) + step / 2, step)
+    matrix = np.vstack([np.interp(grid, time, run.values, left=np.nan, right=np.nan)
+                        for time, run in zip(times, runs)])
+
+    low, median, high = np.nanpercentile(matrix, [percentiles[0], 50, percentiles[1]], axis=0)
+    half_width = np.maximum((high - low) / 2, 1e-6)
+    scores = np.sqrt(np.nanmean(((matrix - median) / half_width) ** 2, axis=1))
+
+    return Envelope(column=column, alignment=alignment, grid=grid, names=[run.name for run in runs], matrix=matrix,
+                    mean=np.nanmean(matrix, axis=0), low=low, median=median, high=high, scores=scores,
+                    phase_boundaries=reference)
+
+
+def plot_envelope(envelope: Envelope, filepath: str | None = None, highlight: int = 3) -> None:
+    """
+    One figure for all runs: runs as single line collection, percentile band, median and mean.
+    Most deviating runs are highlighted. Saved to filepath if given, shown otherwise.
+    """
+    import matplotlib.pyplot as plt  # Import only when plotting
+    from matplotlib.collections import LineCollection
+
+    fig, ax = plt.subplots(figsize=(12, 6))
+    segments = [np.column_stack((envelope.grid, row)) for row in envelope.matrix]
+    ax.add_collection(LineCollection(segments, colors="gray", linewidths=0.5, alpha=0.3))
+
+    ax.fill_between(envelope.grid, envelope.low, envelope.high, color="blue", alpha=0.2, label="Percentile envelope")
+    ax.plot(envelope.grid, envelope.median, color="blue", label="Median")
+    ax.plot(envelope.grid, envelope.mean, color="blue", linestyle="--", label="Mean")
+
+    for name, score in envelope.ranking()[:highlight]:
+        row = envelope.matrix[envelope.names.index(name)]
+        ax.plot(envelope.grid, row, linewidth=1.0, label=f"{name} ({score:.2f})")
+
+    if envelope.phase_boundaries is not None:
+        for boundary in envelope.phase_boundaries[1:-1]:
+            ax.axvline(boundary, color="black", linewidth=0.5, linestyle=":")
+
+    ax.autoscale_view()
+    ax.set_xlabel("Time (sec)" if envelope.alignment == "start" else "Phase aligned time (sec)")
+    ax.set_ylabel(envelope.column)
+    ax.grid(True)
+    ax.legend(loc="upper left", fontsize="small")
+    plt.title(f"{envelope.column} envelope of {len(envelope.names)} runs")
+
+    if filepath is not None:
+        fig.savefig(filepath)
+        plt.close(fig)
+    else:
+        plt.show()
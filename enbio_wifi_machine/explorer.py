@@ -0,0 +1,140 @@
+import json
+import time
+from dataclasses import dataclass, asdict
+import minimalmodbus
+from enbio_wifi_machine.machine import EnbioWiFiMachine
+from enbio_wifi_machine.modbus_registers import ModbusRegister
+from enbio_wifi_machine.transport import plan_block_reads
+
+known_register_names = {register.value: register.name for register in ModbusRegister}
+
+
+@dataclass
+class RegisterActivity:
+    register: int
+    last_value: int
+    minimum: int
+    maximum: int
+    sweeps: int = 1
+    changes: int = 0
+
+    @property
+    def change_rate(self) -> float:
+        """ Fraction of sweeps in which value changed, 0 means static register """
+        return self.changes / (self.sweeps - 1) if self.sweeps > 1 else 0.0
+
+    def update(self, value: int) -> None:
+        self.sweeps += 1
+        self.changes += value != self.last_value
+        self.last_value = value
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+
+
+class RegisterExplorer:
+    """
+    Maps readable register space. First sweep reads maximal blocks and bisects blocks rejected with illegal address,
+    rejected ranges of up to min_bisect registers are scanned with growing blocks. Next sweeps read only found ranges
+    and record how often each register changes, to separate live registers from static ones.
+    """
+
+    def __init__(self, machine: EnbioWiFiMachine, block_size: int = 125, min_bisect: int = 32):
+        self.machine = machine
+        self.block_size = block_size
+        self.min_bisect = min_bisect
+        self.activity: dict[int, RegisterActivity] = {}
+        self.transactions = 0
+
+    def _read(self, first: int, count: int) -> list[int]:
+        self.transactions += 1
+        return self.machine.read_int_registers(first, count)
+
+    def _try_read(self, first: int, count: int) -> list[int] | None:
+        try:
+            return self._read(first, count)
+        except minimalmodbus.IllegalRequestError:
+            return None
+
+    def _gallop(self, first: int, count: int) -> dict[int, int]:
+        """
+        Scan rejected range register by register, after readable register block size doubles until rejected.
+        Unreadable register costs one read, readable run of n registers about log2(n) reads.
+        """
+        values = {}
+        position, stop, size = first, first + count, 1
+        while position < stop:
+            size = min(size, stop - position)
+            block_values = self._try_read(position, size)
+            if block_values is not None:
+                values.update(zip(range(position, position + size), block_values))
+                position += size
+                size *= 2
+            elif size == 1:
+                position += 1
+            else:
+                size = 1
+        return values
+
+    def _scan(self, first: int, count: int) -> dict[int, int]:
+        values = self._try_read(first, count)
+        if values is not None:
+            return dict(zip(range(first, first + count), values))
+        if count <= self.min_bisect:
+            return self._gallop(first, count)
+
+        half = count // 2
+        return {**self._scan(first, half), **self._scan(first + half, count - half)}
+
+    def _record(self, values: dict[int, int]) -> None:
+        for register, value in values.items():
+            activity = self.activity.get(register)
+            if activity is None:
+                self.activity[register] = RegisterActivity(register, value, value, value)
+            else:
+                activity.update(value)
+
+    def sweep(self, start: int, stop: int) -> dict[int, int]:
+        """ Values of readable registers in [start, stop), range is bisected only on first sweep """
+        known = [register for register in self.activity if start <= register < stop]
+        if known:
+            blocks = plan_block_reads(known, max_count=self.block_size)
+        else:
+            blocks = [(first, min(self.block_size, stop - first)) for first in range(start, stop, self.block_size)]
+
+        values = {}
+        for first, count in blocks:
+            values.update(self._scan(first, count))
+        self._record(values)
+        return values
+
+    def explore(self, start: int, stop: int, sweeps: int = 3, interval: float = 0.5) -> dict[int, RegisterActivity]:
+        for index in range(sweeps):
+            if index > 0:
+                time.sleep(interval)
+            self.sweep(start, stop)
+        return self.activity
+
+    def readable_ranges(self) -> list[tuple[int, int]]:
+        return plan_block_reads(self.activity)
+
+    def report(self) -> str:
+        lines = []
+        for first, count in self.readable_ranges():
+            registers = [self.activity[register] for register in range(first, first + count)]
+            live = [activity.register for activity in registers if activity.changes > 0]
+            lines.append(f"{first}-{first + count - 1} ({count} registers)"
+                         f"{', live: ' + ', '.join(map(str, live)) if live else ''}")
+            for activity in registers:
+                name = known_register_names.get(activity.register)
+                if name is None and activity.changes == 0 and activity.last_value == 0:
+                    continue
+                lines.append(f"    {activity.register:>5} {name or '?':<28} value {activity.last_value:>5} "
+                             f"range {activity.minimum}..{activity.maximum} change rate {activity.change_rate:.2f}")
+        lines.append(f"{len(self.activity)} readable registers, {self.transactions} transactions")
+        return "\n".join(lines)
+
+    def save(self, filepath: str) -> None:
+        with open(filepath, "w") as f:
+            json.dump([{**asdict(activity), "name": known_register_names.get(activity.register),
+                        "change_rate": activity.change_rate}
+                       for _, activity in sorted(self.activity.items())], f, indent=4)
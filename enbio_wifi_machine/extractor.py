@@ -1,8 +1,16 @@
+import glob
+import hashlib
+import io
+import json
 import os.path
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 
-import matplotlib.pyplot as plt
 import pandas as pd
 
+from enbio_wifi_machine.downsample import LODLine, state_spans
+from enbio_wifi_machine.recording import PhaseSegment, phase_index_filepath
+
 
 def proc_color_by_label(label: str) -> str:
     # Tempretures
@@ -34,14 +42,17 @@ def proc_color_by_label(label: str) -> str:
     return None
 
 
-def plot_csv_data(columns_to_plot, df_filtered):
+def plot_csv_data(columns_to_plot, df_filtered, filepaths: list[str] | None = None):
     """
     Plots temperatures on the left y-axis and pressures on the right y-axis.
 
     Parameters:
     - columns_to_plot: list of column names to plot.
     - df_filtered: pandas DataFrame containing the filtered data.
+    - filepaths: figure is saved to each file (format by extension) instead of showing window.
     """
+    import matplotlib.pyplot as plt  # Import only when plotting
+
     # Separate temperatures and pressures
     temperature_columns = [col for col in columns_to_plot if "Tmpr" in col or "Tempr" in col]
     pressure_columns = [col for col in columns_to_plot if "Press" in col]
@@ -50,12 +61,11 @@ def plot_csv_data(columns_to_plot, df_filtered):
     # Create the figure and the primary axis
     fig, ax1 = plt.subplots(figsize=(10, 6))
 
-    # Plot temperatures on the primary axis
+    # Plot temperatures on the primary axis, series are downsampled to plot width and refined on zoom
+    time = df_filtered['Time (sec)'].to_numpy()
     for column in temperature_columns:
-        if column in ["ProcTempr *C", "ChmbrTempr *C", "SGTempr *C"]:
-            ax1.plot(df_filtered['Time (sec)'], df_filtered[column], label=column, color=proc_color_by_label(column))
-        else:
-            ax1.plot(df_filtered['Time (sec)'], df_filtered[column], linestyle='--', label=column, color=proc_color_by_label(column))
+        linestyle = '-' if column in ["ProcTempr *C", "ChmbrTempr *C", "SGTempr *C"] else '--'
+        LODLine(ax1, time, df_filtered[column], linestyle=linestyle, label=column, color=proc_color_by_label(column))
 
     ax1.set_xlabel('Time (sec)')
     ax1.set_ylabel('Temperature (*C)')
@@ -64,23 +74,16 @@ def plot_csv_data(columns_to_plot, df_filtered):
     # Create a secondary y-axis for pressures
     ax2 = ax1.twinx()
     for column in pressure_columns:
-        if column == "ProcPress (bar)":
-            ax2.plot(df_filtered['Time (sec)'], df_filtered[column], label=column, color=proc_color_by_label(column))
-        else:
-            ax2.plot(df_filtered['Time (sec)'], df_filtered[column], linestyle='--', label=column, color=proc_color_by_label(column))
+        linestyle = '-' if column == "ProcPress (bar)" else '--'
+        LODLine(ax2, time, df_filtered[column], linestyle=linestyle, label=column, color=proc_color_by_label(column))
 
     ax2.set_ylabel('Pressure (bar)')
 
-    # Overlay filled regions for heating states
-    print(columns_to_plot)
-    if heating_columns:
-        for column in heating_columns:
-            heating_color = proc_color_by_label(column)
-            for i in range(1, len(df_filtered)):
-                if df_filtered[column].iloc[i] > 0:  # Heater ON
-                    start_time = df_filtered['Time (sec)'].iloc[i - 1]
-                    end_time = df_filtered['Time (sec)'].iloc[i]
-                    ax1.axvspan(start_time, end_time, color=heating_color, alpha=0.2)
+    # Overlay filled regions for heating states, one region for each run of samples with heater ON
+    for column in heating_columns:
+        heating_color = proc_color_by_label(column)
+        for start_time, end_time in state_spans(time, df_filtered[column].fillna(0).to_numpy() > 0):
+            ax1.axvspan(start_time, end_time, color=heating_color, alpha=0.2)
 
     # Combine legends from both axes
     lines1, labels1 = ax1.get_legend_handles_labels()
@@ -89,7 +92,59 @@ def plot_csv_data(columns_to_plot, df_filtered):
 
     # Set the title
     plt.title('Temperatures and Pressures Plot')
-    plt.show()
+    if filepaths is None:
+        plt.show()
+        return
+
+    for filepath in filepaths:
+        fig.savefig(filepath)
+    plt.close(fig)
+
+
+default_plot_columns = ['ProcTempr *C', 'ChmbrTempr *C', 'SGTempr *C', 'ExtTmpr *C', 'ProcPress (bar)',
+                        'ExtPress (bar)', "ShdHeat", "SgsHeat", "ChHeat"]
+
+
+def read_phase_index(filepath: str) -> list[PhaseSegment] | None:
+    """ Phase segments of recording from its sidecar, None for recordings without index (format v1, interrupted) """
+    try:
+        with open(phase_index_filepath(filepath), "r") as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        return None
+    return [PhaseSegment(**segment) for segment in index["segments"]]
+
+
+def extract_phase(filepath: str, phase: int) -> pd.DataFrame:
+    """ Rows of one phase, with phase index only rows of the phase are read from file """
+    segments = read_phase_index(filepath)
+    if segments is None:
+        df = pd.read_csv(filepath)
+        if "Phase" not in df.columns:
+            raise ValueError(f"{filepath} has neither phase index nor 'Phase' column.")
+        return df[df["Phase"] == phase]
+
+    with open(filepath, "rb") as f:
+        chunks = [f.readline()]
+        for segment in segments:
+            if segment.phase == phase:
+                f.seek(segment.start_offset)
+                chunks.append(f.read(segment.end_offset - segment.start_offset))
+    return pd.read_csv(io.BytesIO(b"".join(chunks)))
+
+
+def extract_phase_across_runs(phase: int, measurement_dir: str = "measurements",
+                              pattern: str = "meas_*.csv") -> dict[str, pd.DataFrame]:
+    """ Rows of the phase from every recording with Phase column, by file name, runs without the phase are skipped """
+    runs = {}
+    for filepath in sorted(glob.glob(os.path.join(measurement_dir, pattern))):
+        try:
+            df = extract_phase(filepath, phase)
+        except ValueError:
+            continue
+        if not df.empty:
+            runs[os.path.basename(filepath)] = df
+    return runs
 
 
 def extract_batch_from_measurement(
@@ -97,14 +152,15 @@ def extract_batch_from_measurement(
         measurement_dir: str = "measurements",
         time_range=None,
         extraction_dir: str = "extractions",
-        extraction_filename: str = "extraction.csv"):
+        extraction_filename: str = "extraction.csv",
+        phase: int | None = None):
     os.makedirs(extraction_dir, exist_ok=True)
 
     filepath = os.path.join(measurement_dir, filename)
     extractionpath = os.path.join(extraction_dir, extraction_filename)
 
-    # Load CSV into a DataFrame
-    df = pd.read_csv(filepath)
+    # Load CSV into a DataFrame, only rows of phase if requested
+    df = pd.read_csv(filepath) if phase is None else extract_phase(filepath, phase)
 
     # Ensure the time column is named correctly and exists
     if 'Time (sec)' not in df.columns:
@@ -125,8 +181,7 @@ def extract_batch_from_measurement(
     df_filtered_for_save.to_csv(extractionpath, index=False)
 
     # Data to be plot
-    columns_to_plot = ['ProcTempr *C', 'ChmbrTempr *C', 'SGTempr *C', 'ExtTmpr *C', 'ProcPress (bar)', 'ExtPress (bar)',
-                       "ShdHeat", "SgsHeat", "ChHeat"]
+    columns_to_plot = default_plot_columns
 
     # Check if columns to plot are valid
     if columns_to_plot is None:
@@ -139,6 +194,109 @@ def extract_batch_from_measurement(
     plot_csv_data(columns_to_plot, df_filtered)
 
 
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_VERSION = 2
+
+
+def file_sha256(filepath: str) -> str:
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def find_measurements(sources: list[str]) -> list[str]:
+    """ Recordings from directories (all meas_*.csv inside) and glob patterns, without duplicates """
+    filepaths = []
+    for source in sources:
+        pattern = os.path.join(source, "meas_*.csv") if os.path.isdir(source) else source
+        filepaths += sorted(glob.glob(pattern))
+    return list(dict.fromkeys(filepaths))
+
+
+def extraction_stem(filepath: str) -> str:
+    """ Outputs name of recording, short hash of its directory keeps same named recordings of many directories apart """
+    directory_hash = hashlib.sha1(os.path.dirname(os.path.abspath(filepath)).encode()).hexdigest()[:8]
+    return f"{os.path.splitext(os.path.basename(filepath))[0]}_{directory_hash}"
+
+
+def _extract_headless(filepath: str, extraction_dir: str, formats: tuple[str, ...], time_range,
+                      previous: dict | None) -> tuple[str, dict, bool]:
+    """ Process pool worker: extraction and plots of one recording, skipped if source and options are unchanged """
+    options = {"formats": list(formats), "time_range": list(time_range) if time_range else None}
+    entry = {"sha256": file_sha256(filepath), **options}
+    if previous is not None and all(previous.get(key) == value for key, value in entry.items()) \
+            and all(os.path.exists(os.path.join(extraction_dir, output)) for output in previous.get("outputs", [])):
+        return filepath, previous, True
+
+    import matplotlib
+    matplotlib.use("Agg")  # Workers never open windows
+
+    stem = extraction_stem(filepath)
+    df = pd.read_csv(filepath)
+    start_time, end_time = time_range if time_range else (None, None)
+    if start_time is not None:
+        df = df[df['Time (sec)'] >= start_time]
+    if end_time is not None:
+        df = df[df['Time (sec)'] <= end_time]
+
+    outputs = [f"{stem}.csv"] + [f"{stem}.{extension}" for extension in formats]
+    df.drop(columns=['Time (sec)']).to_csv(os.path.join(extraction_dir, outputs[0]), index=False)
+    plot_csv_data([column for column in default_plot_columns if column in df.columns], df,
+                  [os.path.join(extraction_dir, output) for output in outputs[1:]])
+    return filepath, {**entry, "outputs": outputs}, False
+
+
+@dataclass
+class ExtractionSummary:
+    extracted: list[str] = field(default_factory=list)
+    skipped: list[str] = field(default_factory=list)
+    failed: dict[str, str] = field(default_factory=dict)
+
+    def __str__(self):
+        lines = [f"Extracted {len(self.extracted)}, skipped unchanged {len(self.skipped)}, failed {len(self.failed)}"]
+        lines += [f"    {name}: {error}" for name, error in self.failed.items()]
+        return "\n".join(lines)
+
+
+def extract_many(filepaths: list[str], extraction_dir: str = "extractions", formats: tuple[str, ...] = ("png",),
+                 time_range=None, max_workers: int | None = None, force: bool = False) -> ExtractionSummary:
+    """
+    Extract and plot many recordings in process pool with Agg backend. Manifest in extraction directory keeps
+    sha256 of every source by its absolute path, recordings unchanged since last extraction with the same options
+    are skipped. Entries of sources not given are kept, also with force.
+    """
+    os.makedirs(extraction_dir, exist_ok=True)
+    manifest_path = os.path.join(extraction_dir, MANIFEST_FILENAME)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r") as f:
+            data = json.load(f)
+        if data.get("version") == MANIFEST_VERSION:
+            manifest = data["sources"]
+
+    summary = ExtractionSummary()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(_extract_headless, filepath, extraction_dir, tuple(formats), time_range,
+                                   None if force else manifest.get(os.path.abspath(filepath))): filepath
+                   for filepath in filepaths}
+        for future, filepath in futures.items():
+            key = os.path.abspath(filepath)
+            try:
+                _, entry, skipped = future.result()
+            except Exception as e:
+                summary.failed[filepath] = str(e)
+                manifest.pop(key, None)
+                continue
+            manifest[key] = entry
+            (summary.skipped if skipped else summary.extracted).append(filepath)
+
+    with open(manifest_path, "w") as f:
+        json.dump({"version": MANIFEST_VERSION, "sources": manifest}, f, indent=4)
+    return summary
+
+
 if __name__ == '__main__':
     extract_batch_from_measurement(filename="meas_prion_int_1000_id_PAbigwsadUS110V_fmt_v1_2024-11-25_16-22-41.csv",
                                    measurement_dir="../measurements",
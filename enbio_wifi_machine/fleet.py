@@ -0,0 +1,185 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from contextlib import ExitStack
+from dataclasses import dataclass
+from enbio_wifi_machine.common import put_drop_oldest
+from enbio_wifi_machine.machine import EnbioWiFiMachine, list_enbio_ports, probe_enbio_port
+from enbio_wifi_machine.recording import MeasurementRecorder, measurement_filepath
+
+
+def default_worker_count(devices: int) -> int:
+    """ Polling is bound by serial I/O, so like ThreadPoolExecutor default but never more workers than devices """
+    return max(1, min(devices, 32, (os.cpu_count() or 1) + 4))
+
+
+def discover_fleet(address: int = 1) -> dict[str, EnbioWiFiMachine]:
+    """ Probe all Enbio USB Serial ports at once, returns machines responding at address by port """
+    ports = list_enbio_ports()
+    with ThreadPoolExecutor(max_workers=default_worker_count(len(ports))) as pool:
+        device_ids = list(pool.map(lambda port: probe_enbio_port(port, address), ports))
+
+    return {port: EnbioWiFiMachine(port, address) for port, device_id in zip(ports, device_ids)
+            if device_id is not None}
+
+
+@dataclass
+class DeviceHealth:
+    name: str
+    device_id: str = ""
+    samples: int = 0
+    errors: int = 0
+    skipped: int = 0
+    """ Ticks missed because previous poll of this device was still running """
+    dropped: int = 0
+    """ Samples lost because recording queue was full """
+    last_sample_time: float | None = None
+    last_error: str | None = None
+
+    def sample_age(self, now: float) -> float | None:
+        return None if self.last_sample_time is None else now - self.last_sample_time
+
+
+class FleetRecorder:
+    """
+    Records many machines concurrently, each one to its own CSV file. Every interval one poll per machine is submitted
+    to the thread pool. Machine still busy with previous poll skips the tick, so stalled unit holds at most one worker
+    and never delays others. Samples go through bounded per device queues to one writer thread, when writing lags
+    oldest samples are dropped.
+    """
+
+    queue_size = 100
+
+    def __init__(self, machines: dict[str, EnbioWiFiMachine], interval: float = 1.0, dirname: str = "measurements",
+                 label: str = "fleet", max_workers: int | None = None):
+        self.machines = machines
+        self.interval = interval
+        self.dirname = dirname
+        self.label = label
+        self.max_workers = max_workers or default_worker_count(len(machines))
+        self.health = {name: DeviceHealth(name) for name in machines}
+        self.recorders: dict[str, MeasurementRecorder] = {}
+        self.is_stopping = False
+        self.start_time = None
+
+        self._queues = {name: queue.Queue(maxsize=self.queue_size) for name in machines}
+        self._pending: dict[str, Future] = {}
+        self._sample_ready = threading.Event()
+        self._pool: ThreadPoolExecutor | None = None
+        self._threads: list[threading.Thread] = []
+        self._connections = ExitStack()
+
+    def _read_device_id(self, name: str) -> str:
+        try:
+            return self.machines[name].get_device_id()
+        except Exception as e:
+            self.health[name].last_error = str(e)
+            return ""
+
+    def _identifier(self, name: str) -> str:
+        """ Device id in recording name, port is added when id is missing or not unique in fleet """
+        device_id = self.health[name].device_id
+        if device_id and [health.device_id for health in self.health.values()].count(device_id) == 1:
+            return device_id
+        return "_".join(filter(None, [device_id, os.path.basename(name)]))
+
+    def _poll(self, name: str, tick_time: float) -> None:
+        health = self.health[name]
+        try:
+            pline = self.machines[name].poll_process_line()
+        except Exception as e:
+            health.errors += 1
+            health.last_error = str(e)
+            return
+
+        health.samples += 1
+        health.last_sample_time = time.time()
+        health.dropped += put_drop_oldest(self._queues[name], (round(tick_time - self.start_time, 3), pline))
+        self._sample_ready.set()
+
+    def _tick_procedure(self):
+        next_tick = self.start_time
+        while not self.is_stopping:
+            for name in self.machines:
+                pending = self._pending.get(name)
+                if pending is not None and not pending.done():
+                    self.health[name].skipped += 1
+                    continue
+                self._pending[name] = self._pool.submit(self._poll, name, next_tick)
+
+            next_tick += self.interval
+            time.sleep(max(0.0, next_tick - time.time()))
+
+    def _write_pending(self) -> int:
+        written = 0
+        for name, samples in self._queues.items():
+            while True:
+                try:
+                    proctime, pline = samples.get_nowait()
+                except queue.Empty:
+                    break
+                self.recorders[name].write(proctime, pline)
+                written += 1
+        return written
+
+    def _writer_procedure(self):
+        while not self.is_stopping:
+            self._sample_ready.wait(timeout=0.1)
+            self._sample_ready.clear()
+            self._write_pending()
+
+    def start(self) -> None:
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        for machine in self.machines.values():
+            self._connections.enter_context(machine.keep_open())
+
+        for name, device_id in zip(self.machines, self._pool.map(self._read_device_id, self.machines)):
+            self.health[name].device_id = device_id
+
+        for name, health in self.health.items():
+            device_id = health.device_id
+            filepath = measurement_filepath(self.dirname, self.label, self.interval, self._identifier(name))
+            self.recorders[name] = MeasurementRecorder(filepath)
+            print(f"Recording {name} ({device_id or 'unknown id'}) to {filepath}")
+
+        self.start_time = time.time()
+        self._threads = [threading.Thread(target=self._tick_procedure, daemon=True),
+                         threading.Thread(target=self._writer_procedure, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        self.is_stopping = True
+        for thread in self._threads:
+            thread.join()
+        self._pool.shutdown(wait=True)
+        self._write_pending()
+
+        for recorder in self.recorders.values():
+            recorder.close()
+        self._connections.close()
+
+    def health_table(self) -> str:
+        now = time.time()
+        lines = [f"{'Device':<24}{'Id':<24}{'Samples':>9}{'Age s':>8}{'Errors':>8}{'Skipped':>9}{'Dropped':>9}"
+                 f"  Last error"]
+        for health in self.health.values():
+            age = health.sample_age(now)
+            lines.append(f"{health.name:<24}{health.device_id:<24}{health.samples:>9}"
+                         f"{'-' if age is None else f'{age:.1f}':>8}{health.errors:>8}{health.skipped:>9}"
+                         f"{health.dropped:>9}  {health.last_error or ''}")
+        return "\n".join(lines)
+
+    def run(self, duration: float | None = None, health_interval: float = 5.0) -> None:
+        """ Record until duration elapsed or KeyboardInterrupt, printing health of all devices """
+        self.start()
+        try:
+            while duration is None or time.time() - self.start_time < duration:
+                time.sleep(health_interval if duration is None
+                           else max(0.0, min(health_interval, self.start_time + duration - time.time())))
+                print(self.health_table())
+        finally:
+            self.stop()
+
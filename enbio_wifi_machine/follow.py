@@ -0,0 +1,91 @@
+import io
+import os
+import time
+import numpy as np
+import pandas as pd
+
+
+class RecordingFollower:
+    """
+    Reads recording while it is written (tail -f). Remembers byte offset, every poll parses only rows appended since
+    previous one. Partial last line (row being written) stays unread until its newline arrives. Poll of not grown file
+    costs one fstat, so many followers can watch the same recording.
+    """
+
+    def __init__(self, filepath: str, from_start: bool = True):
+        self.filepath = filepath
+        self.columns: list[str] | None = None
+        self.rows = 0
+        self._file = open(filepath, "rb")
+        self._offset = 0
+        self._header()
+        if not from_start:
+            # Skip rows already written, they are still counted
+            self.read_new_lines()
+
+    def _complete_lines(self, offset: int) -> bytes:
+        self._file.seek(offset)
+        data = self._file.read()
+        return data[:data.rfind(b"\n") + 1]
+
+    def _header(self) -> None:
+        if self.columns is not None:
+            return
+        header = self._complete_lines(0).split(b"\n", 1)[0]
+        if header:
+            self.columns = header.decode().rstrip("\r").split(",")
+            self._offset = len(header) + 1
+
+    @property
+    def offset(self) -> int:
+        """ Byte offset of first not yet read row """
+        return self._offset
+
+    def read_new_lines(self) -> bytes:
+        """ Complete lines appended since previous read, empty if file did not grow """
+        size = os.fstat(self._file.fileno()).st_size
+        if size < self._offset:
+            # Truncated or replaced by new recording with the same name, start over
+            self.columns, self._offset, self.rows = None, 0, 0
+        if size == self._offset:
+            return b""
+
+        self._header()
+        if self.columns is None:
+            return b""
+        data = self._complete_lines(self._offset)
+        self._offset += len(data)
+        self.rows += data.count(b"\n")
+        return data
+
+    def poll(self) -> pd.DataFrame:
+        """ New rows as DataFrame chunk, gap rows have NaN values """
+        data = self.read_new_lines()
+        if not data:
+            return pd.DataFrame(columns=self.columns or [])
+        return pd.read_csv(io.BytesIO(data), header=None, names=self.columns)
+
+    def poll_array(self) -> np.ndarray:
+        """ New rows as float array (rows x columns), booleans as 0/1 and gap rows as NaN """
+        return self.poll().astype(float).to_numpy().reshape(-1, len(self.columns or []))
+
+    def follow(self, interval: float = 1.0, idle_timeout: float | None = None):
+        """ Yield DataFrame chunks of new rows, stop after idle_timeout seconds without new row (never if None) """
+        last_data_time = time.monotonic()
+        while True:
+            chunk = self.poll()
+            if not chunk.empty:
+                last_data_time = time.monotonic()
+                yield chunk
+            elif idle_timeout is not None and time.monotonic() - last_data_time > idle_timeout:
+                return
+            time.sleep(interval)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,204 @@
+import math
+from dataclasses import dataclass
+from enum import Enum
+from enbio_wifi_machine.common import ProcessLine
+
+sensor_columns = {
+    "p_proc": "ProcPress (bar)",
+    "p_ext": "ExtPress (bar)",
+    "t_proc": "ProcTempr *C",
+    "t_chmbr": "ChmbrTempr *C",
+    "t_stmgn": "SGTempr *C",
+    "t_ext": "ExtTmpr *C",
+}
+""" SensorsMeasurements field by recording column """
+
+
+class RuleEventKind(Enum):
+    RAISED = 0
+    CLEARED = 1
+
+
+@dataclass
+class RuleEvent:
+    kind: RuleEventKind
+    rule: str
+    time: float
+    """ Process time in sec """
+    value: float
+    description: str
+
+    def __str__(self):
+        state = "raised" if self.kind == RuleEventKind.RAISED else "cleared"
+        return f"{self.time:>8.1f} s {self.rule} {state}: {self.description}, value {self.value:.2f}"
+
+
+class Rule:
+    """
+    Condition over one sample. measure() is called for every sample in order (O(1), may keep previous sample),
+    measure_columns() computes the same values for whole recording at once. is_violated() takes single value or array.
+    """
+    name = "rule"
+    description = ""
+    limit = 0.0
+
+    def measure(self, proctime: float, pline: ProcessLine) -> float:
+        raise NotImplementedError
+
+    def measure_columns(self, df):
+        """ Values of all rows of recording DataFrame as NumPy array, NaN for gap rows """
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        pass
+
+    def is_violated(self, value):
+        # NaN (unknown) is never violation
+        return value > self.limit
+
+
+class HeaterOverlapRule(Rule):
+    """ Chamber heaters and steam generator heaters must never be on at the same time """
+    name = "heater_overlap"
+    description = "chamber and steam generator heaters on at the same time"
+    limit = 0.5
+
+    def measure(self, proctime: float, pline: ProcessLine) -> float:
+        do_state = pline.do_state
+        return float(do_state.ch_heaters and (do_state.sg_heaters_double or do_state.sg_heater_single))
+
+    def measure_columns(self, df):
+        import numpy as np  # Offline evaluation only, keeps CLI import light
+        heaters = df[["ChHeat", "ShdHeat", "SgsHeat"]].astype(float).to_numpy()
+        overlap = ((heaters[:, 0] > 0) & ((heaters[:, 1] > 0) | (heaters[:, 2] > 0))).astype(float)
+        overlap[np.isnan(heaters).any(axis=1)] = np.nan
+        return overlap
+
+
+class LimitRule(Rule):
+    """ Sensor value above maximum or below minimum, e.g. chamber pressure limit """
+
+    def __init__(self, sensor: str, maximum: float | None = None, minimum: float | None = None):
+        if (maximum is None) == (minimum is None):
+            raise ValueError("LimitRule needs exactly one of maximum or minimum.")
+        self.sensor = sensor
+        self.maximum = maximum
+        self.minimum = minimum
+        self.name = f"{sensor}_{'max' if maximum is not None else 'min'}"
+        self.description = f"{sensor} above {maximum}" if maximum is not None else f"{sensor} below {minimum}"
+
+    def measure(self, proctime: float, pline: ProcessLine) -> float:
+        return getattr(pline.sensors_msrs, self.sensor)
+
+    def measure_columns(self, df):
+        return df[sensor_columns[self.sensor]].astype(float).to_numpy()
+
+    def is_violated(self, value):
+        return value > self.maximum if self.maximum is not None else value < self.minimum
+
+
+class RateRule(Rule):
+    """ Absolute rate of change of sensor value in units per second above limit, e.g. temperature runaway """
+
+    def __init__(self, sensor: str, max_rate: float):
+        self.sensor = sensor
+        self.limit = max_rate
+        self.name = f"{sensor}_rate"
+        self.description = f"{sensor} changes faster than {max_rate}/s"
+        self._previous: tuple[float, float] | None = None
+
+    def measure(self, proctime: float, pline: ProcessLine) -> float:
+        value = getattr(pline.sensors_msrs, self.sensor)
+        previous, self._previous = self._previous, (proctime, value)
+        if previous is None or proctime <= previous[0]:
+            return math.nan
+        return abs(value - previous[1]) / (proctime - previous[0])
+
+    def measure_columns(self, df):
+        import numpy as np  # Offline evaluation only, keeps CLI import light
+        time = df["Time (sec)"].astype(float).to_numpy()
+        values = df[sensor_columns[self.sensor]].astype(float).to_numpy()
+
+        # Rate to previous row, NaN for first row and around gap rows like after reset online
+        rates = np.full(len(values), np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rates[1:] = np.abs(np.diff(values)) / np.diff(time)
+        return rates
+
+    def reset(self) -> None:
+        self._previous = None
+
+
+def default_rules() -> list[Rule]:
+    return [
+        HeaterOverlapRule(),
+        LimitRule("p_proc", maximum=3.6),
+        RateRule("t_proc", max_rate=5.0),
+    ]
+
+
+class RuleEngine:
+    """
+    Evaluates rules on every sample and emits event when rule becomes violated and when it is cleared again.
+    Listeners are called with every event. Works without plotter, online in acquisition loop or offline on recordings.
+    """
+
+    def __init__(self, rules: list[Rule] | None = None, on_event=None):
+        self.rules = default_rules() if rules is None else rules
+        self.listeners = [] if on_event is None else [on_event]
+        self.active: dict[str, RuleEvent] = {}
+        """ Currently violated rules with event of raising """
+
+    def add_listener(self, callback) -> None:
+        self.listeners.append(callback)
+
+    def _emit(self, events: list[RuleEvent]) -> list[RuleEvent]:
+        for event in events:
+            for listener in self.listeners:
+                listener(event)
+        return events
+
+    def check(self, proctime: float, pline: ProcessLine) -> list[RuleEvent]:
+        events = []
+        for rule in self.rules:
+            value = rule.measure(proctime, pline)
+            violated = rule.is_violated(value)
+            if violated and rule.name not in self.active:
+                self.active[rule.name] = RuleEvent(RuleEventKind.RAISED, rule.name, proctime, value, rule.description)
+                events.append(self.active[rule.name])
+            elif not violated and rule.name in self.active and not math.isnan(value):
+                del self.active[rule.name]
+                events.append(RuleEvent(RuleEventKind.CLEARED, rule.name, proctime, value, rule.description))
+        return self._emit(events)
+
+    def gap(self) -> None:
+        """ Samples are missing, rules comparing with previous sample start over """
+        for rule in self.rules:
+            rule.reset()
+
+    def evaluate_recording(self, df) -> list[RuleEvent]:
+        """ Events of whole recording DataFrame, each rule is evaluated over all rows at once """
+        import numpy as np  # Offline evaluation only, keeps CLI import light
+        time = df["Time (sec)"].astype(float).to_numpy()
+        events = []
+        for rule in self.rules:
+            values = rule.measure_columns(df)
+            with np.errstate(invalid="ignore"):
+                violated = rule.is_violated(values)
+            # NaN (gap rows, first sample of rate) keeps previous state, like online check
+            known = ~np.isnan(values)
+            if not known.any():
+                continue
+            state = violated[known]
+            rows = np.flatnonzero(known)
+            changes = np.flatnonzero(np.diff(np.concatenate(([False], state)).astype(np.int8)))
+            for change in changes:
+                row = rows[change]
+                kind = RuleEventKind.RAISED if state[change] else RuleEventKind.CLEARED
+                events.append(RuleEvent(kind, rule.name, float(time[row]), float(values[row]), rule.description))
+        events.sort(key=lambda event: event.time)
+        return self._emit(events)
+
+    def evaluate_file(self, filepath: str) -> list[RuleEvent]:
+        import pandas as pd  # Offline evaluation only, keeps CLI import light
+        return self.evaluate_recording(pd.read_csv(filepath))
@@ -0,0 +1,116 @@
+import threading
+import time
+from dataclasses import dataclass
+from enum import Enum
+from enbio_wifi_machine.common import ProcessType, EnbioDeviceInternalException, process_final_phase, await_condition
+
+PROC_STATUS_RUNNING = 1
+
+
+class ProcessEventKind(Enum):
+    START = 0
+    PHASE_CHANGE = 1
+    FINISH = 2
+    ABORT = 3
+
+
+@dataclass
+class ProcessState:
+    status: int
+    phase: int
+    seconds: int
+    proc_type: None | ProcessType = None
+
+    @property
+    def is_running(self) -> bool:
+        return self.status == PROC_STATUS_RUNNING
+
+
+@dataclass
+class ProcessEvent:
+    kind: ProcessEventKind
+    timestamp: float
+    state: ProcessState
+    previous_phase: int | None = None
+
+
+class ProcessLifecycle:
+    """
+    Tracks PROC_STATUS, PROC_PHASE and PROC_SECONDS transitions of the machine and emits start/phase change/finish/abort
+    events. Leaving running status in final phase of process is finish, leaving it earlier or after interrupt is abort.
+    Updates from many threads (monitoring loop, waiting for state) are serialized by lock.
+    """
+
+    def __init__(self, machine, on_event=None):
+        self.machine = machine
+        self.listeners = [] if on_event is None else [on_event]
+        self.state: ProcessState | None = None
+        self.proc_type: None | ProcessType = None
+        self.interrupt_requested = False
+        self.lock = threading.RLock()
+        """ Held while state is read and applied, so every transition is seen exactly once """
+
+    def add_listener(self, callback) -> None:
+        self.listeners.append(callback)
+
+    def read_state(self) -> ProcessState:
+        return ProcessState(
+            status=self.machine.get_process_status(),
+            phase=self.machine.get_phase_id(),
+            seconds=self.machine.get_process_seconds(),
+        )
+
+    def poll(self) -> list[ProcessEvent]:
+        """ Read process registers from machine and emit events of transitions since last update """
+        with self.lock:
+            return self.update(self.read_state())
+
+    def update(self, state: ProcessState) -> list[ProcessEvent]:
+        """ Feed already polled state, e.g. taken from ProcessLine """
+        with self.lock:
+            previous, self.state = self.state, state
+            if state.proc_type is not None:
+                self.proc_type = state.proc_type
+
+            events = []
+            was_running = previous is not None and previous.is_running
+
+            if state.is_running and not was_running:
+                self.interrupt_requested = False
+                events.append(ProcessEvent(ProcessEventKind.START, time.time(), state))
+
+            elif state.is_running and previous.phase != state.phase:
+                events.append(ProcessEvent(ProcessEventKind.PHASE_CHANGE, time.time(), state, previous.phase))
+
+            elif was_running and not state.is_running:
+                final_phase = process_final_phase.get(self.proc_type, process_final_phase[None])
+                finished = previous.phase >= final_phase and not self.interrupt_requested
+                kind = ProcessEventKind.FINISH if finished else ProcessEventKind.ABORT
+                events.append(ProcessEvent(kind, time.time(), state, previous.phase))
+
+            for event in events:
+                for listener in self.listeners:
+                    listener(event)
+
+            return events
+
+    @property
+    def is_running(self) -> bool:
+        return self.state is not None and self.state.is_running
+
+    def wait_for(self, condition, timeout: float, max_interval: float = 0.25) -> ProcessState:
+        """ Poll until condition(state) is met, raises EnbioDeviceInternalException after deadline """
+        def poll_state() -> ProcessState:
+            self.poll()
+            return self.state
+
+        result = await_condition(poll_state, condition, timeout, max_interval=max_interval)
+        if not result.success:
+            raise EnbioDeviceInternalException(f"Process state {self.state} not reached in {timeout} s")
+        return result.value
+
+    def wait_started(self, timeout: float = 5.0) -> ProcessState:
+        return self.wait_for(lambda state: state.is_running, timeout)
+
+    def wait_stopped(self, timeout: float) -> ProcessState:
+        return self.wait_for(lambda state: not state.is_running, timeout)
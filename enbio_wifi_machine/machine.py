@@ -1,38 +1,165 @@
-import csv
-import os
 import threading
 import time
+from collections import deque
 import minimalmodbus
 import serial.tools.list_ports
 from datetime import datetime
-from enbio_wifi_machine.plotter import LivePlotter
 from enbio_wifi_machine.common import ProcessType, label_to_process_type, ProcessLine, EnbioDeviceInternalException, \
     float_to_ints, \
-    ints_to_float, cfg, process_type_values, ScreenId, ScaleFactors, ScaleFactor, Relay, RelayState, ValveState, \
-    DOState, PWRState, SensorsMeasurements, HeatersToggleCounts
+    ints_to_float, process_type_values, ScreenId, ScaleFactors, ScaleFactor, Relay, RelayState, ValveState, \
+    DOState, PWRState, SensorsMeasurements, HeatersToggleCounts, DoorDriveReport, DoorOvershootReport, AwaitResult, \
+    await_condition
 from enbio_wifi_machine.modbus_registers import ModbusRegister
+from enbio_wifi_machine.transport import ModbusTransport, SerialTransport, TcpTransport, MODBUS_TCP_DEFAULT_PORT, \
+    plan_block_reads, is_link_lost
+from enbio_wifi_machine.scheduler import TransactionScheduler, ScheduledTransport, Lane, LaneStats, use_lane
+from enbio_wifi_machine.cache import RegisterCache, CachingTransport, CacheStats
+from enbio_wifi_machine.recording import MeasurementRecorder, measurement_filepath, SegmentedRecorder
+from enbio_wifi_machine.analytics import CycleAnalytics
+from enbio_wifi_machine.interlocks import RuleEngine
+from enbio_wifi_machine.sinks import SinkGroup
+from enbio_wifi_machine.lifecycle import ProcessLifecycle, ProcessState, ProcessEvent, ProcessEventKind, \
+    PROC_STATUS_RUNNING
+
+
+ENBIO_WIFI_USB_SERIAL_NUMBER = "ENBIOWIFIBOARD"
+
+
+scale_factor_registers = [
+    (ModbusRegister.SCALE_FACTORS_PRESS_PROC_A.value, ModbusRegister.SCALE_FACTORS_PRESS_PROC_B.value),
+    (ModbusRegister.SCALE_FACTORS_TMPR_PROC_A.value, ModbusRegister.SCALE_FACTORS_TMPR_PROC_B.value),
+    (ModbusRegister.SCALE_FACTORS_TMPR_CHMBR_A.value, ModbusRegister.SCALE_FACTORS_TMPR_CHMBR_B.value),
+    (ModbusRegister.SCALE_FACTORS_TMPR_SG_A.value, ModbusRegister.SCALE_FACTORS_TMPR_SG_B.value),
+]
+""" Float registers of 'a' and 'b' coefficient in ScaleFactors fields order """
+
+scale_factor_blocks = [
+    (ModbusRegister.SCALE_FACTORS_PRESS_PROC_A.value, 8),
+    (ModbusRegister.SCALE_FACTORS_PRESS_PROC_B.value, 8),
+]
+""" Block reads covering all scale factors, registers between blocks are not readable """
+
+block_read_boundaries = [
+    ModbusRegister.SCALE_FACTORS_TMPR_SG_B.value + 2,
+    ModbusRegister.SCALE_FACTORS_PRESS_PROC_A.value,
+]
+""" Addresses planned block reads must not cross, edges of unreadable range between scale factor blocks """
+
+
+def list_enbio_ports() -> list[str]:
+    """ USB Serial ports reporting Enbio WiFi serial number, ports are not probed """
+    return [port.device for port in serial.tools.list_ports.comports()
+            if port.serial_number == ENBIO_WIFI_USB_SERIAL_NUMBER]
+
+
+def probe_enbio_port(port: str, address: int = 1) -> str | None:
+    """ Device id of machine responding on port, None if there is no response """
+    print(f"Found Enbio device on port: {port}")
+    try:
+        # Try to initialize the Modbus device on this port
+        response_device_id = EnbioWiFiMachine._get_device_id(SerialTransport(port, address))
+        print(f"Device found on port {port} with device id: {response_device_id}")
+        return response_device_id
+
+    except (minimalmodbus.NoResponseError, minimalmodbus.SlaveReportedException, IOError):
+        # If there’s no response or an error, skip this port
+        return None
 
 
 class EnbioWiFiMachine:
     """ Abstraction of Enbio WiFi machine via USB Serial Modbus RTU protocol """
 
-    enbio_wifi_usb_serial_number = "ENBIOWIFIBOARD"
+    enbio_wifi_usb_serial_number = ENBIO_WIFI_USB_SERIAL_NUMBER
     """ Value in USB Serial port used to distinguis Enbio WiFi devices """
 
     device_id_max_length = 32
     """ Device id is called serial number. Using Device id to distinguish from other """
 
-    def __init__(self, port: [str | None] = None, address=1):
-        port = self._detect_modbus_device_port(address) if port is None else port
-        if port is None:
-            raise EnbioDeviceInternalException("Modbus device not found on any available port.")
+    def __init__(self, port: [str | None] = None, address=1, transport: ModbusTransport | None = None,
+                 scheduler: TransactionScheduler | None = None, cache: RegisterCache | None = None):
+        self.device_id: str | None = None
+        """ Device id used to find the machine again after reconnecting, known after detection or remember_device_id """
+
+        if transport is None:
+            port = self._detect_modbus_device_port(address) if port is None else port
+            if port is None:
+                raise EnbioDeviceInternalException("Modbus device not found on any available port.")
+
+            transport = SerialTransport(port, address)
+
+        # Every frame goes through scheduler, so machine can be used from many threads
+        if not isinstance(transport, ScheduledTransport):
+            transport = ScheduledTransport(transport, scheduler or TransactionScheduler(), address)
+
+        self.address = address
+        self.scheduler = transport.scheduler
+        self._scheduled_transport = transport
+
+        # Opt-in, cache hits do not wait for the bus
+        self.cache = cache
+        self._device = transport if cache is None else CachingTransport(transport, cache)
+        self.door_drive_reports: deque[DoorDriveReport] = deque(maxlen=1000)
+        self.lifecycle = ProcessLifecycle(self)
+
+    def lane_stats(self) -> dict[Lane, LaneStats]:
+        """ Waiting time for bus per priority lane """
+        return self.scheduler.lane_stats()
+
+    def cache_stats(self) -> CacheStats | None:
+        """ Hits, misses and estimated bus time saved by register cache, None when caching is off """
+        return None if self.cache is None else self.cache.stats
+
+    def remember_device_id(self) -> str:
+        if self.device_id is None:
+            self.device_id = self.get_device_id()
+        return self.device_id
+
+    def _find_device_transport(self, device_id: str) -> ModbusTransport | None:
+        if not isinstance(self._scheduled_transport.inner, SerialTransport):
+            raise EnbioDeviceInternalException("Reconnecting is supported only for USB Serial port")
+
+        # Ports may renumber after replugging, so all of them are probed
+        for port in list_enbio_ports():
+            if probe_enbio_port(port, self.address) == device_id:
+                return SerialTransport(port, self.address)
+        return None
+
+    def reconnect(self, timeout: float = 60.0) -> AwaitResult:
+        """
+        Find the machine with the same device id again after port loss and continue on new port. Scheduler and
+        lifecycle are kept, cache is flushed. Raises EnbioDeviceInternalException when not found before deadline.
+        """
+        if self.device_id is None:
+            raise EnbioDeviceInternalException("Device id not known, machine can not be found again")
+
+        try:
+            self._scheduled_transport.inner.close()
+        except OSError:
+            pass
 
-        self._device = minimalmodbus.Instrument(port, address, close_port_after_each_call=True, debug=False)
-        self._device.serial.baudrate = cfg["serial_port"]
-        self._device.serial.bytesize = 8
-        self._device.serial.stopbits = 1
-        self._device.serial.parity = minimalmodbus.serial.PARITY_EVEN
-        self._device.serial.timeout = cfg["serial_timeout"]
+        result = await_condition(lambda: self._find_device_transport(self.device_id),
+                                 lambda transport: transport is not None, timeout,
+                                 initial_interval=0.1, max_interval=1.0)
+        if not result.success:
+            raise EnbioDeviceInternalException(f"Device {self.device_id} not found in {timeout} s")
+
+        self._scheduled_transport.inner = result.value
+        if self.cache is not None:
+            self.cache.flush()
+        print(f"Reconnected to {self.device_id} in {result.elapsed:.1f} s")
+        return result
+
+    @classmethod
+    def over_tcp(cls, host: str, port: int = MODBUS_TCP_DEFAULT_PORT, address=1) -> "EnbioWiFiMachine":
+        """ Machine behind Modbus TCP gateway (RS-485/USB to Ethernet) """
+        return cls(address=address, transport=TcpTransport(host, port, unit=address))
+
+    def keep_open(self):
+        """ Keep port open between calls inside the block, e.g. for sequence of many operations """
+        return self._device.keep_open()
+
+    def close(self) -> None:
+        self._device.close()
 
     def write_int_register(self, register: int, value: int):
         self._device.write_register(register, value)
@@ -40,6 +167,9 @@ class EnbioWiFiMachine:
     def read_int_register(self, register: int) -> int:
         return self._device.read_register(register)
 
+    def read_int_registers(self, register: int, count: int) -> list[int]:
+        return self._device.read_registers(register, count)
+
     def _read_float_register(self, register):
         low, high = self._device.read_registers(register, 2)
         return ints_to_float(low, high)
@@ -49,90 +179,144 @@ class EnbioWiFiMachine:
         self._device.write_register(register, low)
         self._device.write_register(register + 1, high)
 
-    def _write_reg_feedback(self, register, value, await_time: float = 0.1):
-        """ Writes register and read value back to ensure """
+    def _await_register(self, register: int, condition, timeout: float) -> AwaitResult:
+        return await_condition(lambda: self._device.read_register(register), condition, timeout)
+
+    def await_registers(self, conditions: dict, timeout: float | None = None) -> AwaitResult:
+        """
+        Wait until all registers meet conditions, given as expected value or predicate, e.g.
+        {PROC_STATUS: 1, PROC_PHASE: lambda phase: phase >= 8}. All registers are read in one block read.
+        Result value is dict of register to last read value.
+        """
+        def matches(expected, value) -> bool:
+            return expected(value) if callable(expected) else expected == value
+
+        return await_condition(
+            lambda: self.read_register_map(conditions.keys()),
+            lambda values: all(matches(expected, values[register]) for register, expected in conditions.items()),
+            timeout,
+        )
+
+    def read_register_map(self, registers, max_gap: int = 8) -> dict[int, int]:
+        """
+        Read registers with the fewest block reads, a block may span up to max_gap unused registers but never known
+        unreadable ones. Block rejected by device because of other unreadable gap is read again as contiguous runs.
+        """
+        values = {}
+        for first, count in plan_block_reads(registers, max_gap, self._device.max_registers_per_read,
+                                             block_read_boundaries):
+            wanted = [register for register in registers if first <= register < first + count]
+            try:
+                block_values = self._device.read_registers(first, count)
+                values.update((register, block_values[register - first]) for register in wanted)
+            except minimalmodbus.IllegalRequestError:
+                if max_gap == 0:
+                    raise
+                values.update(self.read_register_map(wanted, max_gap=0))
+        return values
+
+    def write_register_map(self, values: dict[int, int]) -> int:
+        """ Write registers coalescing adjacent ones into block writes, returns number of transactions used """
+        transactions = 0
+        registers = sorted(values)
+        while registers:
+            block = [registers.pop(0)]
+            while (registers and registers[0] == block[-1] + 1
+                   and len(block) < self._device.max_registers_per_write):
+                block.append(registers.pop(0))
+            self._device.write_registers(block[0], [values[register] for register in block])
+            transactions += 1
+        return transactions
+
+    def _write_reg_feedback(self, register, value, timeout: float = 1.0) -> AwaitResult:
+        """ Writes register and reads value back until it matches or deadline passes """
 
         print(f"_write_reg_feedback {register} -> {value}")
         self._device.write_register(register, value)
-        time.sleep(await_time)
 
-        feedback_value = self._device.read_register(register)
-        print(f"_write_reg_feedback {register} <- {feedback_value}")
+        result = self._await_register(register, lambda feedback_value: feedback_value == value, timeout)
+        print(f"_write_reg_feedback {register} <- {result.value} in {result.elapsed * 1000:.1f} ms")
 
         # Check if the value is as expected
-        if value != feedback_value:
-            raise EnbioDeviceInternalException(f"Error: Expected value {value}, but got {feedback_value}")
+        if not result.success:
+            raise EnbioDeviceInternalException(f"Error: Expected value {value}, but got {result.value}")
+        return result
 
-    def _write_ctrl_reg_feedback(self, register, await_time: float = 0.1):
+    def _write_ctrl_reg_feedback(self, register, timeout: float = 1.0) -> AwaitResult:
         """ Writes register flag and awaits clearing (reading 0) or getting error result (reading 0xFFFF) """
         activating_value = 1
         success_value = 0
         print(f"_write_ctrl_reg_feedback {register} -> {activating_value}")
         self._device.write_register(register, activating_value)
-        time.sleep(await_time)
 
-        feedback_value = self._device.read_register(register)
-        print(f"_write_ctrl_reg_feedback {register} <- {feedback_value}")
+        result = self._await_register(register, lambda feedback_value: feedback_value != activating_value, timeout)
+        print(f"_write_ctrl_reg_feedback {register} <- {result.value} in {result.elapsed * 1000:.1f} ms")
 
         # Check if the value is as expected
-        if feedback_value != success_value:
-            raise EnbioDeviceInternalException(f"Error: Expected value {activating_value}, but got {feedback_value}")
+        if result.value != success_value:
+            raise EnbioDeviceInternalException(f"Error: Expected value {success_value}, but got {result.value}")
+        return result
 
     def _detect_modbus_device_port(self, address) -> str | None:
         """Attempt to automatically detect the Modbus device by scanning available serial ports."""
-        # List all available serial ports
-        available_ports = serial.tools.list_ports.comports()
-
-        for port in available_ports:
-            if port.serial_number != self.enbio_wifi_usb_serial_number:
-                continue
-
-            print(f"Found Enbio device on port: {port.name}")
-
-            try:
-                # Try to initialize the Modbus device on this port
-                tmp_device = minimalmodbus.Instrument(port.device, address, close_port_after_each_call=True, debug=False)
-                tmp_device.serial.baudrate = cfg["serial_port"]
-                tmp_device.serial.bytesize = 8
-                tmp_device.serial.stopbits = 1
-                tmp_device.serial.parity = minimalmodbus.serial.PARITY_EVEN
-                tmp_device.serial.timeout = cfg["serial_timeout"]
-
-                response_device_id = self._get_device_id(tmp_device)
-                print(f"Device found on port {port.device} with device id: {response_device_id}")
-                return port.device  # Return the detected port if communication is successful
-
-            except (minimalmodbus.NoResponseError, minimalmodbus.SlaveReportedException, IOError):
-                # If there’s no response or an error, skip this port
-                continue
+        for port in list_enbio_ports():
+            self.device_id = probe_enbio_port(port, address)
+            if self.device_id is not None:
+                return port  # Return the detected port if communication is successful
 
         # Return None if no valid Modbus device is found on any port
         return None
 
-    def _drv_coil_until(self, direction_func, stop_condition_func, timeout: float | None = None,
-                        action_name: str = "move") -> None:
-        """Move the door in a specified direction until a condition is met, with feedback and optional timeout."""
-        start_time = time.time()
-
-        # Start moving the door in the specified direction
-        direction_func()
-
-        try:
-            while not stop_condition_func():
-                # Check for timeout
-                if timeout is not None and (time.time() - start_time) > timeout:
-                    self.door_drv_none()  # Stop the motor
-                    raise EnbioDeviceInternalException(f"Timeout reached while attempting to {action_name} the door.")
+    def _drv_coil_until_switch(self, direction_value: int, expect_unlocked: bool, timeout: float | None = None,
+                               action_name: str = "move") -> DoorDriveReport:
+        """
+        Drive the door until lock switch reads expected state. Port is kept open and frames go through safety lane.
+        Between switch change and motor stop there is only one write, feedback is verified after motor stopped.
+        """
+        coil_register = ModbusRegister.COIL_CONTROL.value
+        unlocked_register = ModbusRegister.DOOR_UNLOCKED.value
 
-                time.sleep(0.01)  # Small delay to avoid excessive polling
+        with self._device.keep_open(), use_lane(Lane.SAFETY):
+            start_time = time.perf_counter()
+            self._device.write_register(coil_register, direction_value)
 
-            # Stop the motor once the condition is met
-            self.door_drv_none()
-            print(f"Door {action_name} successfully.")
-
-        except Exception as e:
-            self.door_drv_none()  # Ensure the motor stops in case of any error
-            raise e
+            try:
+                polls = 0
+                poll_start_time = time.perf_counter()
+                while True:
+                    poll_start_time = time.perf_counter()
+                    is_unlocked = self._device.read_register(unlocked_register) != 0
+                    detect_time = time.perf_counter()
+                    polls += 1
+
+                    if is_unlocked == expect_unlocked:
+                        break
+
+                    if timeout is not None and (detect_time - start_time) > timeout:
+                        raise EnbioDeviceInternalException(
+                            f"Timeout reached while attempting to {action_name} the door.")
+
+                self._device.write_register(coil_register, 0)
+                stop_time = time.perf_counter()
+
+            except BaseException:
+                self._device.write_register(coil_register, 0)  # Ensure the motor stops in case of any error
+                raise
+
+            feedback_value = self._device.read_register(coil_register)
+            if feedback_value != 0:
+                raise EnbioDeviceInternalException(f"Error: Expected value 0, but got {feedback_value}")
+
+        report = DoorDriveReport(
+            action=action_name,
+            duration=stop_time - start_time,
+            polls=polls,
+            stop_latency=stop_time - detect_time,
+            overshoot_bound=stop_time - poll_start_time,
+        )
+        self.door_drive_reports.append(report)
+        print(f"Door {action_name} successfully, stop latency {report.stop_latency * 1000:.1f} ms.")
+        return report
 
     def set_device_id(self, dev_id: str) -> None:
         if len(dev_id) > self.device_id_max_length:
@@ -145,9 +329,10 @@ class EnbioWiFiMachine:
         print(f"Device ID set to: {dev_id}")
 
     @classmethod
-    def _get_device_id(cls, device: minimalmodbus.Instrument):
+    def _get_device_id(cls, device: ModbusTransport):
         dev_id = device.read_string(ModbusRegister.DEVICE_ID.value, cls.device_id_max_length)
-        return dev_id.rstrip('\0')
+        # Written id is padded with zeros to 32 characters, rest of registers with spaces
+        return dev_id.rstrip(' ').rstrip('\0')
 
     def get_device_id(self) -> str:
         try:
@@ -163,31 +348,36 @@ class EnbioWiFiMachine:
         return self._device.read_register(ModbusRegister.DOOR_UNLOCKED.value) != 0
 
     def door_drv_fwd(self) -> None:
-        self._write_reg_feedback(ModbusRegister.COIL_CONTROL.value, 2, await_time=0.001)
+        self._write_reg_feedback(ModbusRegister.COIL_CONTROL.value, 2, timeout=0.25)
 
     def door_drv_bwd(self) -> None:
-        self._write_reg_feedback(ModbusRegister.COIL_CONTROL.value, 1, await_time=0.001)
+        self._write_reg_feedback(ModbusRegister.COIL_CONTROL.value, 1, timeout=0.25)
 
     def door_drv_none(self) -> None:
-        self._write_reg_feedback(ModbusRegister.COIL_CONTROL.value, 0, await_time=0.001)
+        with use_lane(Lane.SAFETY):
+            self._write_reg_feedback(ModbusRegister.COIL_CONTROL.value, 0, timeout=0.25)
 
-    def door_lock_with_feedback(self, timeout: float | None = None) -> None:
+    def door_lock_with_feedback(self, timeout: float | None = None) -> DoorDriveReport:
         """Drive forward until the door is locked."""
-        self._drv_coil_until(
-            direction_func=self.door_drv_fwd,
-            stop_condition_func=lambda: not self.is_door_unlocked(),
-            timeout=timeout,
-            action_name="lock"
-        )
+        return self._drv_coil_until_switch(direction_value=2, expect_unlocked=False, timeout=timeout,
+                                           action_name="lock")
 
-    def door_unlock_with_feedback(self, timeout: float | None = None) -> None:
+    def door_unlock_with_feedback(self, timeout: float | None = None) -> DoorDriveReport:
         """Drive backward until the door is unlocked."""
-        self._drv_coil_until(
-            direction_func=self.door_drv_bwd,
-            stop_condition_func=self.is_door_unlocked,
-            timeout=timeout,
-            action_name="unlock"
-        )
+        return self._drv_coil_until_switch(direction_value=1, expect_unlocked=True, timeout=timeout,
+                                           action_name="unlock")
+
+    def door_overshoot_report(self, cycles: int = 20, timeout: float | None = 2.0) -> DoorOvershootReport:
+        """ Run lock/unlock cycles and gather stop latency statistics """
+        reports = []
+        for _ in range(cycles):
+            if self.is_door_unlocked():
+                reports.append(self.door_lock_with_feedback(timeout))
+                reports.append(self.door_unlock_with_feedback(timeout))
+            else:
+                reports.append(self.door_unlock_with_feedback(timeout))
+                reports.append(self.door_lock_with_feedback(timeout))
+        return DoorOvershootReport.from_reports(reports, cycles)
 
     def get_test_int(self) -> int:
         return self._device.read_register(ModbusRegister.TEST_INT.value)
@@ -223,24 +413,19 @@ class EnbioWiFiMachine:
 
     def get_datetime(self) -> datetime:
         # Note: can also use get/set variant
-        return datetime(
-            year=self._device.read_register(ModbusRegister.DATETIME_GET_YEAR.value),
-            month=self._device.read_register(ModbusRegister.DATETIME_GET_MONTH.value),
-            day=self._device.read_register(ModbusRegister.DATETIME_GET_DAY.value),
-            hour=self._device.read_register(ModbusRegister.DATETIME_GET_HOUR.value),
-            minute=self._device.read_register(ModbusRegister.DATETIME_GET_MINUTE.value),
-            second=self._device.read_register(ModbusRegister.DATETIME_GET_SECOND.value),
-            microsecond=0
-        )
+        year, month, day, hour, minute, second = self._device.read_registers(ModbusRegister.DATETIME_GET_YEAR.value, 6)
+        return datetime(year=year, month=month, day=day, hour=hour, minute=minute, second=second, microsecond=0)
 
     def set_datetime(self, dt: datetime) -> None:
         dt = dt.replace(second=0, microsecond=0)
 
-        self._device.write_register(ModbusRegister.DATETIME_GET_SET_DAY.value, dt.day)
-        self._device.write_register(ModbusRegister.DATETIME_GET_SET_MONTH.value, dt.month)
-        self._device.write_register(ModbusRegister.DATETIME_GET_SET_YEAR.value, dt.year)
-        self._device.write_register(ModbusRegister.DATETIME_GET_SET_HOUR.value, dt.hour)
-        self._device.write_register(ModbusRegister.DATETIME_GET_SET_MINUTE.value, dt.minute)
+        self.write_register_map({
+            ModbusRegister.DATETIME_GET_SET_DAY.value: dt.day,
+            ModbusRegister.DATETIME_GET_SET_MONTH.value: dt.month,
+            ModbusRegister.DATETIME_GET_SET_YEAR.value: dt.year,
+            ModbusRegister.DATETIME_GET_SET_HOUR.value: dt.hour,
+            ModbusRegister.DATETIME_GET_SET_MINUTE.value: dt.minute,
+        })
 
         self._write_ctrl_reg_feedback(ModbusRegister.DATETIME_SAVE.value)
 
@@ -258,7 +443,7 @@ class EnbioWiFiMachine:
         return self._device.read_register(ModbusRegister.EXECUTION_COUNTER.value)
 
     def clear_process_counter(self) -> None:
-        self._write_reg_feedback(ModbusRegister.EXECUTION_COUNTER.value, 0, await_time=1.0)
+        self._write_reg_feedback(ModbusRegister.EXECUTION_COUNTER.value, 0, timeout=1.0)
 
     def save_all(self) -> None:
         self._write_ctrl_reg_feedback(ModbusRegister.SAVE_ALL.value)
@@ -269,21 +454,32 @@ class EnbioWiFiMachine:
         except Exception:
             pass
 
-    def start_process(self, process_type: ProcessType) -> None:
+    def get_process_status(self) -> int:
+        return self._device.read_register(ModbusRegister.PROC_STATUS.value)
+
+    def get_process_seconds(self) -> int:
+        return self._device.read_register(ModbusRegister.PROC_SECONDS.value)
+
+    def start_process(self, process_type: ProcessType, timeout: float = 5.0) -> None:
         print(f"start screen {self._device.read_register(ModbusRegister.CHANGE_SCREEN.value)}")
 
-        if self._device.read_register(ModbusRegister.PROC_STATUS.value) == 1:
+        if self.get_process_status() == PROC_STATUS_RUNNING:
             raise EnbioDeviceInternalException("Process already running")
 
         print(f"Starting Process Type: {process_type}")
 
-        self._device.write_register(ModbusRegister.PROC_SELECT_START.value, process_type_values[process_type])
-        time.sleep(0.5)
+        # Selection is acknowledged by reading back process value, older firmware just needs a while
+        selected_value = process_type_values[process_type]
+        self._device.write_register(ModbusRegister.PROC_SELECT_START.value, selected_value)
+        self._await_register(ModbusRegister.PROC_SELECT_START.value, lambda value: value == selected_value, timeout=0.5)
 
         self._write_ctrl_reg_feedback(ModbusRegister.PROC_SELECT_START.value)
 
+        self.lifecycle.proc_type = process_type
+        self.lifecycle.wait_started(timeout)
+
     def get_recent_screen(self) -> ScreenId:
-        raw_value = self._device.read_register(ModbusRegister.PROC_STATUS.value)
+        raw_value = self.get_process_status()
         print(f"Recent screen raw value: {raw_value}")
         try:
             # Attempt to map the raw value to a ScreenId enum
@@ -293,13 +489,26 @@ class EnbioWiFiMachine:
             raise ValueError(f"Cannot convert {raw_value} to ScreenId enum")
 
     # def _await_change_screen_to(self, next_screen: ScreenId):
-    def interrupt_process(self) -> None:
-        if self._device.read_register(ModbusRegister.PROC_STATUS.value) == 1:
+    def interrupt_process(self, timeout: float = 3.0, summary_time: float = 3.0) -> None:
+        """
+        Interrupt running process, wait until machine stops it, leave summary visible for summary_time and go back
+        to main screen. Process not stopped before timeout is only warned about, e.g. on Ctrl-C of runmonitor.
+        """
+        with use_lane(Lane.SAFETY):
+            if self.get_process_status() != PROC_STATUS_RUNNING:
+                return
             print("interrupt")
+            self.lifecycle.interrupt_requested = True
             self._device.write_register(ModbusRegister.PROC_SELECT_START.value, 0xFFFF)
-            # Soe time to show summary
-            time.sleep(3)
-            self._write_reg_feedback(ModbusRegister.CHANGE_SCREEN.value, ScreenId.MAIN.value, await_time=0.1)
+
+        try:
+            self.lifecycle.wait_stopped(timeout)
+        except EnbioDeviceInternalException as e:
+            print(f"Warning process not stopped after interrupt: {e}")
+
+        # Some time to show summary
+        time.sleep(summary_time)
+        self._write_reg_feedback(ModbusRegister.CHANGE_SCREEN.value, ScreenId.MAIN.value)
 
     def get_do_state(self) -> DOState:
         return DOState.from_bitfields(self._device.read_register(ModbusRegister.PROC_DO_STATE.value))
@@ -325,49 +534,52 @@ class EnbioWiFiMachine:
         )
 
     def poll_process_line(self) -> ProcessLine:
-        return ProcessLine(
-            sec=self._device.read_register(ModbusRegister.PROC_SECONDS.value),
-            phase=self.get_phase_id(),
+        with use_lane(Lane.MONITOR):
+            return ProcessLine(
+                sec=self._device.read_register(ModbusRegister.PROC_SECONDS.value),
+                phase=self.get_phase_id(),
+
+                pwr_state=self.get_pwr_state(),
+                do_state=self.get_do_state(),
+                sensors_msrs=self.get_sensors_measurements(),
+            )
 
-            pwr_state=self.get_pwr_state(),
-            do_state=self.get_do_state(),
-            sensors_msrs=self.get_sensors_measurements(),
-        )
+    def track_lifecycle(self, pline: ProcessLine) -> list[ProcessEvent]:
+        """ Update process lifecycle with polled process line, only process status is read additionally """
+        # Status read under lifecycle lock, concurrent poll of lifecycle can not apply newer state in between
+        with self.lifecycle.lock, use_lane(Lane.MONITOR):
+            status = self.get_process_status()
+            return self.lifecycle.update(ProcessState(status, pline.phase, pline.sec, pline.do_state.proc_type))
+
+    @staticmethod
+    def _scale_factor_registers(scale_factors: ScaleFactors) -> dict[int, int]:
+        """ Register values of scale factors, coefficients 'a' and 'b' are two separate blocks of 4 floats """
+        values = {}
+        for (register_a, register_b), scale_factor in zip(scale_factor_registers, [
+            scale_factors.pressure_process,
+            scale_factors.temperature_process,
+            scale_factors.temperature_chamber,
+            scale_factors.temperature_steamgen,
+        ]):
+            values[register_a], values[register_a + 1] = float_to_ints(scale_factor.a)
+            values[register_b], values[register_b + 1] = float_to_ints(scale_factor.b)
+        return values
 
     def get_scale_factors(self) -> ScaleFactors:
-        scale_factors = ScaleFactors(
-            pressure_process=ScaleFactor(
-                a=self._read_float_register(ModbusRegister.SCALE_FACTORS_PRESS_PROC_A.value),
-                b=self._read_float_register(ModbusRegister.SCALE_FACTORS_PRESS_PROC_B.value)
-            ),
-            temperature_process=ScaleFactor(
-                a=self._read_float_register(ModbusRegister.SCALE_FACTORS_TMPR_PROC_A.value),
-                b=self._read_float_register(ModbusRegister.SCALE_FACTORS_TMPR_PROC_B.value)
-            ),
-            temperature_chamber=ScaleFactor(
-                a=self._read_float_register(ModbusRegister.SCALE_FACTORS_TMPR_CHMBR_A.value),
-                b=self._read_float_register(ModbusRegister.SCALE_FACTORS_TMPR_CHMBR_B.value)
-            ),
-            temperature_steamgen=ScaleFactor(
-                a=self._read_float_register(ModbusRegister.SCALE_FACTORS_TMPR_SG_A.value),
-                b=self._read_float_register(ModbusRegister.SCALE_FACTORS_TMPR_SG_B.value)
+        values = {}
+        for first, count in scale_factor_blocks:
+            values.update(zip(range(first, first + count), self._device.read_registers(first, count)))
+
+        return ScaleFactors(*[
+            ScaleFactor(
+                a=ints_to_float(values[register_a], values[register_a + 1]),
+                b=ints_to_float(values[register_b], values[register_b + 1])
             )
-        )
-
-        return scale_factors
+            for register_a, register_b in scale_factor_registers
+        ])
 
     def set_scale_factors(self, scale_factors: ScaleFactors) -> None:
-        self._write_float_register(ModbusRegister.SCALE_FACTORS_PRESS_PROC_A.value, scale_factors.pressure_process.a)
-        self._write_float_register(ModbusRegister.SCALE_FACTORS_PRESS_PROC_B.value, scale_factors.pressure_process.b)
-
-        self._write_float_register(ModbusRegister.SCALE_FACTORS_TMPR_PROC_A.value, scale_factors.temperature_process.a)
-        self._write_float_register(ModbusRegister.SCALE_FACTORS_TMPR_PROC_B.value, scale_factors.temperature_process.b)
-
-        self._write_float_register(ModbusRegister.SCALE_FACTORS_TMPR_CHMBR_A.value, scale_factors.temperature_chamber.a)
-        self._write_float_register(ModbusRegister.SCALE_FACTORS_TMPR_CHMBR_B.value, scale_factors.temperature_chamber.b)
-
-        self._write_float_register(ModbusRegister.SCALE_FACTORS_TMPR_SG_A.value, scale_factors.temperature_steamgen.a)
-        self._write_float_register(ModbusRegister.SCALE_FACTORS_TMPR_SG_B.value, scale_factors.temperature_steamgen.b)
+        self.write_register_map(self._scale_factor_registers(scale_factors))
 
     def get_valve(self, valve_relay: Relay) -> ValveState:
         if valve_relay == Relay.Valve1:
@@ -472,51 +684,50 @@ class EnbioWiFiMachine:
         if cnts.sg_c is not None:
             self.write_int_register(ModbusRegister.HEATERS_TOGGLE_MSR_SG_C.value, cnts.sg_c)
 
-    def runmonitor(self, proces_name: str, plotting: bool = False, interval: float = 1.0, identifier: str = "PA") -> None:
+    def runmonitor(self, proces_name: str, plotting: bool = False, interval: float = 1.0, identifier: str = "PA",
+                   reconnect_timeout: float = 60.0, analytics: CycleAnalytics | None = None,
+                   rules: RuleEngine | None = None, sinks: SinkGroup | None = None) -> CycleAnalytics:
+        """
+        Run process and record it. Analytics are updated with every sample and can be read live by caller,
+        interlock rules are checked on every sample, their events are printed and passed to rules listeners.
+        Samples are also published to sinks, which are closed (flushed) when recording ends.
+        """
+        analytics = analytics if analytics is not None else CycleAnalytics()
+        rules = rules if rules is not None else RuleEngine()
+        sinks = sinks if sinks is not None else SinkGroup()
+        self.remember_device_id()
         self.start_process(label_to_process_type.get(proces_name))
-        plotter = LivePlotter() if plotting else None
-
-        dirname = "measurements"
-        os.makedirs(dirname, exist_ok=True)
-
-        start_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        filepath = os.path.join(dirname, f"meas_{proces_name}_int_{round(interval*1000)}_id_{identifier}"
-                                         f"_fmt_v1_{start_time}.csv")
-        
-        with open(filepath, mode='w', newline='') as csvfile:
-            csvwriter = csv.writer(csvfile)
-            csvwriter.writerow(["Time (sec)",
-                                "ProcPress (bar)",
-                                "ExtPress (bar)",
-                                "ProcTempr *C",
-                                "ChmbrTempr *C",
-                                "SGTempr *C",
-                                "ExtTmpr *C",
-
-                                "ProcType",
-                                "V1",
-                                "V2",
-                                "V3",
-                                "V5",
-                                "Vacuum",
-                                "Water",
-                                "ChHeat",
-                                "ShdHeat",
-                                "SgsHeat",
-
-                                "ChTar *C",
-                                "ChPWR %",
-                                "SgTar *C",
-                                "SgPWR %",
-                                ])
+        plotter = None
+        if plotting:
+            from enbio_wifi_machine.plotter import LivePlotter  # matplotlib is heavy, import only when plotting
+            plotter = LivePlotter(buffer_size=None)  # whole cycle, history is downsampled to plot width
+
+        filepath = measurement_filepath("measurements", proces_name, interval, identifier)
 
+        with MeasurementRecorder(filepath) as recorder:
             proctime = 0.0
 
             try:
                 while True:
                     start_time = time.time()
 
-                    pline = self.poll_process_line()
+                    try:
+                        pline = self.poll_process_line()
+                    except Exception as e:
+                        if not is_link_lost(e):
+                            raise
+                        # Process on machine keeps running, recording continues after gap in the same file
+                        print(f"Connection lost at {proctime} s: {e}")
+                        recorder.write_gap(proctime)
+                        analytics.gap()
+                        rules.gap()
+                        self.reconnect(reconnect_timeout)
+                        proctime += interval * max(1, round((time.time() - start_time) / interval))
+                        continue
+
+                    events = self.track_lifecycle(pline)
+                    for event in events:
+                        print(f"Process {event.kind.name.lower()}, phase {event.state.phase}, time {proctime} s")
 
                     # prevent plot dropping after finish
                     if pline.do_state.proc_type is not None:
@@ -525,32 +736,19 @@ class EnbioWiFiMachine:
                             plotter.add_data(pline)
                             plotter.update_plot()
 
-                        csvwriter.writerow([proctime,
-                                            pline.sensors_msrs.p_proc,
-                                            pline.sensors_msrs.p_ext,
-                                            pline.sensors_msrs.t_proc,
-                                            pline.sensors_msrs.t_chmbr,
-                                            pline.sensors_msrs.t_stmgn,
-                                            pline.sensors_msrs.t_ext,
-
-                                            pline.do_state.proc_type.value if pline.do_state.proc_type is not None else 0,
-
-                                            pline.do_state.v1_open,
-                                            pline.do_state.v2_open,
-                                            pline.do_state.v3_open,
-                                            pline.do_state.v5_open,
-                                            pline.do_state.pump_vac,
-                                            pline.do_state.pump_water,
-                                            pline.do_state.ch_heaters,
-                                            pline.do_state.sg_heaters_double,
-                                            pline.do_state.sg_heater_single,
-
-                                            pline.pwr_state.ch_tar,
-                                            pline.pwr_state.ch_pwr,
-                                            pline.pwr_state.sg_tar,
-                                            pline.pwr_state.sg_pwr,
-                                            ])
-                        csvfile.flush()
+                        recorder.write(proctime, pline)
+                        sinks.publish(proctime, pline)
+                        analytics.add(proctime, pline)
+                        for rule_event in rules.check(proctime, pline):
+                            print(f"Interlock {rule_event}")
+
+                    if any(event.kind == ProcessEventKind.PHASE_CHANGE for event in events):
+                        print(analytics.live())
+
+                    if any(event.kind in (ProcessEventKind.FINISH, ProcessEventKind.ABORT) for event in events):
+                        print(f"Recording finished: {filepath}")
+                        print(analytics.summary())
+                        return analytics
 
                     # Measure execution time and calculate sleep time
                     exec_time = time.time() - start_time  # Time taken for execution
@@ -567,22 +765,89 @@ class EnbioWiFiMachine:
                 print("Interrupting...")
                 self.interrupt_process()
                 raise e
-
-    def monitor(self) -> None:
-        plotter = LivePlotter()
+            finally:
+                sinks.close()
+
+    def monitor(self, plotting: bool = True, rules: RuleEngine | None = None, sinks: SinkGroup | None = None) -> None:
+        """ Poll every second until Ctrl-C. Samples go to sinks if any, printed otherwise """
+        sinks = sinks if sinks is not None else SinkGroup()
+        plotter = None
+        if plotting:
+            from enbio_wifi_machine.plotter import LivePlotter  # matplotlib is heavy, import only when plotting
+            plotter = LivePlotter()
+        analytics = CycleAnalytics()
+        rules = rules if rules is not None else RuleEngine()
         monitor_time = 0
         try:
             while True:
                 time.sleep(1)
                 monitor_time += 1
                 pline = self.poll_process_line()
+                events = self.track_lifecycle(pline)
+                for event in events:
+                    print(f"Process {event.kind.name.lower()}, phase {event.state.phase}")
+                    if event.kind == ProcessEventKind.START:
+                        analytics = CycleAnalytics()
+                    elif event.kind in (ProcessEventKind.FINISH, ProcessEventKind.ABORT):
+                        print(analytics.summary())
+
+                if pline.do_state.proc_type is not None:
+                    analytics.add(monitor_time, pline)
+                for rule_event in rules.check(monitor_time, pline):
+                    print(f"Interlock {rule_event}")
+
                 pline.sec = monitor_time
-                plotter.add_data(pline)
-                plotter.update_plot()
-                print(pline)
+                if plotter is not None:
+                    plotter.add_data(pline)
+                    plotter.update_plot()
+                if sinks.sinks:
+                    sinks.publish(monitor_time, pline)
+                else:
+                    print(pline)
         except KeyboardInterrupt as e:
             print("Stopping...")
             raise e
+        finally:
+            sinks.close()
+
+    def record(self, recorder: SegmentedRecorder, interval: float = 1.0, duration: float | None = None,
+               reconnect_timeout: float = 60.0, rules: RuleEngine | None = None,
+               sinks: SinkGroup | None = None) -> None:
+        """
+        Record continuously (also standby, without process) into rotating segments until duration elapses or Ctrl-C.
+        Lost port is reconnected like in runmonitor, interlocks are checked on every sample, samples go also to sinks.
+        """
+        self.remember_device_id()
+        rules = rules if rules is not None else RuleEngine()
+        sinks = sinks if sinks is not None else SinkGroup()
+        start_time = time.time()
+        proctime = 0.0
+        try:
+            while duration is None or proctime < duration:
+                poll_time = time.time()
+                try:
+                    pline = self.poll_process_line()
+                except Exception as e:
+                    if not is_link_lost(e):
+                        raise
+                    print(f"Connection lost at {proctime} s: {e}")
+                    recorder.write_gap(proctime)
+                    rules.gap()
+                    self.reconnect(reconnect_timeout)
+                else:
+                    for event in self.track_lifecycle(pline):
+                        print(f"Process {event.kind.name.lower()}, phase {event.state.phase}, time {proctime} s")
+                    recorder.write(proctime, pline)
+                    sinks.publish(proctime, pline)
+                    for rule_event in rules.check(proctime, pline):
+                        print(f"Interlock {rule_event}")
+
+                # Time follows wall clock, so it stays true over reconnects and slow polls
+                time.sleep(max(0.0, interval - (time.time() - poll_time)))
+                proctime = round(time.time() - start_time, 3)
+        finally:
+            recorder.close()
+            sinks.close()
 
     def get_phase_id(self) -> int:
         return self._device.read_register(ModbusRegister.PROC_PHASE.value)
@@ -597,53 +862,54 @@ class EnbioWiFiMachine:
         self._device.write_register(ModbusRegister.USE_DEFAULT_MODBUS_PARAMS.value, 2 if target_us else 1)
 
 
-def thread_procedure(procedure: str, test_machine: EnbioWiFiMachine, lock: threading.Lock):
+def thread_procedure(procedure: str, test_machine: EnbioWiFiMachine):
     if procedure == "door":
         while True:
-            with lock:
-                if test_machine.is_door_unlocked():
-                    test_machine.door_lock_with_feedback()
-                else:
-                    test_machine.door_unlock_with_feedback()
+            if test_machine.is_door_unlocked():
+                test_machine.door_lock_with_feedback()
+            else:
+                test_machine.door_unlock_with_feedback()
             time.sleep(0.01)
 
     elif procedure == "valves":
         valves_list = [[Relay.Valve1, True], [Relay.Valve2, False], [Relay.Valve3, True], [Relay.Valve5, False]]
         while True:
-            with lock:
-                for idx, valve_state in enumerate(valves_list):
-                    valve, state = valve_state
-                    test_machine.set_valve(valve, ValveState.Open if state else ValveState.Closed)
-                    valves_list[idx] = [valve, not state]
+            for idx, valve_state in enumerate(valves_list):
+                valve, state = valve_state
+                test_machine.set_valve(valve, ValveState.Open if state else ValveState.Closed)
+                valves_list[idx] = [valve, not state]
             time.sleep(0.1)
 
     elif procedure == "wtr":
         wtr_state = True
         while True:
-            with lock:
-                test_machine.set_relay(Relay.WaterPump, RelayState.On if wtr_state else RelayState.Off)
-                wtr_state = not wtr_state
+            test_machine.set_relay(Relay.WaterPump, RelayState.On if wtr_state else RelayState.Off)
+            wtr_state = not wtr_state
             time.sleep(0.33)
 
     elif procedure == "vac":
         wtr_state = True
         while True:
-            with lock:
-                test_machine.set_relay(Relay.VacuumPump, RelayState.On if wtr_state else RelayState.Off)
-                wtr_state = not wtr_state
+            test_machine.set_relay(Relay.VacuumPump, RelayState.On if wtr_state else RelayState.Off)
+            wtr_state = not wtr_state
             time.sleep(0.6)
 
+    elif procedure == "stats":
+        while True:
+            time.sleep(5)
+            for lane, stats in test_machine.lane_stats().items():
+                print(f"{lane.name}: {stats.transactions} transactions, mean wait {stats.mean_wait * 1000:.1f} ms, "
+                      f"max wait {stats.max_wait * 1000:.1f} ms")
 
-def start_lol_threads(test_machine: EnbioWiFiMachine):
-    """ Dont ask why """
-    lock = threading.Lock()
 
-    procedures = ["door", "valves", "wtr", "vac"]
+def start_lol_threads(test_machine: EnbioWiFiMachine):
+    """ Dont ask why. Machine schedules single frames itself, so no external lock is needed """
+    procedures = ["door", "valves", "wtr", "vac", "stats"]
 
     threads: list[threading.Thread] = []
 
     for procedure in procedures:
-        thread = threading.Thread(target=thread_procedure, args=(procedure, test_machine, lock))
+        thread = threading.Thread(target=thread_procedure, args=(procedure, test_machine))
         threads.append(thread)
         thread.start()
 
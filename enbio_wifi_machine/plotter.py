@@ -1,10 +1,25 @@
 import matplotlib.pyplot as plt
+import numpy as np
 from collections import deque
 from enbio_wifi_machine.common import ProcessLine
+from enbio_wifi_machine.downsample import LODLine, state_spans
+
+heater_span_styles = [
+    ("red", 0.8, "both ch and sg - bad"),
+    ("green", 0.1, "ch_heaters ON"),
+    ("orange", 0.4, "sg_heaters_double ON"),
+    ("orange", 0.2, "sg_heater_single ON"),
+]
 
 
 # Define deque to store live data
 class LivePlotter:
+    """
+    Live plot of last buffer_size samples, whole history with buffer_size None. Lines are reduced to plot width and
+    refined on zoom like in plot_csv_data. View follows new samples until user zooms or pans, zoomed view is kept
+    between updates, key 'f' follows again.
+    """
+
     def __init__(self, buffer_size=250):
         self.sec_data = deque(maxlen=buffer_size)
         self.p_proc_data = deque(maxlen=buffer_size)
@@ -17,62 +32,72 @@ class LivePlotter:
 
         plt.ion()
         self.fig, self.ax1 = plt.subplots()
-        self.line_t_proc, = self.ax1.plot([], [], label="t_proc", color="blue")
-        self.line_t_chmbr, = self.ax1.plot([], [], label="t_chmbr", color="green")
-        self.line_t_stmgn, = self.ax1.plot([], [], label="t_stmgn", color="orange")
+        self.ax2 = self.ax1.twinx()
+        # Lines keep whole series and are refined for visible range on every zoom or pan
+        self.lod_t_proc = LODLine(self.ax1, [], [], label="t_proc", color="blue")
+        self.lod_t_chmbr = LODLine(self.ax1, [], [], label="t_chmbr", color="green")
+        self.lod_t_stmgn = LODLine(self.ax1, [], [], label="t_stmgn", color="orange")
+        self.lod_p_proc = LODLine(self.ax2, [], [], label="p_proc", color="red")
+        self.heater_spans = []
+
         self.ax1.set_title("Live Sensor Measurements")
         self.ax1.set_xlabel("Time (sec)")
         self.ax1.set_ylabel("Temperature (°C)")
-        self.ax1.legend(loc="upper left")
         self.ax1.grid()
-        self.ax2 = self.ax1.twinx()
-        self.line_p_proc, = self.ax2.plot([], [], label="p_proc", color="red")
         self.ax2.set_ylabel("p_proc")
         self.ax2.tick_params(axis="y", labelcolor="red")
         self.ax2.legend(loc="upper right")
 
-    def update_plot(self):
-        self.ax1.clear()  # Clear the primary axis to redraw everything
-        self.ax2.clear()  # Clear the secondary axis to redraw everything
+        self.following_xlim = None
+        """ Limits last set by following, other limits mean that user zoomed or panned """
+        self.fig.canvas.mpl_connect("key_press_event", self._on_key_press)
 
-        # Plot temperature and pressure data
-        self.ax1.plot(self.sec_data, self.t_proc_data, label="t_proc", color="blue")
-        self.ax1.plot(self.sec_data, self.t_chmbr_data, label="t_chmbr", color="green")
-        self.ax1.plot(self.sec_data, self.t_stmgn_data, label="t_stmgn", color="orange")
-        self.ax2.plot(self.sec_data, self.p_proc_data, label="p_proc", color="red")
+    def _on_key_press(self, event):
+        if event.key == "f":
+            self.follow()
 
-        # Set labels and legends for both axes
-        self.ax1.set_title("Live Sensor Measurements")
-        self.ax1.set_xlabel("Time (sec)")
-        self.ax1.set_ylabel("Temperature (°C)")
+    @property
+    def is_following(self) -> bool:
+        return self.following_xlim is None or tuple(self.ax1.get_xlim()) == self.following_xlim
+
+    def follow(self) -> None:
+        """ Show whole buffered history again and keep following new samples """
+        self.following_xlim = None
+        self.update_plot()
+
+    def update_plot(self):
+        following = self.is_following
+        sec = np.asarray(self.sec_data, dtype=float)
+        for lod, data in [(self.lod_t_proc, self.t_proc_data), (self.lod_t_chmbr, self.t_chmbr_data),
+                          (self.lod_t_stmgn, self.t_stmgn_data), (self.lod_p_proc, self.p_proc_data)]:
+            lod.set_data(sec, data)
+
+        # Filled backgrounds for heater states, one region for each run of samples in the same state
+        for span in self.heater_spans:
+            span.remove()
+        ch_heaters = np.array(self.ch_heaters_states, dtype=bool)
+        sg_heaters_double = np.array(self.sg_heaters_double_states, dtype=bool)
+        sg_heater_single = np.array(self.sg_heater_single_states, dtype=bool)
+        both = ch_heaters & (sg_heaters_double | sg_heater_single)
+        self.heater_spans = []
+        for states, (color, alpha, label) in zip([both, ch_heaters & ~both, sg_heaters_double & ~both,
+                                                  sg_heater_single & ~both], heater_span_styles):
+            for index, (start_time, end_time) in enumerate(state_spans(sec, states)):
+                self.heater_spans.append(self.ax1.axvspan(start_time, end_time, color=color, alpha=alpha,
+                                                          label=label if index == 0 else "_nolegend_"))
         self.ax1.legend(loc="upper left")
-        self.ax1.grid()
-        self.ax2.set_ylabel("p_proc")
-        self.ax2.tick_params(axis="y", labelcolor="red")
-        self.ax2.legend(loc="upper right")
 
-        # Add filled backgrounds for heater states
-        for i in range(1, len(self.sec_data)):  # Iterate through time intervals
-            start_time = self.sec_data[i - 1]
-            end_time = self.sec_data[i]
-
-            # Draw filled regions for heater states
-            if self.ch_heaters_states[i] and (self.sg_heaters_double_states[i] or self.sg_heater_single_states[i]):
-                self.ax1.axvspan(start_time, end_time, color="red", alpha=0.8, label="both ch and sg - bad")
-            else:
-                if self.ch_heaters_states[i]:
-                    self.ax1.axvspan(start_time, end_time, color="green", alpha=0.1, label="ch_heaters ON")
-                if self.sg_heaters_double_states[i]:
-                    self.ax1.axvspan(start_time, end_time, color="orange", alpha=0.4, label="sg_heaters_double ON")
-                if self.sg_heater_single_states[i]:
-                    self.ax1.axvspan(start_time, end_time, color="orange", alpha=0.2, label="sg_heater_single ON")
-
-
-        # Rescale axes dynamically
-        self.ax1.relim()
-        self.ax1.autoscale_view()
-        self.ax2.relim()
-        self.ax2.autoscale_view()
+        if following and len(sec) >= 2:
+            # Lines are refined by xlim_changed callback, y rescaled to whole history
+            self.ax1.set_xlim(sec[0], sec[-1])
+            self.following_xlim = tuple(self.ax1.get_xlim())
+            for ax in (self.ax1, self.ax2):
+                ax.relim()
+                ax.autoscale_view(scalex=False)
+
+        # Zoomed view is kept, only new samples inside it are drawn
+        for lod in (self.lod_t_proc, self.lod_t_chmbr, self.lod_t_stmgn, self.lod_p_proc):
+            lod.update()
 
         # Redraw the plot
         plt.draw()
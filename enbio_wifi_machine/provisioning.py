@@ -0,0 +1,163 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from enbio_wifi_machine.common import ScaleFactors, EnbioDeviceInternalException
+from enbio_wifi_machine.machine import EnbioWiFiMachine
+
+
+@dataclass
+class ProvisioningSpec:
+    """ Declarative end-of-line setup of one unit, not given fields are left untouched """
+    device_id: str | None = None
+    boardnumber: str | None = None
+    """ Board number as rev.yy.mm, e.g. E.24.06 """
+    date_time: str | None = None
+    """ ISO date time or 'now' """
+    scales: str | None = None
+    """ Path of scale factors json, e.g. common_scales/MK_60966.json """
+    target: str | None = None
+    """ 'us' or 'eu', resets parameters to defaults of target before anything else is written """
+    save: bool = True
+
+    def boardnumber_fields(self) -> tuple[str, int, int]:
+        board_rev, prod_year, prod_month = self.boardnumber.split(".")
+        return board_rev, int(prod_year), int(prod_month)
+
+    def datetime_value(self) -> datetime:
+        return datetime.now() if self.date_time == "now" else datetime.fromisoformat(self.date_time)
+
+    def scale_factors(self) -> ScaleFactors:
+        with open(self.scales, "r") as f:
+            return ScaleFactors.from_json(f.read())
+
+
+def load_provisioning_file(filepath: str) -> dict[str, ProvisioningSpec]:
+    """
+    Read specs by port from json file: {"defaults": {...}, "units": {"/dev/ttyACM0": {"device_id": ...}, ...}}.
+    Unit fields override defaults, scales paths are relative to the file.
+    """
+    with open(filepath, "r") as f:
+        data = json.load(f)
+
+    specs = {}
+    for port, unit in data["units"].items():
+        spec = ProvisioningSpec(**{**data.get("defaults", {}), **unit})
+        if spec.scales is not None:
+            spec.scales = os.path.join(os.path.dirname(filepath), spec.scales)
+        specs[port] = spec
+    return specs
+
+
+@dataclass
+class ProvisioningReport:
+    unit: str
+    success: bool = False
+    duration: float = 0.0
+    transactions: int = 0
+    steps: dict[str, float] = field(default_factory=dict)
+    """ Duration of each step in seconds """
+    mismatches: list[str] = field(default_factory=list)
+    error: str | None = None
+
+    def __str__(self):
+        steps = ", ".join(f"{step} {duration * 1000:.0f} ms" for step, duration in self.steps.items())
+        status = "OK" if self.success else f"FAILED {self.error or '; '.join(self.mismatches)}"
+        return f"{self.unit}: {status} in {self.duration:.2f} s, {self.transactions} transactions ({steps})"
+
+
+def _transactions(machine: EnbioWiFiMachine) -> int:
+    return sum(stats.transactions for stats in machine.lane_stats().values())
+
+
+def read_back_snapshot(machine: EnbioWiFiMachine) -> dict:
+    """ Provisioned values read back with block reads """
+    return {
+        "device_id": machine.get_device_id(),
+        "boardnumber": "{}.{:02d}.{:02d}".format(*machine.get_boardnumber()),
+        "scales": machine.get_scale_factors(),
+        "datetime": machine.get_datetime(),
+    }
+
+
+def verify_provisioning(spec: ProvisioningSpec, snapshot: dict, scale_factors: ScaleFactors | None,
+                        written_datetime: datetime | None) -> list[str]:
+    mismatches = []
+    if spec.device_id is not None and snapshot["device_id"] != spec.device_id:
+        mismatches.append(f"device id {snapshot['device_id']} != {spec.device_id}")
+    if spec.boardnumber is not None and snapshot["boardnumber"] != "{}.{:02d}.{:02d}".format(
+            *spec.boardnumber_fields()):
+        mismatches.append(f"board number {snapshot['boardnumber']} != {spec.boardnumber}")
+    if scale_factors is not None and not snapshot["scales"].equals(scale_factors):
+        mismatches.append("scale factors differ")
+    # RTC clears seconds on save and keeps running, so read back must land within a minute after written time
+    if written_datetime is not None and not 0 <= (snapshot["datetime"] - written_datetime).total_seconds() < 120:
+        mismatches.append(f"date time {snapshot['datetime']} != {written_datetime}")
+    return mismatches
+
+
+def provision_unit(unit: str, machine: EnbioWiFiMachine, spec: ProvisioningSpec) -> ProvisioningReport:
+    """
+    Apply spec with the fewest transactions: parameters reset first, then coalesced block writes of device id,
+    board number, scale factors and date time, one save and final block read-back verification.
+    """
+    report = ProvisioningReport(unit)
+    start_time = time.perf_counter()
+    start_transactions = _transactions(machine)
+
+    def step(name, procedure, *args):
+        step_start = time.perf_counter()
+        result = procedure(*args)
+        report.steps[name] = time.perf_counter() - step_start
+        return result
+
+    try:
+        # Parsing first, bad spec must not leave unit half provisioned
+        scale_factors = spec.scale_factors() if spec.scales is not None else None
+        written_datetime = spec.datetime_value().replace(second=0, microsecond=0) if spec.date_time else None
+        boardnumber = spec.boardnumber_fields() if spec.boardnumber is not None else None
+
+        with machine.keep_open():
+            if spec.target is not None:
+                step("reset", machine.reset_parameters_with_target, spec.target == "us")
+            if spec.device_id is not None:
+                step("device_id", machine.set_device_id, spec.device_id)
+            if boardnumber is not None:
+                step("boardnumber", machine.set_boardnumber, *boardnumber)
+            if scale_factors is not None:
+                step("scales", machine.set_scale_factors, scale_factors)
+            if written_datetime is not None:
+                step("datetime", machine.set_datetime, written_datetime)
+            if spec.save:
+                step("save", machine.save_all)
+
+            snapshot = step("verify", read_back_snapshot, machine)
+
+        report.mismatches = verify_provisioning(spec, snapshot, scale_factors, written_datetime)
+        report.success = not report.mismatches
+    except (EnbioDeviceInternalException, IOError, ValueError) as e:
+        report.error = f"{type(e).__name__}: {e}"
+
+    report.duration = time.perf_counter() - start_time
+    report.transactions = _transactions(machine) - start_transactions
+    return report
+
+
+def provision_many(units: dict[str, tuple[EnbioWiFiMachine, ProvisioningSpec]],
+                   max_workers: int | None = None) -> list[ProvisioningReport]:
+    """ Provision all units at once, each one on its own link, reports are in units order """
+    with ThreadPoolExecutor(max_workers=max_workers or max(1, len(units))) as pool:
+        futures = [pool.submit(provision_unit, unit, machine, spec) for unit, (machine, spec) in units.items()]
+        return [future.result() for future in futures]
+
+
+def print_provisioning_summary(reports: list[ProvisioningReport], total_time: float) -> None:
+    for report in reports:
+        print(report)
+
+    succeeded = sum(report.success for report in reports)
+    throughput = len(reports) / total_time * 3600 if total_time > 0 else 0.0
+    print(f"Provisioned {succeeded}/{len(reports)} units in {total_time:.2f} s, {throughput:.0f} units/h")
+
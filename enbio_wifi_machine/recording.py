@@ -0,0 +1,353 @@
+import csv
+import glob
+import gzip
+import json
+import os
+import re
+import shutil
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from enbio_wifi_machine.common import ProcessLine
+
+measurement_columns = [
+    "Time (sec)",
+    "ProcPress (bar)",
+    "ExtPress (bar)",
+    "ProcTempr *C",
+    "ChmbrTempr *C",
+    "SGTempr *C",
+    "ExtTmpr *C",
+
+    "ProcType",
+    "V1",
+    "V2",
+    "V3",
+    "V5",
+    "Vacuum",
+    "Water",
+    "ChHeat",
+    "ShdHeat",
+    "SgsHeat",
+
+    "ChTar *C",
+    "ChPWR %",
+    "SgTar *C",
+    "SgPWR %",
+
+    "Phase",
+]
+
+MEASUREMENT_FORMAT_VERSION = 2
+""" Version 2 added Phase column and phase index sidecar """
+
+
+def measurement_filepath(dirname: str, proces_name: str, interval: float, identifier: str,
+                         start_time: datetime | None = None) -> str:
+    """ Path of new recording, name encodes process, interval and identifier, read back by extractor """
+    os.makedirs(dirname, exist_ok=True)
+    start_time = (start_time or datetime.now()).strftime("%Y-%m-%d_%H-%M-%S")
+    return os.path.join(dirname, f"meas_{proces_name}_int_{round(interval*1000)}_id_{identifier}"
+                                 f"_fmt_v{MEASUREMENT_FORMAT_VERSION}_{start_time}.csv")
+
+
+measurement_filename_pattern = re.compile(
+    r"meas_(?P<process>.+?)_int_(?P<interval>\d+)_id_(?P<identifier>.*)_fmt_v(?P<version>\d+)_"
+    r"(?P<start>\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})\.csv$")
+
+
+@dataclass
+class MeasurementInfo:
+    process: str
+    interval: float
+    identifier: str
+    version: int
+    start_time: datetime
+
+
+def parse_measurement_filename(filepath: str) -> MeasurementInfo | None:
+    """ Inverse of measurement_filepath, None for files not named by recorder """
+    match = measurement_filename_pattern.match(os.path.basename(filepath))
+    if match is None:
+        return None
+    return MeasurementInfo(match["process"], int(match["interval"]) / 1000, match["identifier"], int(match["version"]),
+                           datetime.strptime(match["start"], "%Y-%m-%d_%H-%M-%S"))
+
+
+def phase_index_filepath(filepath: str) -> str:
+    return os.path.splitext(filepath)[0] + ".phases.json"
+
+
+def process_line_to_row(proctime: float, pline: ProcessLine) -> list:
+    return [proctime,
+            pline.sensors_msrs.p_proc,
+            pline.sensors_msrs.p_ext,
+            pline.sensors_msrs.t_proc,
+            pline.sensors_msrs.t_chmbr,
+            pline.sensors_msrs.t_stmgn,
+            pline.sensors_msrs.t_ext,
+
+            pline.do_state.proc_type.value if pline.do_state.proc_type is not None else 0,
+
+            pline.do_state.v1_open,
+            pline.do_state.v2_open,
+            pline.do_state.v3_open,
+            pline.do_state.v5_open,
+            pline.do_state.pump_vac,
+            pline.do_state.pump_water,
+            pline.do_state.ch_heaters,
+            pline.do_state.sg_heaters_double,
+            pline.do_state.sg_heater_single,
+
+            pline.pwr_state.ch_tar,
+            pline.pwr_state.ch_pwr,
+            pline.pwr_state.sg_tar,
+            pline.pwr_state.sg_pwr,
+
+            pline.phase,
+            ]
+
+
+@dataclass
+class PhaseSegment:
+    """ Consecutive rows of one phase, rows count from 0 after header, end row and offset are exclusive """
+    phase: int
+    start_row: int
+    end_row: int
+    start_offset: int
+    end_offset: int
+
+
+class MeasurementRecorder:
+    """
+    CSV recording of process lines in format read by extractor, every row is flushed to disk.
+    On close phase index sidecar is written, extractor uses it to seek directly to rows of a phase.
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.rows = 0
+        self.segments: list[PhaseSegment] = []
+        self._file = open(filepath, mode='w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(measurement_columns)
+
+    def _write_row(self, row: list) -> None:
+        start_offset = self._file.tell()
+        self._writer.writerow(row)
+        self._file.flush()
+        self.rows += 1
+        end_offset = self._file.tell()
+
+        # Gap rows have no phase and extend current segment
+        phase = row[-1]
+        if self.segments and (phase == "" or self.segments[-1].phase == phase):
+            self.segments[-1].end_row = self.rows
+            self.segments[-1].end_offset = end_offset
+        elif phase != "":
+            self.segments.append(PhaseSegment(phase, self.rows - 1, self.rows, start_offset, end_offset))
+
+    def write(self, proctime: float, pline: ProcessLine) -> None:
+        self._write_row(process_line_to_row(proctime, pline))
+
+    def write_gap(self, proctime: float) -> None:
+        """ Row with only time, marks samples missing e.g. while reconnecting. Read back as NaN values """
+        self._write_row([proctime] + [""] * (len(measurement_columns) - 1))
+
+    @property
+    def size(self) -> int:
+        """ Bytes written so far """
+        return self._file.tell()
+
+    def close(self) -> None:
+        self._file.close()
+        with open(phase_index_filepath(self.filepath), "w") as f:
+            json.dump({"version": MEASUREMENT_FORMAT_VERSION, "rows": self.rows,
+                       "segments": [asdict(segment) for segment in self.segments]}, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+@dataclass
+class RetentionPolicy:
+    max_segments: int | None = 168
+    """ Closed segments kept, oldest are deleted first """
+    max_age: float | None = None
+    """ Seconds from end of segment until it is deleted """
+    max_bytes: int | None = None
+    """ Disk space of all closed segments """
+    compress_after: int | None = 24
+    """ Newest closed segments kept as plain CSV, older are gzipped. None never compresses """
+
+
+@dataclass
+class SegmentInfo:
+    filename: str
+    started: float
+    """ Unix time of first row """
+    ended: float | None = None
+    rows: int = 0
+    size: int = 0
+    compressed: bool = False
+
+
+SEGMENT_INDEX_FILENAME = "segments.json"
+
+
+class SegmentedRecorder:
+    """
+    Continuous recording split into segments bounded by duration and size. Closed segments are listed in rolling
+    index (segments.json) and retention policy compresses or deletes old ones, so memory and disk use stay bounded
+    however long recording runs. Recording started again in the same directory continues the index, segments left
+    open by crashed or killed recording are added to it.
+    """
+
+    def __init__(self, dirname: str, interval: float, label: str = "PA", segment_duration: float = 3600.0,
+                 segment_size: int | None = None, retention: RetentionPolicy | None = None):
+        self.dirname = dirname
+        self.interval = interval
+        self.label = label
+        self.segment_duration = segment_duration
+        self.segment_size = segment_size
+        self.retention = retention if retention is not None else RetentionPolicy()
+        self.segments: list[SegmentInfo] = []
+        self.sequence = 0
+        self._recorder: MeasurementRecorder | None = None
+        self._segment: SegmentInfo | None = None
+        os.makedirs(dirname, exist_ok=True)
+        self._load_index()
+
+    @property
+    def index_filepath(self) -> str:
+        return os.path.join(self.dirname, SEGMENT_INDEX_FILENAME)
+
+    def _load_index(self) -> None:
+        if os.path.exists(self.index_filepath):
+            with open(self.index_filepath, "r") as f:
+                index = json.load(f)
+            self.sequence = index["sequence"]
+            self.segments = [SegmentInfo(**segment) for segment in index["segments"]
+                             if os.path.exists(os.path.join(self.dirname, segment["filename"]))]
+
+        recovered = self._recover_unindexed()
+        if recovered:
+            print(f"Recovered {len(recovered)} segments missing in {SEGMENT_INDEX_FILENAME}")
+            # Index is saved on every rotation, so unindexed segments are newer than indexed ones
+            self.segments += sorted(recovered, key=lambda segment: (segment.started, segment.filename))
+            self.apply_retention()
+            self._save_index()
+
+    def _recover_unindexed(self) -> list[SegmentInfo]:
+        """ Segments of directory not in index, rows and size are taken from file """
+        indexed = {segment.filename for segment in self.segments}
+        recovered = []
+        for filepath in sorted(glob.glob(os.path.join(glob.escape(self.dirname), "meas_monitor_*.csv*"))):
+            filename = os.path.basename(filepath)
+            info = parse_measurement_filename(filename.removesuffix(".gz"))
+            if filename in indexed or info is None or not filename.endswith((".csv", ".csv.gz")):
+                continue
+
+            compressed = filename.endswith(".gz")
+            with (gzip.open if compressed else open)(filepath, "rb") as f:
+                lines = sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b""))
+            recovered.append(SegmentInfo(filename, started=info.start_time.timestamp(),
+                                         ended=os.path.getmtime(filepath), rows=max(0, lines - 1),
+                                         size=os.path.getsize(filepath), compressed=compressed))
+
+            # Sequence of crashed segment was never saved, next segment must not reuse it
+            sequence = info.identifier.rpartition("-")[2]
+            if sequence.isdigit():
+                self.sequence = max(self.sequence, int(sequence))
+        return recovered
+
+    def _save_index(self) -> None:
+        # Replaced atomically, reader never sees half written index
+        temporary = self.index_filepath + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump({"sequence": self.sequence, "segments": [asdict(segment) for segment in self.segments]}, f,
+                      indent=4)
+        os.replace(temporary, self.index_filepath)
+
+    def _open_segment(self) -> None:
+        self.sequence += 1
+        filepath = measurement_filepath(self.dirname, "monitor", self.interval, f"{self.label}-{self.sequence:06d}")
+        self._recorder = MeasurementRecorder(filepath)
+        self._segment = SegmentInfo(filename=os.path.basename(filepath), started=time.time())
+
+    def _should_rotate(self) -> bool:
+        if time.time() - self._segment.started >= self.segment_duration:
+            return True
+        return self.segment_size is not None and self._recorder.size >= self.segment_size
+
+    def write(self, proctime: float, pline: ProcessLine) -> None:
+        if self._recorder is None:
+            self._open_segment()
+        self._recorder.write(proctime, pline)
+        if self._should_rotate():
+            self.rotate()
+
+    def write_gap(self, proctime: float) -> None:
+        if self._recorder is not None:
+            self._recorder.write_gap(proctime)
+
+    def rotate(self) -> None:
+        """ Close current segment, next sample opens new one """
+        if self._recorder is None:
+            return
+        self._recorder.close()
+        self._segment.ended = time.time()
+        self._segment.rows = self._recorder.rows
+        self._segment.size = os.path.getsize(self._recorder.filepath)
+        self.segments.append(self._segment)
+        self._recorder, self._segment = None, None
+        self.apply_retention()
+        self._save_index()
+
+    def _compress(self, segment: SegmentInfo) -> None:
+        filepath = os.path.join(self.dirname, segment.filename)
+        with open(filepath, "rb") as source, gzip.open(filepath + ".gz", "wb") as target:
+            shutil.copyfileobj(source, target)
+        os.remove(filepath)
+        # Phase index offsets refer to plain file
+        if os.path.exists(phase_index_filepath(filepath)):
+            os.remove(phase_index_filepath(filepath))
+        segment.filename += ".gz"
+        segment.size = os.path.getsize(filepath + ".gz")
+        segment.compressed = True
+
+    def _delete(self, segment: SegmentInfo) -> None:
+        filepath = os.path.join(self.dirname, segment.filename)
+        for path in (filepath, phase_index_filepath(filepath.removesuffix(".gz"))):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def apply_retention(self) -> None:
+        policy = self.retention
+        if policy.compress_after is not None:
+            for segment in self.segments[:max(0, len(self.segments) - policy.compress_after)]:
+                if not segment.compressed:
+                    self._compress(segment)
+
+        while self.segments and self._exceeds_retention(time.time()):
+            self._delete(self.segments.pop(0))
+
+    def _exceeds_retention(self, now: float) -> bool:
+        policy = self.retention
+        if policy.max_segments is not None and len(self.segments) > policy.max_segments:
+            return True
+        if policy.max_age is not None and now - self.segments[0].ended > policy.max_age:
+            return True
+        return policy.max_bytes is not None and sum(segment.size for segment in self.segments) > policy.max_bytes
+
+    def close(self) -> None:
+        self.rotate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
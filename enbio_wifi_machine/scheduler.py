@@ -0,0 +1,217 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from enum import Enum
+from enbio_wifi_machine.transport import ModbusTransport
+
+
+class Lane(Enum):
+    """ Priority lanes of transactions, lower value is served first """
+    SAFETY = 0
+    CONTROL = 1
+    MONITOR = 2
+
+
+_lane_context = threading.local()
+
+
+def current_lane() -> Lane:
+    return getattr(_lane_context, "lane", Lane.CONTROL)
+
+
+@contextmanager
+def use_lane(lane: Lane):
+    """ All transactions issued by this thread inside the block go through given lane """
+    previous = current_lane()
+    _lane_context.lane = lane
+    try:
+        yield
+    finally:
+        _lane_context.lane = previous
+
+
+@dataclass
+class LaneStats:
+    transactions: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+    @property
+    def mean_wait(self) -> float:
+        return self.total_wait / self.transactions if self.transactions else 0.0
+
+
+class TransactionScheduler:
+    """
+    Grants exclusive use of shared link to one Modbus transaction at a time.
+    Waiting transactions of higher priority lane are always granted first, inside lane keys (usually slave
+    addresses) are served in weighted round robin order. Optional max_rate limits aggregate transactions per second.
+    Frame already on the wire is never interrupted, preemption happens at frame boundaries.
+    """
+
+    def __init__(self, weights: dict | None = None, max_rate: float | None = None):
+        self.weights = dict(weights or {})
+        self.min_interval = 1.0 / max_rate if max_rate else 0.0
+
+        self._condition = threading.Condition()
+        self._waiting: dict[Lane, dict] = {lane: {} for lane in Lane}
+        self._order: list = []
+        self._current_key: dict[Lane, object] = {}
+        self._credits: dict[Lane, int] = {}
+        self._granted = None
+        self._busy = False
+        self._last_grant_time = 0.0
+        self._stats: dict[Lane, LaneStats] = {lane: LaneStats() for lane in Lane}
+
+    def _next_ticket_in_lane(self, lane: Lane):
+        waiting = self._waiting[lane]
+        current_key = self._current_key.get(lane)
+
+        if current_key is not None and self._credits[lane] > 0 and waiting.get(current_key):
+            self._credits[lane] -= 1
+            return waiting[current_key].popleft()
+
+        start = self._order.index(current_key) + 1 if current_key in self._order else 0
+        for i in range(len(self._order)):
+            key = self._order[(start + i) % len(self._order)]
+            if waiting.get(key):
+                self._current_key[lane] = key
+                self._credits[lane] = max(1, self.weights.get(key, 1)) - 1
+                return waiting[key].popleft()
+
+        return None
+
+    def _next_ticket(self):
+        """ Pick next waiting ticket by lane priority then weighted round robin, None if nobody waits """
+        for lane in Lane:
+            ticket = self._next_ticket_in_lane(lane)
+            if ticket is not None:
+                return ticket
+        return None
+
+    def _grant(self):
+        if self._busy or self._granted is not None:
+            return
+        self._granted = self._next_ticket()
+        if self._granted is not None:
+            self._condition.notify_all()
+
+    def waiting_count(self) -> int:
+        with self._condition:
+            return sum(len(queue) for lane_queues in self._waiting.values() for queue in lane_queues.values())
+
+    def acquire(self, key, lane: Lane | None = None, counted: bool = True) -> float:
+        """
+        Block until link is granted for key. Lane defaults to lane of current thread. Returns waiting time.
+        Not counted slots (link housekeeping, no frame) are left out of lane stats.
+        """
+        lane = current_lane() if lane is None else lane
+        request_time = time.perf_counter()
+        ticket = object()
+
+        with self._condition:
+            if key not in self._order:
+                self._order.append(key)
+            self._waiting[lane].setdefault(key, deque()).append(ticket)
+
+            self._grant()
+            try:
+                while self._granted is not ticket:
+                    self._condition.wait()
+            except BaseException:
+                # Do not leave abandoned ticket, it would block the link forever
+                if self._granted is ticket:
+                    self._granted = None
+                    self._grant()
+                else:
+                    self._waiting[lane][key].remove(ticket)
+                raise
+
+            self._granted = None
+            self._busy = True
+
+            # Keep predictable aggregate rate
+            grant_time = max(time.perf_counter(), self._last_grant_time + self.min_interval)
+            self._last_grant_time = grant_time
+
+            wait_time = grant_time - request_time
+            if counted:
+                stats = self._stats[lane]
+                stats.transactions += 1
+                stats.total_wait += wait_time
+                stats.max_wait = max(stats.max_wait, wait_time)
+
+        delay = grant_time - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+        return wait_time
+
+    def release(self) -> None:
+        with self._condition:
+            self._busy = False
+            self._grant()
+
+    @contextmanager
+    def slot(self, key, lane: Lane | None = None, counted: bool = True):
+        self.acquire(key, lane, counted)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def lane_stats(self) -> dict[Lane, LaneStats]:
+        """ Snapshot of waiting time metrics per lane """
+        with self._condition:
+            return {lane: replace(stats) for lane, stats in self._stats.items()}
+
+    def reset_stats(self) -> None:
+        with self._condition:
+            self._stats = {lane: LaneStats() for lane in Lane}
+
+
+class ScheduledTransport(ModbusTransport):
+    """ Transport executing every transaction of inner transport in scheduler slot """
+
+    def __init__(self, inner: ModbusTransport, scheduler: TransactionScheduler, key):
+        self.inner = inner
+        self.scheduler = scheduler
+        self.key = key
+
+    def read_registers(self, registeraddress: int, number_of_registers: int) -> list[int]:
+        with self.scheduler.slot(self.key):
+            return self.inner.read_registers(registeraddress, number_of_registers)
+
+    def write_registers(self, registeraddress: int, values: list[int]) -> None:
+        with self.scheduler.slot(self.key):
+            self.inner.write_registers(registeraddress, values)
+
+    def read_register(self, registeraddress: int) -> int:
+        with self.scheduler.slot(self.key):
+            return self.inner.read_register(registeraddress)
+
+    def write_register(self, registeraddress: int, value: int) -> None:
+        with self.scheduler.slot(self.key):
+            self.inner.write_register(registeraddress, value)
+
+    def read_string(self, registeraddress: int, number_of_registers: int = 16) -> str:
+        with self.scheduler.slot(self.key):
+            return self.inner.read_string(registeraddress, number_of_registers)
+
+    def write_string(self, registeraddress: int, textstring: str, number_of_registers: int = 16) -> None:
+        with self.scheduler.slot(self.key):
+            self.inner.write_string(registeraddress, textstring, number_of_registers)
+
+    def hold_open(self) -> None:
+        with self.scheduler.slot(self.key, counted=False):
+            self.inner.hold_open()
+
+    def release_open(self) -> None:
+        # Port is never closed while other thread has frame on the wire
+        with self.scheduler.slot(self.key, counted=False):
+            self.inner.release_open()
+
+    def close(self) -> None:
+        self.inner.close()
@@ -0,0 +1,218 @@
+import csv
+import json
+import os
+import socket
+import sqlite3
+import time
+from urllib.parse import parse_qs
+from enbio_wifi_machine.common import ProcessLine
+from enbio_wifi_machine.recording import measurement_columns, process_line_to_row
+
+sample_columns = ["Timestamp"] + measurement_columns
+""" Columns of sample record, Timestamp is Unix time of the poll """
+
+
+def sample_record(proctime: float, pline: ProcessLine, timestamp: float | None = None) -> dict:
+    return dict(zip(sample_columns, [timestamp if timestamp is not None else time.time()]
+                    + process_line_to_row(proctime, pline)))
+
+
+class SampleSink:
+    """
+    Output of samples. Acquisition loop only appends to buffer, batch is written when batch_size samples are buffered
+    or flush_interval seconds passed since last write, and on close. Subclasses implement write_batch().
+    Failed batch (locked database, full disk) is reported and dropped, sink never stops acquisition.
+    """
+
+    def __init__(self, batch_size: int = 50, flush_interval: float = 5.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self._buffer: list[dict] = []
+        self._last_flush = time.monotonic()
+
+    def publish(self, record: dict) -> None:
+        self._buffer.append(record)
+        if len(self._buffer) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        try:
+            self.write_batch(batch)
+        except Exception as e:
+            self.dropped += len(batch)
+            print(f"{type(self).__name__} write of {len(batch)} samples failed: {e}")
+            return
+        self.written += len(batch)
+
+    def write_batch(self, records: list[dict]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class JsonLinesSink(SampleSink):
+    def __init__(self, filepath: str, batch_size: int = 50, flush_interval: float = 5.0):
+        super().__init__(batch_size, flush_interval)
+        self._file = open(filepath, "a")
+
+    def write_batch(self, records: list[dict]) -> None:
+        self._file.write("".join(json.dumps(record) + "\n" for record in records))
+        self._file.flush()
+
+    def close(self) -> None:
+        super().close()
+        self._file.close()
+
+
+class CsvSink(SampleSink):
+    """ Appends to CSV file, header is written only to new file """
+
+    def __init__(self, filepath: str, batch_size: int = 50, flush_interval: float = 5.0):
+        super().__init__(batch_size, flush_interval)
+        is_new = not os.path.exists(filepath) or os.path.getsize(filepath) == 0
+        self._file = open(filepath, "a", newline="")
+        self._writer = csv.DictWriter(self._file, fieldnames=sample_columns)
+        if is_new:
+            self._writer.writeheader()
+
+    def write_batch(self, records: list[dict]) -> None:
+        self._writer.writerows(records)
+        self._file.flush()
+
+    def close(self) -> None:
+        super().close()
+        self._file.close()
+
+
+class SQLiteSink(SampleSink):
+    """ One transaction with executemany per batch """
+
+    def __init__(self, filepath: str, table: str = "samples", batch_size: int = 200, flush_interval: float = 10.0):
+        super().__init__(batch_size, flush_interval)
+        self._connection = sqlite3.connect(filepath)
+        columns = ", ".join(f'"{column}"' for column in sample_columns)
+        self._connection.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ({columns})')
+        self._insert = f'INSERT INTO "{table}" ({columns}) VALUES ({", ".join("?" * len(sample_columns))})'
+
+    def write_batch(self, records: list[dict]) -> None:
+        with self._connection:
+            self._connection.executemany(self._insert, [[record[column] for column in sample_columns]
+                                                        for record in records])
+
+    def close(self) -> None:
+        super().close()
+        self._connection.close()
+
+
+class UdpLineProtocolSink(SampleSink):
+    """
+    InfluxDB line protocol over UDP to local collector (e.g. Telegraf socket_listener). Lines of batch are packed
+    into as few datagrams as fit max_datagram bytes. Sending never blocks, lost datagrams are not retried.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8094, measurement: str = "enbio",
+                 tags: dict[str, str] | None = None, batch_size: int = 50, flush_interval: float = 5.0,
+                 max_datagram: int = 1400):
+        super().__init__(batch_size, flush_interval)
+        self.address = (host, port)
+        self.max_datagram = max_datagram
+        tag_set = "".join(f",{key}={_escape_key(value)}" for key, value in sorted((tags or {}).items()))
+        self._prefix = _escape_key(measurement) + tag_set
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def line(self, record: dict) -> str:
+        fields = ",".join(f"{_escape_key(column)}={_field_value(record[column])}" for column in measurement_columns
+                          if record[column] != "")
+        return f"{self._prefix} {fields} {round(record['Timestamp'] * 1e9)}"
+
+    def write_batch(self, records: list[dict]) -> None:
+        datagram = b""
+        for record in records:
+            line = self.line(record).encode() + b"\n"
+            if datagram and len(datagram) + len(line) > self.max_datagram:
+                self._send(datagram)
+                datagram = b""
+            datagram += line
+        self._send(datagram)
+
+    def _send(self, datagram: bytes) -> None:
+        try:
+            self._socket.sendto(datagram, self.address)
+        except OSError as e:
+            print(f"UDP sink {self.address} send failed: {e}")
+
+    def close(self) -> None:
+        super().close()
+        self._socket.close()
+
+
+def _escape_key(key: str) -> str:
+    return key.replace(",", r"\,").replace("=", r"\=").replace(" ", r"\ ")
+
+
+def _field_value(value) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return f"{value}i"
+    return repr(float(value))
+
+
+class SinkGroup:
+    """ Publishes every sample to all sinks """
+
+    def __init__(self, sinks: list[SampleSink] | None = None):
+        self.sinks = sinks or []
+
+    def publish(self, proctime: float, pline: ProcessLine) -> None:
+        if not self.sinks:
+            return
+        record = sample_record(proctime, pline)
+        for sink in self.sinks:
+            sink.publish(record)
+
+    def close(self) -> None:
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception as e:
+                print(f"{type(sink).__name__} close failed: {e}")
+
+
+def create_sink(spec: str) -> SampleSink:
+    """
+    Sink from text spec 'kind:target[?batch=n&flush=sec]', kinds: jsonl:<file>, csv:<file>, sqlite:<file>,
+    udp:<host>:<port>. Example: 'sqlite:samples.db?batch=500&flush=30'
+    """
+    spec, _, query = spec.partition("?")
+    kind, _, target = spec.partition(":")
+    options = {key: values[-1] for key, values in parse_qs(query).items()}
+    batching = {}
+    if "batch" in options:
+        batching["batch_size"] = int(options["batch"])
+    if "flush" in options:
+        batching["flush_interval"] = float(options["flush"])
+
+    if kind == "jsonl":
+        return JsonLinesSink(target, **batching)
+    if kind == "csv":
+        return CsvSink(target, **batching)
+    if kind == "sqlite":
+        return SQLiteSink(target, **batching)
+    if kind == "udp":
+        host, _, port = target.rpartition(":")
+        return UdpLineProtocolSink(host or "127.0.0.1", int(port), **batching)
+    raise ValueError(f"Unknown sink '{kind}', use jsonl:<file>, csv:<file>, sqlite:<file> or udp:<host>:<port>.")
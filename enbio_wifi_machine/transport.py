@@ -0,0 +1,378 @@
+import socket
+import struct
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError  # Not builtin TimeoutError before Python 3.11
+from contextlib import contextmanager
+import minimalmodbus
+import serial
+from enbio_wifi_machine.common import cfg
+
+
+def is_link_lost(exception: Exception) -> bool:
+    """ Port or connection is gone (e.g. USB cable bumped), as opposed to slave not answering or reporting error """
+    return (isinstance(exception, (serial.SerialException, OSError))
+            and not isinstance(exception, minimalmodbus.ModbusException))
+
+
+def plan_block_reads(registers, max_gap: int = 0, max_count: int = 125, boundaries=()) -> list[tuple[int, int]]:
+    """
+    Group register addresses into (first, count) block reads, one block may bridge up to max_gap unused registers.
+    Block never crosses boundary address (block ends before it), e.g. start or end of range known to be unreadable.
+    """
+    blocks = []
+    for register in sorted(set(registers)):
+        if blocks:
+            first, count = blocks[-1]
+            last = first + count - 1
+            crosses_boundary = any(last < boundary <= register for boundary in boundaries)
+            if register - last - 1 <= max_gap and register - first < max_count and not crosses_boundary:
+                blocks[-1] = (first, register - first + 1)
+                continue
+        blocks.append((register, 1))
+    return blocks
+
+
+class ModbusTransport(ABC):
+    """ Register level access to a single Modbus slave. Mirrors used subset of minimalmodbus.Instrument API """
+
+    max_registers_per_read = 125
+    max_registers_per_write = 123
+
+    @abstractmethod
+    def read_registers(self, registeraddress: int, number_of_registers: int) -> list[int]:
+        pass
+
+    @abstractmethod
+    def write_registers(self, registeraddress: int, values: list[int]) -> None:
+        pass
+
+    def read_register(self, registeraddress: int) -> int:
+        return self.read_registers(registeraddress, 1)[0]
+
+    def write_register(self, registeraddress: int, value: int) -> None:
+        self.write_registers(registeraddress, [value])
+
+    def read_string(self, registeraddress: int, number_of_registers: int = 16) -> str:
+        """ Each register holds 2 characters, high byte first """
+        values = self.read_registers(registeraddress, number_of_registers)
+        return b"".join(struct.pack(">H", value) for value in values).decode("latin1")
+
+    def write_string(self, registeraddress: int, textstring: str, number_of_registers: int = 16) -> None:
+        """ Shorter strings are padded with spaces, same as minimalmodbus does """
+        if len(textstring) > 2 * number_of_registers:
+            raise ValueError(f"Too long string: {len(textstring)} / {2 * number_of_registers}")
+
+        raw = textstring.ljust(2 * number_of_registers).encode("latin1")
+        values = [value for (value,) in struct.iter_unpack(">H", raw)]
+        self.write_registers(registeraddress, values)
+
+    def hold_open(self) -> None:
+        """ Start keeping underlying link open, every call must be paired with release_open() """
+        pass
+
+    def release_open(self) -> None:
+        pass
+
+    @contextmanager
+    def keep_open(self):
+        """ Keep underlying link open between transactions inside the block, blocks may nest or overlap """
+        self.hold_open()
+        try:
+            yield
+        finally:
+            self.release_open()
+
+    def close(self) -> None:
+        pass
+
+
+class SerialTransport(ModbusTransport):
+    """ Modbus RTU over USB Serial port using minimalmodbus.Instrument """
+
+    def __init__(self, port: [str | serial.Serial], address: int = 1, close_port_after_each_call: bool = True):
+        """ Passing serial.Serial object of other transport shares one port handle between slaves """
+        self.port = port
+        self.address = address
+        self.instrument = minimalmodbus.Instrument(port, address,
+                                                   close_port_after_each_call=close_port_after_each_call, debug=False)
+        self.instrument.serial.baudrate = cfg["serial_port"]
+        self.instrument.serial.bytesize = 8
+        self.instrument.serial.stopbits = 1
+        self.instrument.serial.parity = minimalmodbus.serial.PARITY_EVEN
+        self.instrument.serial.timeout = cfg["serial_timeout"]
+
+        self._open_holders = 0
+        self._close_after_release = close_port_after_each_call
+        self._holders_lock = threading.Lock()
+
+    def read_registers(self, registeraddress: int, number_of_registers: int) -> list[int]:
+        return self.instrument.read_registers(registeraddress, number_of_registers)
+
+    def write_registers(self, registeraddress: int, values: list[int]) -> None:
+        self.instrument.write_registers(registeraddress, list(values))
+
+    def read_register(self, registeraddress: int) -> int:
+        return self.instrument.read_register(registeraddress)
+
+    def write_register(self, registeraddress: int, value: int) -> None:
+        self.instrument.write_register(registeraddress, value)
+
+    def read_string(self, registeraddress: int, number_of_registers: int = 16) -> str:
+        return self.instrument.read_string(registeraddress, number_of_registers)
+
+    def write_string(self, registeraddress: int, textstring: str, number_of_registers: int = 16) -> None:
+        self.instrument.write_string(registeraddress, textstring, number_of_registers)
+
+    def hold_open(self) -> None:
+        """ Skip port reopening for every frame until last holder releases """
+        with self._holders_lock:
+            if self._open_holders == 0:
+                self._close_after_release = self.instrument.close_port_after_each_call
+                self.instrument.close_port_after_each_call = False
+            self._open_holders += 1
+
+    def release_open(self) -> None:
+        """ Port is closed by last holder if it was closing after each call before """
+        with self._holders_lock:
+            self._open_holders -= 1
+            if self._open_holders == 0:
+                self.instrument.close_port_after_each_call = self._close_after_release
+                if self._close_after_release:
+                    self.instrument.serial.close()
+
+    def close(self) -> None:
+        self.instrument.serial.close()
+
+
+MODBUS_TCP_DEFAULT_PORT = 502
+
+_FC_READ_HOLDING_REGISTERS = 3
+_FC_WRITE_MULTIPLE_REGISTERS = 16
+
+_SLAVE_ERRORS = {
+    1: (minimalmodbus.IllegalRequestError, "Slave reported illegal function"),
+    2: (minimalmodbus.IllegalRequestError, "Slave reported illegal data address"),
+    3: (minimalmodbus.IllegalRequestError, "Slave reported illegal data value"),
+    4: (minimalmodbus.SlaveReportedException, "Slave reported device failure"),
+    6: (minimalmodbus.SlaveDeviceBusyError, "Slave reported device busy"),
+    7: (minimalmodbus.NegativeAcknowledgeError, "Slave reported negative acknowledge"),
+    10: (minimalmodbus.SlaveReportedException, "Slave reported gateway path unavailable"),
+    11: (minimalmodbus.SlaveReportedException, "Slave reported gateway target device failed to respond"),
+}
+
+
+def slave_error_from_code(code: int) -> minimalmodbus.ModbusException:
+    exception_type, message = _SLAVE_ERRORS.get(code, (minimalmodbus.SlaveReportedException,
+                                                       f"Slave reported exception code {code}"))
+    return exception_type(message)
+
+
+class ModbusTcpConnection:
+    """
+    Modbus TCP (MBAP) connection to a gateway. Requests are tagged with transaction ids so many of them
+    can be in flight at once, responses are matched by id in background receiver thread.
+    """
+
+    mbap_header = struct.Struct(">HHHB")
+
+    def __init__(self, host: str, port: int = MODBUS_TCP_DEFAULT_PORT, timeout: float | None = None,
+                 max_in_flight: int = 16):
+        self.host = host
+        self.port = port
+        self.timeout = cfg["serial_timeout"] if timeout is None else timeout
+
+        self._socket = socket.create_connection((host, port), timeout=self.timeout)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._socket.settimeout(None)
+
+        self._send_lock = threading.Lock()
+        self._pending: dict[int, Future] = {}
+        self._pending_lock = threading.Lock()
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+        self._next_transaction_id = 0
+        self._closed = False
+
+        self._receiver = threading.Thread(target=self._receive_procedure, daemon=True)
+        self._receiver.start()
+
+    def _allocate_transaction_id(self, future: Future) -> int:
+        with self._pending_lock:
+            if self._closed:
+                raise minimalmodbus.NoResponseError(f"Connection to {self.host}:{self.port} is closed")
+
+            # Skip ids still waiting for response after wrap around
+            while True:
+                self._next_transaction_id = (self._next_transaction_id + 1) & 0xFFFF
+                if self._next_transaction_id not in self._pending:
+                    break
+
+            self._pending[self._next_transaction_id] = future
+            return self._next_transaction_id
+
+    def submit(self, unit: int, pdu: bytes) -> Future:
+        """ Send request PDU without waiting. Future resolves to response PDU or fails with Modbus exception """
+        self._in_flight.acquire()
+        future = Future()
+        future.transaction_id = None
+        future.add_done_callback(lambda _: self._in_flight.release())
+
+        try:
+            transaction_id = self._allocate_transaction_id(future)
+        except Exception as e:
+            future.set_exception(e)
+            return future
+
+        future.transaction_id = transaction_id
+
+        frame = self.mbap_header.pack(transaction_id, 0, len(pdu) + 1, unit) + pdu
+        try:
+            with self._send_lock:
+                self._socket.sendall(frame)
+        except OSError as e:
+            self.fail_transaction(transaction_id, minimalmodbus.NoResponseError(f"Sending failed: {e}"))
+
+        return future
+
+    def request(self, unit: int, pdu: bytes) -> bytes:
+        future = self.submit(unit, pdu)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            error = minimalmodbus.NoResponseError(f"No response from {self.host}:{self.port} unit {unit}")
+            self.fail_transaction(future.transaction_id, error)
+            raise error
+
+    def fail_transaction(self, transaction_id: int | None, exception: Exception):
+        """ Give up waiting for response, frees transaction id and in flight slot """
+        with self._pending_lock:
+            future = self._pending.pop(transaction_id, None)
+        if future is not None and not future.done():
+            future.set_exception(exception)
+
+    def _receive_exactly(self, size: int) -> bytes:
+        data = b""
+        while len(data) < size:
+            chunk = self._socket.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Connection closed by gateway")
+            data += chunk
+        return data
+
+    def _receive_procedure(self):
+        try:
+            while True:
+                transaction_id, protocol_id, length, _unit = self.mbap_header.unpack(
+                    self._receive_exactly(self.mbap_header.size))
+                pdu = self._receive_exactly(length - 1)
+
+                with self._pending_lock:
+                    future = self._pending.pop(transaction_id, None)
+
+                # Late responses of timed out requests are dropped
+                if future is None or future.done():
+                    continue
+
+                if protocol_id != 0:
+                    future.set_exception(minimalmodbus.InvalidResponseError(f"Bad protocol id {protocol_id}"))
+                elif pdu[0] & 0x80:
+                    future.set_exception(slave_error_from_code(pdu[1]))
+                else:
+                    future.set_result(pdu)
+
+        except (OSError, ConnectionError, struct.error) as e:
+            with self._pending_lock:
+                self._closed = True
+                pending, self._pending = self._pending, {}
+
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(minimalmodbus.NoResponseError(f"Connection lost: {e}"))
+
+    def close(self) -> None:
+        with self._pending_lock:
+            self._closed = True
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._socket.close()
+        self._receiver.join(timeout=self.timeout)
+
+
+class TcpTransport(ModbusTransport):
+    """ Single slave (unit) behind Modbus TCP gateway. Many transports can share one connection """
+
+    def __init__(self, host: str | None = None, port: int = MODBUS_TCP_DEFAULT_PORT, unit: int = 1,
+                 connection: ModbusTcpConnection | None = None):
+        if connection is None:
+            connection = ModbusTcpConnection(host, port)
+        self.connection = connection
+        self.unit = unit
+
+    def with_unit(self, unit: int) -> "TcpTransport":
+        return TcpTransport(unit=unit, connection=self.connection)
+
+    def read_registers_async(self, registeraddress: int, number_of_registers: int) -> Future:
+        """ Issue read without waiting, Future resolves to list of register values """
+        if not 1 <= number_of_registers <= self.max_registers_per_read:
+            raise ValueError(f"Bad number of registers: {number_of_registers}")
+
+        pdu = struct.pack(">BHH", _FC_READ_HOLDING_REGISTERS, registeraddress, number_of_registers)
+        request = self.connection.submit(self.unit, pdu)
+        result = Future()
+        result.transaction_id = request.transaction_id
+
+        def on_response(response: Future):
+            try:
+                payload = response.result()
+                byte_count = payload[1]
+                if byte_count != 2 * number_of_registers or len(payload) != 2 + byte_count:
+                    raise minimalmodbus.InvalidResponseError(f"Bad response length to read {registeraddress}")
+                result.set_result(list(struct.unpack(f">{number_of_registers}H", payload[2:])))
+            except Exception as e:
+                result.set_exception(e)
+
+        request.add_done_callback(on_response)
+        return result
+
+    def write_registers_async(self, registeraddress: int, values: list[int]) -> Future:
+        """ Issue write without waiting, Future resolves to None when slave acknowledged """
+        if not 1 <= len(values) <= self.max_registers_per_write:
+            raise ValueError(f"Bad number of registers: {len(values)}")
+
+        pdu = struct.pack(f">BHHB{len(values)}H", _FC_WRITE_MULTIPLE_REGISTERS, registeraddress, len(values),
+                          2 * len(values), *values)
+        request = self.connection.submit(self.unit, pdu)
+        result = Future()
+        result.transaction_id = request.transaction_id
+
+        def on_response(response: Future):
+            try:
+                _, echo_address, echo_count = struct.unpack(">BHH", response.result())
+                if echo_address != registeraddress or echo_count != len(values):
+                    raise minimalmodbus.InvalidResponseError(f"Bad write echo for {registeraddress}")
+                result.set_result(None)
+            except Exception as e:
+                result.set_exception(e)
+
+        request.add_done_callback(on_response)
+        return result
+
+    def _wait(self, future: Future):
+        try:
+            return future.result(timeout=self.connection.timeout)
+        except FutureTimeoutError:
+            error = minimalmodbus.NoResponseError(f"No response from unit {self.unit}")
+            self.connection.fail_transaction(future.transaction_id, error)
+            raise error
+
+    def read_registers(self, registeraddress: int, number_of_registers: int) -> list[int]:
+        return self._wait(self.read_registers_async(registeraddress, number_of_registers))
+
+    def write_registers(self, registeraddress: int, values: list[int]) -> None:
+        self._wait(self.write_registers_async(registeraddress, values))
+
+    def close(self) -> None:
+        self.connection.close()
@@ -0,0 +1,141 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, asdict
+import numpy as np
+import pandas as pd
+from enbio_wifi_machine.common import HeatersToggleCounts
+
+wear_columns = ["ChHeat", "ShdHeat", "SgsHeat", "V1", "V2", "V3", "V5", "Vacuum", "Water"]
+""" Recording columns of heaters, valves and pumps """
+
+toggle_counter_columns = {"ch_ab": "ChHeat", "sg_ab": "ShdHeat", "sg_c": "SgsHeat"}
+""" HeatersToggleCounts field by recording column it counts """
+
+WEAR_CACHE_VERSION = 3
+
+
+@dataclass
+class ComponentWear:
+    switch_ons: int = 0
+    """ Off to on transitions, state at first sample of recording is not counted """
+    toggles: int = 0
+    on_time: float = 0.0
+    recorded_time: float = 0.0
+
+    @property
+    def duty_cycle(self) -> float:
+        return self.on_time / self.recorded_time if self.recorded_time else 0.0
+
+    def add(self, other: "ComponentWear") -> None:
+        self.switch_ons += other.switch_ons
+        self.toggles += other.toggles
+        self.on_time += other.on_time
+        self.recorded_time += other.recorded_time
+
+
+def recording_wear(filepath: str) -> dict[str, ComponentWear]:
+    """
+    Wear of one recording, all components at once: edges from diff of state matrix, on time from state held until
+    next sample. Gap rows are skipped, state change across gap counts as one transition, but time across gap is
+    unknown, so it counts neither as on time nor as recorded time.
+    """
+    df = pd.read_csv(filepath)
+    columns = [column for column in wear_columns if column in df.columns]
+    df = df.dropna(subset=columns)
+    if len(df) < 2:
+        return {column: ComponentWear() for column in columns}
+
+    time = df["Time (sec)"].to_numpy(dtype=float)
+    states = df[columns].astype(float).to_numpy() > 0
+    edges = np.diff(states.astype(np.int8), axis=0)
+    dt = np.where(np.diff(df.index.to_numpy()) == 1, np.diff(time), 0.0)
+
+    switch_ons = (edges > 0).sum(axis=0)
+    toggles = (edges != 0).sum(axis=0)
+    on_time = dt @ states[:-1]
+    return {column: ComponentWear(int(switch_ons[index]), int(toggles[index]), float(on_time[index]), float(dt.sum()))
+            for index, column in enumerate(columns)}
+
+
+def _file_key(filepath: str) -> list:
+    stat = os.stat(filepath)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+@dataclass
+class WearReport:
+    totals: dict[str, ComponentWear] = field(default_factory=dict)
+    recordings: dict[str, dict[str, ComponentWear]] = field(default_factory=dict)
+    cached: int = 0
+    failed: dict[str, str] = field(default_factory=dict)
+
+    def reconcile(self, counts: HeatersToggleCounts) -> list[tuple[str, int, int]]:
+        """
+        (counter, device value, recorded switch-ons) of every heater toggle counter read from device. Device counts
+        also cycles that were not recorded, so it is expected to be higher, lower value means counter was reset.
+        """
+        return [(name, getattr(counts, name), self.totals.get(column, ComponentWear()).switch_ons)
+                for name, column in toggle_counter_columns.items() if getattr(counts, name) is not None]
+
+    def __str__(self):
+        lines = [f"{len(self.recordings)} recordings ({self.cached} from cache), {len(self.failed)} failed",
+                 f"{'Component':<10}{'Switch-ons':>12}{'Toggles':>10}{'On time h':>12}{'Duty %':>9}"]
+        for column, wear in self.totals.items():
+            lines.append(f"{column:<10}{wear.switch_ons:>12}{wear.toggles:>10}{wear.on_time / 3600:>12.2f}"
+                         f"{wear.duty_cycle * 100:>9.1f}")
+        lines += [f"    {name}: {error}" for name, error in self.failed.items()]
+        return "\n".join(lines)
+
+
+def archive_wear(filepaths: list[str], cache_path: str | None = None, max_workers: int | None = None) -> WearReport:
+    """
+    Wear of every recording and totals. Recordings are processed in process pool, results are kept in cache file
+    by absolute path of recording with its size and modification time taken before it is read, so only new or grown
+    recordings are read again. Report is keyed by given paths.
+    """
+    cache = {}
+    if cache_path is not None and os.path.exists(cache_path):
+        with open(cache_path, "r") as f:
+            data = json.load(f)
+        if data.get("version") == WEAR_CACHE_VERSION:
+            cache = data["recordings"]
+
+    report = WearReport()
+    pending = {}
+    for filepath in filepaths:
+        try:
+            key = _file_key(filepath)
+        except OSError as e:
+            report.failed[filepath] = str(e)
+            continue
+        entry = cache.get(os.path.abspath(filepath))
+        if entry is not None and entry["key"] == key:
+            report.recordings[filepath] = {column: ComponentWear(**wear) for column, wear in entry["wear"].items()}
+            report.cached += 1
+        else:
+            # Key taken before worker reads, rows appended meanwhile make recording pending again next time
+            pending[filepath] = key
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {filepath: executor.submit(recording_wear, filepath) for filepath in pending}
+            for filepath, future in futures.items():
+                try:
+                    report.recordings[filepath] = future.result()
+                except Exception as e:
+                    report.failed[filepath] = str(e)
+                    continue
+                cache[os.path.abspath(filepath)] = {
+                    "key": pending[filepath],
+                    "wear": {column: asdict(wear) for column, wear in report.recordings[filepath].items()}}
+
+    for wear in report.recordings.values():
+        for column, component in wear.items():
+            report.totals.setdefault(column, ComponentWear()).add(component)
+    report.totals = {column: report.totals[column] for column in wear_columns if column in report.totals}
+
+    if cache_path is not None:
+        with open(cache_path, "w") as f:
+            json.dump({"version": WEAR_CACHE_VERSION, "recordings": cache}, f)
+    return report
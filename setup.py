@@ -9,6 +9,7 @@ setup(
         'pyserial~=3.5',
         'matplotlib==3.9.2',
         'pandas==2.2.3',
+        'numpy==2.1.3',
     ],
     entry_points={
         "console_scripts": [
@@ -0,0 +1,142 @@
+import socketserver
+import struct
+import threading
+import pytest
+from enbio_wifi_machine.common import ProcessLine, DOState, PWRState, SensorsMeasurements
+from enbio_wifi_machine.modbus_registers import ModbusRegister
+from enbio_wifi_machine.transport import ModbusTransport, slave_error_from_code
+
+
+class MemoryTransport(ModbusTransport):
+    """ In memory slave, reading not existing register reports illegal data address """
+
+    def __init__(self, registers: dict[int, int] | None = None):
+        self.registers = dict(registers or {})
+        self.transactions = 0
+
+    def read_registers(self, registeraddress: int, number_of_registers: int) -> list[int]:
+        self.transactions += 1
+        addresses = range(registeraddress, registeraddress + number_of_registers)
+        if any(address not in self.registers for address in addresses):
+            raise slave_error_from_code(2)
+        return [self.registers[address] for address in addresses]
+
+    def write_registers(self, registeraddress: int, values: list[int]) -> None:
+        self.transactions += 1
+        for offset, value in enumerate(values):
+            self.registers[registeraddress + offset] = value
+
+
+class IdleMachine(MemoryTransport):
+    """ Every known register (and next one, for floats) reads 0, device id takes 32 registers """
+
+    def __init__(self):
+        registers = {register.value + offset: 0 for register in ModbusRegister for offset in range(2)}
+        registers.update({ModbusRegister.DEVICE_ID.value + offset: 0 for offset in range(32)})
+        super().__init__(registers)
+
+
+class ProvisionedMachine(IdleMachine):
+    """ Clears save flags right after write, saving date time copies set registers to RTC read registers """
+
+    def __init__(self, ignored_registers: tuple[int, ...] = ()):
+        super().__init__()
+        self.ignored_registers = ignored_registers
+
+    def write_registers(self, registeraddress: int, values: list[int]) -> None:
+        if registeraddress in self.ignored_registers:
+            self.transactions += 1
+            return
+        super().write_registers(registeraddress, values)
+
+        if registeraddress == ModbusRegister.DATETIME_SAVE.value:
+            for source, target in [(113, 1512), (112, 1513), (111, 1514), (114, 1515), (115, 1516)]:
+                self.registers[target] = self.registers[source]
+        if registeraddress in (ModbusRegister.SAVE_ALL.value, ModbusRegister.DATETIME_SAVE.value):
+            self.registers[registeraddress] = 0
+
+
+def make_process_line(phase: int, t_proc: float, p_proc: float) -> ProcessLine:
+    """ P121 process line, all temperatures equal to t_proc """
+    return ProcessLine(sec=0, phase=phase, pwr_state=PWRState(0, 0.0, 0.0, 0.0, 0.0),
+                       do_state=DOState.from_bitfields(3 << 12),
+                       sensors_msrs=SensorsMeasurements(p_proc, 1.0, t_proc, t_proc, t_proc, 25.0))
+
+
+class ModbusTcpStandIn(socketserver.ThreadingTCPServer):
+    """
+    Local Modbus TCP gateway stand-in serving MemoryTransport slaves by unit id. With reorder_batch > 1 it collects
+    that many requests and responds in reverse order, like gateway with several busy serial lines.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, slaves: dict[int, MemoryTransport], reorder_batch: int = 1):
+        self.slaves = slaves
+        self.reorder_batch = reorder_batch
+        self.max_seen_in_flight = 0
+        super().__init__(("127.0.0.1", 0), _StandInHandler)
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def execute(self, unit: int, pdu: bytes) -> bytes:
+        slave = self.slaves.get(unit)
+        if slave is None:
+            return bytes([pdu[0] | 0x80, 11])
+
+        try:
+            if pdu[0] == 3:
+                address, count = struct.unpack(">HH", pdu[1:5])
+                values = slave.read_registers(address, count)
+                return struct.pack(f">BB{count}H", 3, 2 * count, *values)
+            if pdu[0] == 16:
+                address, count, _ = struct.unpack(">HHB", pdu[1:6])
+                slave.write_registers(address, list(struct.unpack(f">{count}H", pdu[6:6 + 2 * count])))
+                return struct.pack(">BHH", 16, address, count)
+            return bytes([pdu[0] | 0x80, 1])
+        except Exception:
+            return bytes([pdu[0] | 0x80, 2])
+
+
+class _StandInHandler(socketserver.BaseRequestHandler):
+    def _receive_exactly(self, size):
+        data = b""
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError()
+            data += chunk
+        return data
+
+    def handle(self):
+        batch = []
+        try:
+            while True:
+                transaction_id, _, length, unit = struct.unpack(">HHHB", self._receive_exactly(7))
+                pdu = self._receive_exactly(length - 1)
+                batch.append((transaction_id, unit, self.server.execute(unit, pdu)))
+                self.server.max_seen_in_flight = max(self.server.max_seen_in_flight, len(batch))
+
+                if len(batch) >= self.server.reorder_batch:
+                    for transaction_id, unit, response in reversed(batch):
+                        self.request.sendall(struct.pack(">HHHB", transaction_id, 0, len(response) + 1, unit)
+                                             + response)
+                    batch = []
+        except (ConnectionError, OSError):
+            pass
+
+
+@pytest.fixture
+def tcp_standin():
+    slaves = {1: MemoryTransport(), 2: MemoryTransport()}
+    server = ModbusTcpStandIn(slaves)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,46 @@
+import math
+import statistics
+from enbio_wifi_machine.analytics import CycleAnalytics, RunningStats, saturation_temperature
+from conftest import make_process_line as make_line
+
+
+def test_running_stats_and_saturation_temperature():
+    values = [121.0, 134.5, 133.9, 135.2, 90.1]
+    stats = RunningStats()
+    for value in values:
+        stats.add(value)
+
+    assert math.isclose(stats.mean, statistics.mean(values))
+    assert math.isclose(stats.variance, statistics.variance(values))
+    assert (stats.minimum, stats.maximum) == (90.1, 135.2)
+
+    assert abs(saturation_temperature(1.01325) - 100.0) < 0.3
+    assert abs(saturation_temperature(3.04) - 134.0) < 0.3
+    assert saturation_temperature(0.2) is None
+
+
+def test_cycle_analytics_phases_f0_and_gap():
+    analytics = CycleAnalytics(temperature_threshold=134.0)
+    for second in range(60):
+        analytics.add(second, make_line(1, 100.0, 1.0))
+    # Holding at reference temperature for a minute gives F0 of one minute
+    for second in range(60, 121):
+        analytics.add(second, make_line(5, 121.1, 2.1))
+    analytics.gap()
+    analytics.add(500, make_line(5, 134.0, 3.04))
+    analytics.add(510, make_line(12, 60.0, 1.0))
+
+    heating, sterilization = analytics.phases[1], analytics.phases[5]
+    assert heating.duration == 60 and sterilization.duration == 70
+    assert sterilization.t_proc.count == 62
+    assert sterilization.time_above_threshold == 10
+    assert math.isclose(analytics.f0, heating.f0 + sterilization.f0)
+    assert math.isclose(sterilization.f0, 1.0 + 10 * lethality(134.0) / 60)
+    # Saturation temperature of 2.1 bar is about 121.8 *C
+    assert -1.0 < sterilization.saturation_deviation.mean < 0.0
+    assert heating.saturation_deviation.count == 60
+    assert "Total F0" in analytics.summary()
+
+
+def lethality(temperature: float) -> float:
+    return 10 ** ((temperature - 121.1) / 10)
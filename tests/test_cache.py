@@ -0,0 +1,97 @@
+import threading
+import time
+from enbio_wifi_machine.cache import RegisterCache, CachingTransport
+from enbio_wifi_machine.machine import EnbioWiFiMachine
+from enbio_wifi_machine.modbus_registers import ModbusRegister
+from conftest import IdleMachine
+
+
+def cached_machine(policies=None) -> tuple[EnbioWiFiMachine, IdleMachine]:
+    slave = IdleMachine()
+    return EnbioWiFiMachine(transport=slave, cache=RegisterCache(policies)), slave
+
+
+def test_cache_serves_static_registers():
+    machine, slave = cached_machine()
+
+    for _ in range(5):
+        machine.get_firmware_version()
+        machine.get_device_id()
+        machine.get_scale_factors()
+        machine.get_sensors_measurements()
+    sensor_reads = slave.transactions - 4
+
+    assert sensor_reads == 5 * 6
+    stats = machine.cache_stats()
+    assert (stats.hits, stats.misses) == (4 * 4, 4)
+    assert stats.saved_time > 0
+
+
+def test_cache_invalidated_by_writes():
+    machine, slave = cached_machine()
+    assert machine.get_boardnumber() == ("A", 0, 0)
+    assert machine.get_device_id() == ""
+
+    machine.set_boardnumber("E", 24, 6)
+    machine.set_device_id("STW02-XX-24-00001")
+
+    assert machine.get_boardnumber() == ("E", 24, 6)
+    assert machine.get_device_id() == "STW02-XX-24-00001"
+
+
+def test_cache_flushed_by_reboot_and_reset():
+    machine, slave = cached_machine()
+    machine.get_firmware_version()
+
+    slave.registers[ModbusRegister.FIRMWARE_VERSION.value] = (7 << 9) | (5 << 4) | 4
+    assert machine.get_firmware_version() != "7.5.4"
+    machine.reboot()
+    assert machine.get_firmware_version() == "7.5.4"
+
+    slave.registers[ModbusRegister.FIRMWARE_VERSION.value] = 0
+    machine.reset_parameters_with_target(target_us=False)
+    assert machine.get_firmware_version() == "0.0.0"
+
+
+def test_cache_ttl_expires():
+    machine, slave = cached_machine({ModbusRegister.DIP_SWITCH.value: 0.05})
+
+    machine.get_dpi_switch()
+    slave.registers[ModbusRegister.DIP_SWITCH.value] = 1
+    assert machine.get_dpi_switch()[0] is False
+
+    time.sleep(0.06)
+    assert machine.get_dpi_switch()[0] is True
+
+
+class SlowAnswerMachine(IdleMachine):
+    """ Read takes values at once, but answers only after release, like long bus transaction """
+
+    def __init__(self):
+        super().__init__()
+        self.reading = threading.Event()
+        self.release = threading.Event()
+
+    def read_registers(self, registeraddress, number_of_registers):
+        values = super().read_registers(registeraddress, number_of_registers)
+        self.reading.set()
+        self.release.wait(timeout=5.0)
+        return values
+
+
+def test_cache_drops_read_overtaken_by_write():
+    slave = SlowAnswerMachine()
+    transport = CachingTransport(slave, RegisterCache())
+    register = ModbusRegister.BOARD_NUM.value
+    results = []
+
+    reader = threading.Thread(target=lambda: results.append(transport.read_registers(register, 1)))
+    reader.start()
+    assert slave.reading.wait(timeout=5.0)
+    # Write lands between device answering old value and reader storing it
+    transport.write_registers(register, [5])
+    slave.release.set()
+    reader.join()
+
+    assert results == [[0]]
+    assert transport.read_registers(register, 1) == [5]
@@ -0,0 +1,52 @@
+from enbio_wifi_machine.cli import initialize_parser, run_batch
+from enbio_wifi_machine.machine import EnbioWiFiMachine
+from enbio_wifi_machine.modbus_registers import ModbusRegister
+from conftest import MemoryTransport
+
+
+def test_batch_runs_commands_on_one_machine(capsys):
+    transport = MemoryTransport({address: 0 for address in range(1024, 1024 + 32)})
+    transport.registers[ModbusRegister.DOOR_OPEN.value] = 1
+    machine = EnbioWiFiMachine(transport=transport)
+
+    script = [
+        "# provisioning",
+        "devidset STW02-XX-24-00001",
+        "",
+        "isdooropen",
+        "notacommand",
+        "fleet",
+        "devidget",
+    ]
+    timings = run_batch(machine, initialize_parser(), script)
+
+    assert [(line, success) for line, _, success in timings] == [
+        ("devidset STW02-XX-24-00001", True),
+        ("isdooropen", True),
+        ("notacommand", False),
+        ("fleet", False),
+        ("devidget", True),
+    ]
+    output = capsys.readouterr().out
+    assert "Door open: True" in output
+    assert "Not allowed in batch: fleet" in output
+
+
+def test_batch_stop_on_error():
+    machine = EnbioWiFiMachine(transport=MemoryTransport())
+
+    timings = run_batch(machine, initialize_parser(), ["isdooropen", "devidget"], stop_on_error=True)
+
+    assert len(timings) == 1
+    assert not timings[0][2]
+
+
+def test_batch_counts_caught_device_error_as_failed(capsys):
+    machine = EnbioWiFiMachine(transport=MemoryTransport())
+    parser = initialize_parser()
+
+    timings = run_batch(machine, parser, ["devidset " + "X" * 40, "isdooropen"], stop_on_error=True)
+
+    assert [(line, success) for line, _, success in timings] == [("devidset " + "X" * 40, False)]
+    output = capsys.readouterr().out
+    assert "Device ID too long" in output and "failed in" in output
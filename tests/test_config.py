@@ -0,0 +1,58 @@
+import pytest
+from enbio_wifi_machine.common import EnbioDeviceInternalException, ScaleFactors, ScaleFactor
+from enbio_wifi_machine.config import ConfigSnapshot, take_snapshot, diff_snapshots, restore_snapshot
+from enbio_wifi_machine.machine import EnbioWiFiMachine
+from enbio_wifi_machine.modbus_registers import ModbusRegister
+from conftest import ProvisionedMachine
+
+
+def configured_machine() -> tuple[EnbioWiFiMachine, ProvisionedMachine]:
+    slave = ProvisionedMachine()
+    machine = EnbioWiFiMachine(transport=slave)
+    machine.set_device_id("STW02-XX-24-00001")
+    machine.set_boardnumber("E", 24, 6)
+    machine.set_scale_factors(ScaleFactors(*[ScaleFactor(a=0.5 + index, b=-index) for index in range(4)]))
+    machine.set_backlight(70)
+    return machine, slave
+
+
+def test_config_snapshot_round_trip(tmp_path):
+    machine, slave = configured_machine()
+
+    slave.transactions = 0
+    snapshot = take_snapshot(machine)
+    # No block spans unreadable registers between scale factor blocks, so nothing is read again
+    assert slave.transactions == 7
+
+    snapshot.save(str(tmp_path / "config.json"))
+    loaded = ConfigSnapshot.load(str(tmp_path / "config.json"))
+
+    assert loaded == snapshot
+    decoded = loaded.decoded()
+    assert decoded["device_id"] == "STW02-XX-24-00001"
+    assert decoded["boardnumber"] == "E.24.06"
+    assert decoded["scales_a"] == [0.5, 1.5, 2.5, 3.5]
+    assert decoded["backlight"] == 70
+
+
+def test_config_diff_and_restore_only_changed():
+    machine, slave = configured_machine()
+    snapshot = take_snapshot(machine)
+
+    machine.set_backlight(20)
+    machine.set_standby_cooling_thrsh_tmpr(45)
+    assert [str(difference) for difference in diff_snapshots(snapshot, take_snapshot(machine))] == [
+        "standby_cooling_thrsh: 0 -> 45",
+        "backlight: 70 -> 20",
+    ]
+
+    written = restore_snapshot(machine, snapshot)
+
+    assert written == ["standby_cooling_thrsh", "backlight"]
+    assert diff_snapshots(snapshot, take_snapshot(machine)) == []
+    assert slave.registers[ModbusRegister.BACKLIGHT.value] == 70
+
+
+def test_config_rejects_unknown_version():
+    with pytest.raises(EnbioDeviceInternalException):
+        ConfigSnapshot.from_json('{"format": "enbio_config", "version": 99, "taken": "", "fields": {}}')
@@ -0,0 +1,116 @@
+import os
+import stat
+import threading
+import time
+import pytest
+from enbio_wifi_machine.daemon import MachineDaemon, DaemonClient
+from enbio_wifi_machine.machine import EnbioWiFiMachine
+from enbio_wifi_machine.modbus_registers import ModbusRegister
+from enbio_wifi_machine.common import EnbioDeviceInternalException
+from conftest import IdleMachine
+
+
+class SlowIdleMachine(IdleMachine):
+    def read_registers(self, registeraddress, number_of_registers):
+        time.sleep(0.05)
+        return super().read_registers(registeraddress, number_of_registers)
+
+
+class BlockingIdleMachine(IdleMachine):
+    """ Reads wait until released, so concurrent requests can be queued deterministically """
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def read_registers(self, registeraddress, number_of_registers):
+        self.release.wait(timeout=5.0)
+        return super().read_registers(registeraddress, number_of_registers)
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    transport = SlowIdleMachine()
+    transport.registers[ModbusRegister.FIRMWARE_VERSION.value] = (7 << 9) | (5 << 4) | 4
+    daemon = MachineDaemon(EnbioWiFiMachine(transport=transport), str(tmp_path / "enbio.sock"), interval=0.1)
+    daemon.start()
+
+    yield daemon
+
+    daemon.shutdown()
+
+
+def test_daemon_call_and_unknown_method(daemon):
+    client = DaemonClient(daemon.socket_path)
+
+    assert client.get_firmware_version() == "7.5.4"
+    with pytest.raises(EnbioDeviceInternalException):
+        client.reboot()
+    client.close()
+
+
+def test_daemon_socket_is_private_and_control_opt_in(daemon):
+    assert stat.S_IMODE(os.stat(daemon.socket_path).st_mode) == 0o600
+
+    client = DaemonClient(daemon.socket_path)
+    with pytest.raises(EnbioDeviceInternalException, match="Control not allowed"):
+        client.door_drv_fwd()
+    daemon.allow_control = True
+    client.door_drv_none()
+    client.close()
+
+
+def test_daemon_coalesces_identical_reads(tmp_path):
+    transport = BlockingIdleMachine()
+    daemon = MachineDaemon(EnbioWiFiMachine(transport=transport), str(tmp_path / "enbio.sock"))
+    daemon.start()
+    results = []
+
+    def read():
+        client = DaemonClient(daemon.socket_path)
+        results.append(client.is_door_open())
+        client.close()
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+
+    # First request holds the bus, the other 7 join it before bus answers
+    deadline = time.perf_counter() + 5.0
+    while daemon.coalesced < 7 and time.perf_counter() < deadline:
+        time.sleep(0.001)
+    transport.release.set()
+    for thread in threads:
+        thread.join()
+    daemon.shutdown()
+
+    assert results == [False] * 8
+    assert daemon.coalesced == 7
+    assert transport.transactions == 1
+
+
+def test_daemon_subscribers_share_one_poll_loop(daemon):
+    streams = [DaemonClient(daemon.socket_path).subscribe() for _ in range(3)]
+    samples = [next(message for message in stream if message["event"] == "sample") for stream in streams]
+
+    assert all(sample["data"]["sensors_msrs"]["p_proc"] == 0.0 for sample in samples)
+    assert daemon.polls < 3 * len(streams)
+
+
+def test_daemon_latest_polls_only_stale_sample(tmp_path):
+    daemon = MachineDaemon(EnbioWiFiMachine(transport=IdleMachine()), str(tmp_path / "enbio.sock"), interval=0.5)
+    daemon.start()
+    client = DaemonClient(daemon.socket_path)
+
+    sample = client.latest()
+    assert sample["data"]["phase"] == 0
+    assert time.time() - sample["time"] < daemon.interval
+    polls = daemon.polls
+    assert client.latest() == sample
+    assert daemon.polls == polls
+
+    time.sleep(daemon.interval)
+    assert client.latest()["time"] > sample["time"]
+    assert daemon.polls == polls + 1
+    client.close()
+    daemon.shutdown()
@@ -0,0 +1,74 @@
+import dataclasses
+import matplotlib
+import numpy as np
+from conftest import make_process_line
+from enbio_wifi_machine.downsample import minmax_downsample, lttb_downsample, state_spans, LODLine
+
+
+def test_downsampling_keeps_peaks_and_reduces_points():
+    x = np.arange(100_000, dtype=float)
+    y = np.sin(x / 5000)
+    y[12_345] = 10.0
+    y[54_321] = -10.0
+    y[70_000:70_010] = np.nan
+
+    xs, ys = minmax_downsample(x, y, 500)
+    assert len(xs) <= 1000
+    assert np.all(np.diff(xs) > 0)
+    assert 12_345 in xs and 54_321 in xs
+    assert not np.isnan(ys).any()
+
+    xs, ys = lttb_downsample(x, y, 1000)
+    assert len(xs) == 1000 and xs[0] == 0 and xs[-1] == 99_999
+    assert 12_345 in xs and 54_321 in xs
+
+
+def test_state_spans_merge_consecutive_samples():
+    x = np.arange(8, dtype=float)
+    assert state_spans(x, [1, 1, 1, 0, 0, 1, 1, 0]) == [(0.0, 2.0), (4.0, 6.0)]
+    assert state_spans(x, [0] * 7 + [1]) == [(6.0, 7.0)]
+    assert state_spans(x, [0] * 8) == []
+
+
+def test_lod_line_refines_visible_range_on_zoom():
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(4, 3), dpi=100)
+    x = np.arange(50_000, dtype=float)
+    lod = LODLine(ax, x, np.cos(x / 100))
+    assert len(lod.line.get_xdata()) <= ax.bbox.width + 2
+
+    ax.set_xlim(1000, 1100)
+    xdata = lod.line.get_xdata()
+    assert xdata[0] <= 1000 and xdata[-1] >= 1100
+    assert len(xdata) == 103  # every sample of zoomed range and one beyond each edge
+    plt.close(fig)
+
+
+def test_live_plot_keeps_zoom_and_refines_it():
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from enbio_wifi_machine.plotter import LivePlotter
+
+    plotter = LivePlotter(buffer_size=None)
+
+    def add_samples(start: int, stop: int):
+        for sec in range(start, stop):
+            plotter.add_data(dataclasses.replace(make_process_line(1, 100.0 + sec % 7, 1.0), sec=sec))
+
+    add_samples(0, 20_000)
+    plotter.update_plot()
+    assert plotter.ax1.get_xlim() == (0, 19_999)
+    assert len(plotter.lod_t_proc.line.get_xdata()) <= plotter.ax1.bbox.width + 2
+
+    # User zoom is kept between updates and shows every sample of zoomed range
+    plotter.ax1.set_xlim(1000, 1100)
+    add_samples(20_000, 21_000)
+    plotter.update_plot()
+    assert plotter.ax1.get_xlim() == (1000, 1100)
+    assert len(plotter.lod_p_proc.line.get_xdata()) == 103
+
+    plotter.follow()
+    assert plotter.ax1.get_xlim() == (0, 20_999)
+    plt.close(plotter.fig)
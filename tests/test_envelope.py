@@ -0,0 +1,42 @@
+import matplotlib
+import numpy as np
+from conftest import make_process_line
+from enbio_wifi_machine.envelope import load_runs, compute_envelope, plot_envelope
+from enbio_wifi_machine.recording import MeasurementRecorder, measurement_filepath
+
+
+def record_run(dirname: str, identifier: str, interval: float, heating: float, plateau: float,
+               plateau_temperature: float = 121.0) -> None:
+    """ Heating ramp from 20 *C and plateau, phase 1 and 5 """
+    with MeasurementRecorder(measurement_filepath(dirname, "121", interval, identifier)) as recorder:
+        for proctime in np.arange(0.0, heating + plateau, interval):
+            if proctime < heating:
+                recorder.write(proctime, make_process_line(1, 20.0 + (plateau_temperature - 20.0) * proctime / heating,
+                                                           1.0))
+            else:
+                recorder.write(proctime, make_process_line(5, plateau_temperature, 2.1))
+
+
+def test_phase_aligned_envelope_finds_deviating_run(tmp_path):
+    record_run(str(tmp_path), "A", 1.0, heating=100, plateau=200)
+    record_run(str(tmp_path), "B", 0.5, heating=120, plateau=200)
+    record_run(str(tmp_path), "C", 2.0, heating=80, plateau=200)
+    record_run(str(tmp_path), "D", 1.0, heating=110, plateau=200, plateau_temperature=118.0)
+
+    runs = load_runs(str(tmp_path), "121")
+    envelope = compute_envelope(runs, alignment="phase")
+
+    assert envelope.grid[1] - envelope.grid[0] == 0.5
+    assert envelope.phase_boundaries[1] == 105
+    assert "_id_D_" in envelope.ranking()[0][0]
+    # Phase alignment lines up plateaus of different runs, median at start of plateau is plateau temperature
+    plateau_start = np.searchsorted(envelope.grid, envelope.phase_boundaries[1])
+    assert envelope.median[plateau_start + 1] == 121.0
+
+    start_aligned = compute_envelope(runs, alignment="start")
+    assert start_aligned.matrix.shape == (4, len(start_aligned.grid))
+    assert np.isnan(start_aligned.matrix[:, -1]).sum() == 3
+
+    matplotlib.use("Agg")
+    plot_envelope(envelope, str(tmp_path / "envelope.png"))
+    assert (tmp_path / "envelope.png").stat().st_size > 0
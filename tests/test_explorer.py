@@ -0,0 +1,35 @@
+from enbio_wifi_machine.explorer import RegisterExplorer
+from enbio_wifi_machine.machine import EnbioWiFiMachine
+from conftest import MemoryTransport
+
+
+def test_explorer_finds_readable_ranges_and_live_registers(tmp_path):
+    readable = [*range(4, 8), 65, *range(512, 534), *range(1024, 1056), 3502]
+    slave = MemoryTransport({register: 1 for register in readable})
+    explorer = RegisterExplorer(EnbioWiFiMachine(transport=slave))
+
+    explorer.sweep(0, 4000)
+    first_sweep = explorer.transactions
+    slave.registers[65] = 2
+    explorer.sweep(0, 4000)
+
+    assert sorted(explorer.activity) == readable
+    assert explorer.readable_ranges() == [(4, 4), (65, 1), (512, 22), (1024, 32), (3502, 1)]
+    assert explorer.transactions - first_sweep == 5
+    # Sparse space, every unreadable register needs its own rejected read
+    assert first_sweep < 1.1 * 4000
+    assert [register for register, activity in explorer.activity.items() if activity.change_rate > 0] == [65]
+
+    explorer.save(str(tmp_path / "registers.json"))
+    assert "65-65 (1 registers), live: 65" in explorer.report()
+
+
+def test_explorer_dense_space_takes_few_reads():
+    holes = {40, 41, 300, 1530, 2222}
+    slave = MemoryTransport({register: 0 for register in range(4000) if register not in holes})
+    explorer = RegisterExplorer(EnbioWiFiMachine(transport=slave))
+
+    explorer.sweep(0, 4000)
+
+    assert len(explorer.activity) == 4000 - len(holes)
+    assert explorer.transactions < 200
@@ -0,0 +1,51 @@
+import csv
+import time
+from enbio_wifi_machine.fleet import FleetRecorder
+from enbio_wifi_machine.machine import EnbioWiFiMachine
+from conftest import IdleMachine
+
+
+class StalledMachine(IdleMachine):
+    """ Unit answering far slower than polling interval """
+
+    def read_registers(self, registeraddress: int, number_of_registers: int) -> list[int]:
+        time.sleep(0.2)
+        return super().read_registers(registeraddress, number_of_registers)
+
+
+def test_fleet_stalled_unit_does_not_delay_others(tmp_path):
+    machines = {
+        "fast1": EnbioWiFiMachine(transport=IdleMachine()),
+        "fast2": EnbioWiFiMachine(transport=IdleMachine()),
+        "stalled": EnbioWiFiMachine(transport=StalledMachine()),
+    }
+    fleet = FleetRecorder(machines, interval=0.05, dirname=str(tmp_path))
+
+    fleet.run(duration=0.6, health_interval=0.3)
+
+    for name in ("fast1", "fast2"):
+        assert fleet.health[name].samples >= 8
+        assert fleet.health[name].errors == 0
+    assert fleet.health["stalled"].samples < fleet.health["fast1"].samples
+    assert fleet.health["stalled"].skipped > 0
+
+    for name, recorder in fleet.recorders.items():
+        with open(recorder.filepath, newline='') as f:
+            rows = list(csv.reader(f))
+        assert len(rows) - 1 == fleet.health[name].samples - fleet.health[name].dropped
+
+
+class SmallQueueFleet(FleetRecorder):
+    queue_size = 2
+
+
+def test_fleet_drops_oldest_samples_when_writing_lags(tmp_path):
+    fleet = SmallQueueFleet({"unit": EnbioWiFiMachine(transport=IdleMachine())}, interval=0.01, dirname=str(tmp_path))
+    fleet.start()
+    fleet.recorders["unit"].write = lambda proctime, pline: time.sleep(0.05)
+
+    time.sleep(0.3)
+    fleet.stop()
+
+    assert fleet.health["unit"].dropped > 0
+    assert fleet.health["unit"].samples > 10
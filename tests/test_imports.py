@@ -0,0 +1,27 @@
+import os
+import re
+import subprocess
+import sys
+
+heavy_modules = ["matplotlib", "pandas", "numpy"]
+cli_import_budget_sec = 0.3
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_cli_does_not_import_heavy_modules():
+    code = ("import sys, enbio_wifi_machine.cli; "
+            f"print([name for name in {heavy_modules!r} if name in sys.modules])")
+    output = subprocess.run([sys.executable, "-c", code],
+                            capture_output=True, text=True, check=True, cwd=repo_dir).stdout
+
+    assert output.strip() == "[]"
+
+
+def test_cli_import_time_budget():
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import enbio_wifi_machine.cli"],
+                            capture_output=True, text=True, check=True, cwd=repo_dir).stderr
+
+    # Line format: "import time: self [us] | cumulative | imported package"
+    cumulative_us = [int(match) for match in re.findall(r"\|\s*(\d+)\s*\|\s*enbio_wifi_machine\.cli$", stderr, re.M)]
+    assert cumulative_us, stderr
+    assert cumulative_us[0] / 1e6 < cli_import_budget_sec
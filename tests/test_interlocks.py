@@ -0,0 +1,53 @@
+import pandas as pd
+from conftest import make_process_line
+from enbio_wifi_machine.interlocks import RuleEngine, RuleEventKind
+from enbio_wifi_machine.recording import MeasurementRecorder, measurement_filepath
+
+
+def cycle_samples():
+    """ Ramp with temperature jump, pressure spike and heater overlap, one second interval """
+    samples = []
+    for proctime in range(20):
+        t_proc = 100.0 + proctime + (20.0 if proctime >= 10 else 0.0)
+        pline = make_process_line(1, t_proc, 3.8 if proctime == 5 else 2.0)
+        pline.do_state.ch_heaters = 12 <= proctime < 15
+        pline.do_state.sg_heater_single = proctime >= 13
+        samples.append((float(proctime), pline))
+    return samples
+
+
+def test_rule_engine_raises_and_clears_online():
+    received = []
+    engine = RuleEngine(on_event=received.append)
+    events = [event for proctime, pline in cycle_samples() for event in engine.check(proctime, pline)]
+
+    assert [(event.rule, event.kind, event.time) for event in events] == [
+        ("p_proc_max", RuleEventKind.RAISED, 5.0),
+        ("p_proc_max", RuleEventKind.CLEARED, 6.0),
+        ("t_proc_rate", RuleEventKind.RAISED, 10.0),
+        ("t_proc_rate", RuleEventKind.CLEARED, 11.0),
+        ("heater_overlap", RuleEventKind.RAISED, 13.0),
+        ("heater_overlap", RuleEventKind.CLEARED, 15.0),
+    ]
+    assert received == events
+    assert not engine.active
+
+
+def test_offline_evaluation_matches_online(tmp_path):
+    filepath = measurement_filepath(str(tmp_path), "121", 1.0, "A")
+    with MeasurementRecorder(filepath) as recorder:
+        for proctime, pline in cycle_samples():
+            recorder.write(proctime, pline)
+            if proctime == 16:
+                recorder.write_gap(16.5)
+
+    events = RuleEngine().evaluate_file(filepath)
+    assert [(event.rule, event.kind, event.time) for event in events] == [
+        ("p_proc_max", RuleEventKind.RAISED, 5.0),
+        ("p_proc_max", RuleEventKind.CLEARED, 6.0),
+        ("t_proc_rate", RuleEventKind.RAISED, 10.0),
+        ("t_proc_rate", RuleEventKind.CLEARED, 11.0),
+        ("heater_overlap", RuleEventKind.RAISED, 13.0),
+        ("heater_overlap", RuleEventKind.CLEARED, 15.0),
+    ]
+    assert RuleEngine().evaluate_recording(pd.read_csv(filepath).iloc[:14])[-1].kind == RuleEventKind.RAISED
@@ -0,0 +1,254 @@
+import csv
+import glob
+import threading
+import time
+import serial
+from enbio_wifi_machine.machine import EnbioWiFiMachine
+from enbio_wifi_machine.modbus_registers import ModbusRegister
+from enbio_wifi_machine.lifecycle import ProcessLifecycle, ProcessState, ProcessEventKind
+from enbio_wifi_machine.common import ProcessType, ScreenId, await_condition
+from conftest import MemoryTransport, IdleMachine
+
+
+class DoorSimulator(MemoryTransport):
+    """ Lock switch changes after coil was driven for given number of switch polls """
+
+    def __init__(self, polls_to_switch: int = 3):
+        super().__init__({ModbusRegister.COIL_CONTROL.value: 0, ModbusRegister.DOOR_UNLOCKED.value: 1})
+        self.polls_to_switch = polls_to_switch
+        self.driven_polls = 0
+
+    def read_registers(self, registeraddress: int, number_of_registers: int) -> list[int]:
+        coil = self.registers[ModbusRegister.COIL_CONTROL.value]
+        if registeraddress == ModbusRegister.DOOR_UNLOCKED.value and coil != 0:
+            self.driven_polls += 1
+            if self.driven_polls >= self.polls_to_switch:
+                self.registers[registeraddress] = 1 if coil == 1 else 0
+                self.driven_polls = 0
+        return super().read_registers(registeraddress, number_of_registers)
+
+
+def test_door_lock_uses_minimal_frames():
+    door = DoorSimulator(polls_to_switch=3)
+    machine = EnbioWiFiMachine(transport=door)
+
+    report = machine.door_lock_with_feedback(timeout=1.0)
+
+    # Start write, 3 switch polls, stop write, feedback read
+    assert door.transactions == 6
+    assert report.polls == 3
+    assert report.action == "lock"
+    assert 0 <= report.stop_latency <= report.overshoot_bound <= report.duration
+    assert door.registers[ModbusRegister.COIL_CONTROL.value] == 0
+    assert not machine.is_door_unlocked()
+
+
+def test_door_overshoot_report():
+    machine = EnbioWiFiMachine(transport=DoorSimulator(polls_to_switch=2))
+
+    report = machine.door_overshoot_report(cycles=5)
+
+    assert report.stop_latency["lock"].count == 5
+    assert report.stop_latency["unlock"].count == 5
+    assert len(machine.door_drive_reports) == 10
+
+
+class ProcessSimulator(MemoryTransport):
+    """ Starts process on start flag write, stops it on interrupt write """
+
+    def __init__(self, stops_on_interrupt: bool = True):
+        self.stops_on_interrupt = stops_on_interrupt
+        super().__init__({
+            ModbusRegister.PROC_STATUS.value: 0,
+            ModbusRegister.PROC_PHASE.value: 0,
+            ModbusRegister.PROC_SECONDS.value: 0,
+            ModbusRegister.PROC_SELECT_START.value: 0,
+            ModbusRegister.CHANGE_SCREEN.value: 0,
+        })
+
+    def write_registers(self, registeraddress: int, values: list[int]) -> None:
+        super().write_registers(registeraddress, values)
+        if registeraddress == ModbusRegister.PROC_SELECT_START.value:
+            if values[0] == 1:
+                self.registers[ModbusRegister.PROC_STATUS.value] = 1
+                self.registers[ModbusRegister.PROC_PHASE.value] = 1
+                self.registers[registeraddress] = 0
+            elif values[0] == 0xFFFF and self.stops_on_interrupt:
+                self.registers[ModbusRegister.PROC_STATUS.value] = 2
+                self.registers[registeraddress] = 0
+
+
+def test_lifecycle_events():
+    lifecycle = ProcessLifecycle(machine=None)
+    kinds = []
+    lifecycle.add_listener(lambda event: kinds.append(event.kind))
+
+    for status, phase in [(0, 0), (1, 0), (1, 1), (1, 1), (1, 12), (2, 12)]:
+        lifecycle.update(ProcessState(status, phase, 0, ProcessType.P134))
+
+    assert kinds == [ProcessEventKind.START, ProcessEventKind.PHASE_CHANGE, ProcessEventKind.PHASE_CHANGE,
+                     ProcessEventKind.FINISH]
+
+    lifecycle.update(ProcessState(1, 0, 0, ProcessType.TVAC))
+    lifecycle.update(ProcessState(1, 3, 0, ProcessType.TVAC))
+    events = lifecycle.update(ProcessState(0, 3, 0, None))
+    assert events[0].kind == ProcessEventKind.ABORT
+    assert events[0].previous_phase == 3
+
+
+def test_concurrent_lifecycle_polls_see_start_once():
+    transport = ProcessSimulator()
+    machine = EnbioWiFiMachine(transport=transport)
+    kinds = []
+    machine.lifecycle.add_listener(lambda event: kinds.append(event.kind))
+    read_state, reads = machine.lifecycle.read_state, []
+
+    def late_read_state():
+        # Process starts after 4th read, which is applied late, so newer polls overlap it
+        state = read_state()
+        reads.append(state)
+        if len(reads) == 4:
+            transport.registers[ModbusRegister.PROC_STATUS.value] = 1
+            time.sleep(0.05)
+        return state
+
+    machine.lifecycle.read_state = late_read_state
+
+    def poll():
+        for _ in range(10):
+            machine.lifecycle.poll()
+
+    threads = [threading.Thread(target=poll) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert kinds == [ProcessEventKind.START]
+
+
+def test_start_and_interrupt_process_without_fixed_sleeps():
+    machine = EnbioWiFiMachine(transport=ProcessSimulator())
+    kinds = []
+    machine.lifecycle.add_listener(lambda event: kinds.append(event.kind))
+
+    start = time.perf_counter()
+    machine.start_process(ProcessType.P121)
+    machine.interrupt_process(summary_time=0.0)
+
+    assert time.perf_counter() - start < 1.0
+    assert kinds == [ProcessEventKind.START, ProcessEventKind.ABORT]
+
+
+def test_slow_interrupt_warns_and_returns_to_main_screen(capsys):
+    simulator = ProcessSimulator(stops_on_interrupt=False)
+    machine = EnbioWiFiMachine(transport=simulator)
+    machine.start_process(ProcessType.P121)
+
+    machine.interrupt_process(timeout=0.2, summary_time=0.0)
+
+    assert "not stopped" in capsys.readouterr().out
+    assert simulator.registers[ModbusRegister.CHANGE_SCREEN.value] == ScreenId.MAIN.value
+
+
+def test_await_condition_backoff_and_deadline():
+    calls = []
+    result = await_condition(lambda: calls.append(1) or len(calls), lambda value: value >= 4, timeout=1.0)
+    assert result.success and result.value == 4 and result.polls == 4
+    assert result.elapsed < 0.1
+
+    result = await_condition(lambda: 0, lambda value: value == 1, timeout=0.2)
+    assert not result
+    assert 0.2 <= result.elapsed < 0.4
+    assert result.polls < 15
+
+
+def test_await_registers_single_block_read():
+    transport = MemoryTransport({address: 0 for address in range(3500, 3503)})
+    transport.registers[ModbusRegister.PROC_STATUS.value] = 1
+    transport.registers[ModbusRegister.PROC_SECONDS.value] = 42
+    machine = EnbioWiFiMachine(transport=transport)
+
+    result = machine.await_registers({
+        ModbusRegister.PROC_STATUS.value: 1,
+        ModbusRegister.PROC_SECONDS.value: lambda seconds: seconds > 40,
+    }, timeout=1.0)
+
+    assert result.success
+    assert result.value[ModbusRegister.PROC_SECONDS.value] == 42
+    assert transport.transactions == 1
+
+
+def test_ctrl_register_feedback_returns_on_acknowledge():
+    class SaveSimulator(MemoryTransport):
+        def read_registers(self, registeraddress, number_of_registers):
+            self.registers[ModbusRegister.SAVE_ALL.value] = 0
+            return super().read_registers(registeraddress, number_of_registers)
+
+    machine = EnbioWiFiMachine(transport=SaveSimulator())
+
+    start = time.perf_counter()
+    machine.save_all()
+
+    assert time.perf_counter() - start < 0.05
+
+
+class UnpluggedCycleMachine(IdleMachine):
+    """ P121 cycle finishing after given number of status polls, USB cable is pulled at one of them """
+
+    def __init__(self, polls_to_finish: int = 8, unplug_at_poll: int = 3):
+        super().__init__()
+        self.polls_to_finish = polls_to_finish
+        self.unplug_at_poll = unplug_at_poll
+        self.status_polls = 0
+        self.plugged = True
+
+    def read_registers(self, registeraddress: int, number_of_registers: int) -> list[int]:
+        if not self.plugged:
+            raise serial.SerialException("device reports readiness to read but returned no data")
+
+        if registeraddress == ModbusRegister.PROC_STATUS.value and self.registers[registeraddress] == 1:
+            self.status_polls += 1
+            if self.status_polls == self.unplug_at_poll:
+                self.plugged = False
+            if self.status_polls >= self.polls_to_finish - 1:
+                self.registers[ModbusRegister.PROC_PHASE.value] = 12
+            if self.status_polls >= self.polls_to_finish:
+                self.registers[registeraddress] = 0
+        return super().read_registers(registeraddress, number_of_registers)
+
+    def write_registers(self, registeraddress: int, values: list[int]) -> None:
+        super().write_registers(registeraddress, values)
+        if registeraddress == ModbusRegister.PROC_SELECT_START.value and values[0] == 1:
+            self.registers[ModbusRegister.PROC_STATUS.value] = 1
+            self.registers[ModbusRegister.PROC_PHASE.value] = 1
+            self.registers[ModbusRegister.PROC_DO_STATE.value] = 3 << 12
+            self.registers[registeraddress] = 0
+
+
+def test_runmonitor_resumes_recording_after_port_loss(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    device = UnpluggedCycleMachine()
+    machine = EnbioWiFiMachine(transport=device)
+    discovery_attempts = []
+
+    def find_device_transport(device_id):
+        # Device shows up again on the third port scan
+        discovery_attempts.append(device_id)
+        if len(discovery_attempts) < 3:
+            return None
+        device.plugged = True
+        return device
+
+    machine._find_device_transport = find_device_transport
+    machine.runmonitor("121", interval=0.01)
+
+    with open(glob.glob("measurements/*.csv")[0], newline='') as f:
+        rows = list(csv.reader(f))[1:]
+    times = [float(row[0]) for row in rows]
+    gaps = [row for row in rows if row[1] == ""]
+
+    assert len(discovery_attempts) == 3
+    assert len(gaps) == 1
+    assert times == sorted(times)
+    assert len(rows) == device.polls_to_finish
@@ -0,0 +1,61 @@
+import json
+import os
+from enbio_wifi_machine.common import ScaleFactors
+from enbio_wifi_machine.machine import EnbioWiFiMachine
+from enbio_wifi_machine.modbus_registers import ModbusRegister
+from enbio_wifi_machine.provisioning import load_provisioning_file, provision_many
+from conftest import ProvisionedMachine
+
+SCALES_FILE = os.path.join(os.path.dirname(__file__), "..", "common_scales", "MK_60966.json")
+
+
+def write_spec(tmp_path) -> str:
+    spec_path = tmp_path / "station.json"
+    spec_path.write_text(json.dumps({
+        "defaults": {"target": "eu", "scales": "scales.json", "date_time": "2026-03-01T12:30:00"},
+        "units": {
+            "unit1": {"device_id": "STW02-XX-24-00001", "boardnumber": "E.24.06"},
+            "unit2": {"device_id": "STW02-XX-24-00002", "boardnumber": "E.24.07", "target": "us"},
+        },
+    }))
+    with open(SCALES_FILE) as f:
+        (tmp_path / "scales.json").write_text(f.read())
+    return str(spec_path)
+
+
+def test_provisioning_spec_file_defaults(tmp_path):
+    specs = load_provisioning_file(write_spec(tmp_path))
+
+    assert specs["unit1"].target == "eu"
+    assert specs["unit2"].target == "us"
+    assert specs["unit2"].boardnumber_fields() == ("E", 24, 7)
+    assert specs["unit1"].scales == str(tmp_path / "scales.json")
+
+
+def test_provision_many_units(tmp_path):
+    specs = load_provisioning_file(write_spec(tmp_path))
+    slaves = {unit: ProvisionedMachine() for unit in specs}
+    units = {unit: (EnbioWiFiMachine(transport=slaves[unit]), spec) for unit, spec in specs.items()}
+
+    reports = provision_many(units)
+
+    assert [report.unit for report in reports] == ["unit1", "unit2"]
+    assert all(report.success for report in reports), [str(report) for report in reports]
+    assert all(report.transactions <= 16 for report in reports)
+    assert list(reports[0].steps) == ["reset", "device_id", "boardnumber", "scales", "datetime", "save", "verify"]
+
+    machine = units["unit2"][0]
+    assert machine.get_device_id() == "STW02-XX-24-00002"
+    with open(SCALES_FILE) as f:
+        assert machine.get_scale_factors().equals(ScaleFactors.from_json(f.read()))
+    assert slaves["unit2"].registers[ModbusRegister.USE_DEFAULT_MODBUS_PARAMS.value] == 2
+
+
+def test_provisioning_reports_read_back_mismatch(tmp_path):
+    specs = load_provisioning_file(write_spec(tmp_path))
+    slave = ProvisionedMachine(ignored_registers=(ModbusRegister.BOARD_NUM.value,))
+
+    report, = provision_many({"unit1": (EnbioWiFiMachine(transport=slave), specs["unit1"])})
+
+    assert not report.success
+    assert report.mismatches == ["board number A.00.00 != E.24.06"]
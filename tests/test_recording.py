@@ -0,0 +1,171 @@
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from conftest import make_process_line, IdleMachine
+from enbio_wifi_machine.extractor import extract_phase, extract_phase_across_runs, read_phase_index, \
+    find_measurements, extract_many
+from enbio_wifi_machine.follow import RecordingFollower
+from enbio_wifi_machine.machine import EnbioWiFiMachine
+from enbio_wifi_machine.recording import MeasurementRecorder, measurement_filepath, SegmentedRecorder, \
+    RetentionPolicy, SEGMENT_INDEX_FILENAME
+from enbio_wifi_machine.sinks import JsonLinesSink, SinkGroup
+
+
+def record_run(dirname: str, identifier: str, phases: list[int | None]) -> str:
+    filepath = measurement_filepath(dirname, "121", 1.0, identifier)
+    with MeasurementRecorder(filepath) as recorder:
+        for proctime, phase in enumerate(phases):
+            if phase is None:
+                recorder.write_gap(proctime)
+            else:
+                recorder.write(proctime, make_process_line(phase, 100.0 + proctime, 1.0))
+    return filepath
+
+
+def test_phase_index_slices_phase_of_run(tmp_path):
+    filepath = record_run(str(tmp_path), "A", [1, 1, 2, None, 2, 2, 5, 1])
+
+    assert "_fmt_v2_" in os.path.basename(filepath)
+    segments = read_phase_index(filepath)
+    assert [(segment.phase, segment.start_row, segment.end_row) for segment in segments] == \
+           [(1, 0, 2), (2, 2, 6), (5, 6, 7), (1, 7, 8)]
+
+    sterilization = extract_phase(filepath, 2)
+    assert list(sterilization["Time (sec)"]) == [2, 3, 4, 5]
+    assert list(extract_phase(filepath, 1)["Time (sec)"]) == [0, 1, 7]
+
+    # Without index whole file is read and filtered by Phase column, gap rows have no phase
+    os.remove(filepath.replace(".csv", ".phases.json"))
+    assert list(extract_phase(filepath, 2)["Time (sec)"]) == [2, 4, 5]
+
+
+def test_extract_phase_across_runs(tmp_path):
+    record_run(str(tmp_path), "A", [1, 5, 5, 12])
+    record_run(str(tmp_path), "B", [1, 12])
+    with open(tmp_path / "meas_121_int_1000_id_C_fmt_v1_2024-11-25_16-22-41.csv", "w") as f:
+        f.write("Time (sec),ProcPress (bar)\n0,1.0\n")
+
+    runs = extract_phase_across_runs(5, str(tmp_path))
+    assert len(runs) == 1
+    assert len(next(iter(runs.values()))) == 2
+
+
+def test_extract_many_skips_unchanged_recordings(tmp_path):
+    first = record_run(str(tmp_path / "measurements"), "A", [1, 1, 5, 5, 12])
+    record_run(str(tmp_path / "measurements"), "B", [1, 5, 12])
+    extraction_dir = str(tmp_path / "extractions")
+    sources = find_measurements([str(tmp_path / "measurements")])
+
+    summary = extract_many(sources, extraction_dir, ("png", "svg"), max_workers=2)
+    assert len(summary.extracted) == 2 and not summary.failed
+    assert len(os.listdir(extraction_dir)) == 2 * 3 + 1
+
+    with open(first, "a") as f:
+        f.write("5,1.0,1.0,100,100,100,25,3" + ",False" * 9 + ",0,0,0,0,12\n")
+    summary = extract_many(sources, extraction_dir, ("png", "svg"), max_workers=2)
+    assert summary.extracted == [first]
+    assert len(summary.skipped) == 1
+
+    # Same named copy in other directory gets own outputs, forced run keeps manifest entries of other sources
+    os.makedirs(tmp_path / "copy")
+    copy = str(tmp_path / "copy" / os.path.basename(first))
+    shutil.copy(first, copy)
+    summary = extract_many([copy], extraction_dir, ("png",), max_workers=1, force=True)
+    assert summary.extracted == [copy]
+    assert len(os.listdir(extraction_dir)) == 2 * 3 + 2 + 1
+    with open(os.path.join(extraction_dir, "manifest.json")) as f:
+        assert len(json.load(f)["sources"]) == 3
+
+
+def test_follower_reads_only_appended_complete_rows(tmp_path):
+    filepath = measurement_filepath(str(tmp_path), "121", 1.0, "A")
+    recorder = MeasurementRecorder(filepath)
+    follower = RecordingFollower(filepath)
+    assert follower.poll().empty
+
+    for proctime in range(3):
+        recorder.write(proctime, make_process_line(1, 100.0 + proctime, 1.0))
+    assert list(follower.poll()["ProcTempr *C"]) == [100.0, 101.0, 102.0]
+    assert follower.poll().empty
+
+    # Row being written is not returned until its newline arrives
+    recorder.write_gap(3)
+    recorder._file.write("4,1.0,1.0,104")
+    recorder._file.flush()
+    chunk = follower.poll_array()
+    assert chunk.shape == (1, len(follower.columns)) and chunk[0, 0] == 3 and np.isnan(chunk[0, 1])
+
+    recorder._file.write(",104,104,25,3" + ",True" * 9 + ",0,0,0,0,5\n")
+    recorder.close()
+    chunk = follower.poll_array()
+    assert chunk[0, 0] == 4 and chunk[0, -1] == 5 and chunk[0, 8] == 1.0
+    assert follower.rows == 5
+
+    late = RecordingFollower(filepath, from_start=False)
+    assert late.poll().empty and late.rows == 5
+    follower.close()
+    late.close()
+
+
+def test_segmented_recorder_rotates_compresses_and_deletes(tmp_path):
+    dirname = str(tmp_path / "continuous")
+    retention = RetentionPolicy(max_segments=4, compress_after=2)
+    with SegmentedRecorder(dirname, 1.0, segment_size=1000, retention=retention) as recorder:
+        for proctime in range(200):
+            recorder.write(proctime, make_process_line(0, 25.0, 1.0))
+        assert recorder.sequence > 6
+
+    with open(os.path.join(dirname, SEGMENT_INDEX_FILENAME)) as f:
+        index = json.load(f)
+    segments = index["segments"]
+    assert len(segments) == 4
+    assert [segment["compressed"] for segment in segments] == [True, True, False, False]
+    # Phase index sidecars of compressed segments are removed with plain files
+    expected_files = [SEGMENT_INDEX_FILENAME] + [segment["filename"] for segment in segments] \
+        + [segment["filename"].replace(".csv", ".phases.json") for segment in segments[2:]]
+    assert sorted(os.listdir(dirname)) == sorted(expected_files)
+    assert sum(segment["rows"] for segment in segments) < 200
+    assert pd.read_csv(os.path.join(dirname, segments[0]["filename"]))["Phase"].eq(0).all()
+
+    # Restarted recording continues sequence of index
+    with SegmentedRecorder(dirname, 1.0, retention=retention) as recorder:
+        recorder.write(0, make_process_line(0, 25.0, 1.0))
+    with open(os.path.join(dirname, SEGMENT_INDEX_FILENAME)) as f:
+        assert json.load(f)["sequence"] == index["sequence"] + 1
+
+
+def test_segmented_recorder_recovers_segment_of_crashed_recording(tmp_path):
+    dirname = str(tmp_path / "continuous")
+    with SegmentedRecorder(dirname, 1.0, segment_size=1000) as recorder:
+        for proctime in range(30):
+            recorder.write(proctime, make_process_line(0, 25.0, 1.0))
+    indexed = len(recorder.segments)
+
+    # Killed recording leaves open segment that never reached index
+    crashed = SegmentedRecorder(dirname, 1.0)
+    for proctime in range(5):
+        crashed.write(proctime, make_process_line(0, 25.0, 1.0))
+    crashed._recorder._file.close()
+
+    restarted = SegmentedRecorder(dirname, 1.0, retention=RetentionPolicy(max_segments=100, compress_after=None))
+    assert len(restarted.segments) == indexed + 1
+    assert restarted.segments[-1].filename == crashed._segment.filename
+    assert restarted.segments[-1].rows == 5 and restarted.segments[-1].size > 0
+    assert restarted.sequence == crashed.sequence
+    with open(os.path.join(dirname, SEGMENT_INDEX_FILENAME)) as f:
+        assert crashed._segment.filename in [segment["filename"] for segment in json.load(f)["segments"]]
+
+
+def test_machine_records_standby_without_process(tmp_path):
+    machine = EnbioWiFiMachine(transport=IdleMachine())
+    recorder = SegmentedRecorder(str(tmp_path), 0.01, segment_duration=0.05)
+    sink = JsonLinesSink(str(tmp_path / "samples.jsonl"), batch_size=1000)
+    machine.record(recorder, interval=0.01, duration=0.2, sinks=SinkGroup([sink]))
+
+    rows = sum(segment.rows for segment in recorder.segments)
+    assert len(recorder.segments) >= 2
+    assert rows >= 10
+    # Sinks are flushed when recording ends
+    assert sink.written == rows
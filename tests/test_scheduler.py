@@ -0,0 +1,123 @@
+import threading
+import time
+from enbio_wifi_machine.bus import ModbusBus
+from enbio_wifi_machine.scheduler import TransactionScheduler, ScheduledTransport, Lane, use_lane
+from enbio_wifi_machine.machine import EnbioWiFiMachine
+from enbio_wifi_machine.modbus_registers import ModbusRegister
+from conftest import MemoryTransport
+
+
+def queue_waiters(scheduler: TransactionScheduler, keys: list, granted: list,
+                  lane: Lane = Lane.CONTROL) -> list[threading.Thread]:
+    """ Start one waiting thread per key, returns when all of them wait for the link """
+    def waiter(key):
+        with scheduler.slot(key, lane):
+            granted.append((lane, key) if lane != Lane.CONTROL else key)
+
+    already_waiting = scheduler.waiting_count()
+    threads = []
+    for key in keys:
+        thread = threading.Thread(target=waiter, args=(key,))
+        thread.start()
+        threads.append(thread)
+
+        while scheduler.waiting_count() < already_waiting + len(threads):
+            time.sleep(0.001)
+
+    return threads
+
+
+def test_scheduler_weighted_round_robin():
+    scheduler = TransactionScheduler(weights={1: 2})
+    granted = []
+
+    scheduler.acquire("hold")
+    threads = queue_waiters(scheduler, [1, 1, 1, 1, 2, 2, 3], granted)
+    scheduler.release()
+    for thread in threads:
+        thread.join()
+
+    assert granted == [1, 1, 2, 3, 1, 1, 2]
+
+
+def test_scheduler_max_rate():
+    scheduler = TransactionScheduler(max_rate=100)
+
+    start = time.perf_counter()
+    for _ in range(11):
+        with scheduler.slot(1):
+            pass
+
+    assert time.perf_counter() - start >= 0.1
+
+
+def test_scheduled_transports_share_link():
+    scheduler = TransactionScheduler()
+    slaves = [ScheduledTransport(MemoryTransport({0: address}), scheduler, address) for address in range(4)]
+
+    def poll(transport):
+        for _ in range(50):
+            assert transport.read_register(0) == transport.key
+
+    threads = [threading.Thread(target=poll, args=(slave,)) for slave in slaves]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(slave.inner.transactions == 50 for slave in slaves)
+
+
+class MemoryBus(ModbusBus):
+    def _create_transport(self, address: int):
+        return MemoryTransport()
+
+
+def test_bus_machines_keep_slave_address():
+    bus = MemoryBus("COM_BUS")
+    machines = bus.machines([1, 2, 5])
+
+    assert [machine.address for machine in machines.values()] == [1, 2, 5]
+    assert all(machine.scheduler is bus.scheduler for machine in machines.values())
+
+
+def test_scheduler_safety_lane_preempts_monitoring():
+    scheduler = TransactionScheduler()
+    granted = []
+
+    scheduler.acquire("hold")
+    threads = queue_waiters(scheduler, [1, 2, 3], granted, Lane.MONITOR)
+    threads += queue_waiters(scheduler, [1], granted, Lane.SAFETY)
+    scheduler.release()
+    for thread in threads:
+        thread.join()
+
+    assert granted[0] == (Lane.SAFETY, 1)
+
+    stats = scheduler.lane_stats()
+    assert stats[Lane.MONITOR].transactions == 3
+    assert stats[Lane.SAFETY].transactions == 1
+    assert stats[Lane.MONITOR].max_wait >= stats[Lane.SAFETY].max_wait
+
+
+def test_scheduled_transport_uses_thread_lane():
+    scheduler = TransactionScheduler()
+    transport = ScheduledTransport(MemoryTransport({0: 1}), scheduler, 1)
+
+    with use_lane(Lane.SAFETY):
+        transport.read_register(0)
+    transport.read_register(0)
+
+    stats = scheduler.lane_stats()
+    assert stats[Lane.SAFETY].transactions == 1
+    assert stats[Lane.CONTROL].transactions == 1
+
+
+def test_machine_safety_writes_use_safety_lane():
+    machine = EnbioWiFiMachine(transport=MemoryTransport({ModbusRegister.COIL_CONTROL.value: 2}))
+
+    machine.door_drv_none()
+
+    stats = machine.lane_stats()
+    assert stats[Lane.SAFETY].transactions == 2
+    assert stats[Lane.CONTROL].transactions == 0
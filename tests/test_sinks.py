@@ -0,0 +1,83 @@
+import csv
+import json
+import socket
+import sqlite3
+import time
+from conftest import make_process_line
+from enbio_wifi_machine.sinks import SampleSink, SinkGroup, create_sink, sample_record, UdpLineProtocolSink
+
+
+class ListSink(SampleSink):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.batches = []
+
+    def write_batch(self, records):
+        self.batches.append(records)
+
+
+def test_sink_writes_batches_by_size_interval_and_close():
+    sink = ListSink(batch_size=3, flush_interval=0.05)
+    for proctime in range(7):
+        sink.publish(sample_record(proctime, make_process_line(1, 100.0, 1.0)))
+    assert [len(batch) for batch in sink.batches] == [3, 3]
+
+    time.sleep(0.06)
+    sink.publish(sample_record(7, make_process_line(1, 100.0, 1.0)))
+    assert [len(batch) for batch in sink.batches] == [3, 3, 2]
+    sink.publish(sample_record(8, make_process_line(1, 100.0, 1.0)))
+    sink.close()
+    assert [len(batch) for batch in sink.batches] == [3, 3, 2, 1]
+    assert sink.written == 9
+
+
+class LockedDatabaseSink(SampleSink):
+    def write_batch(self, records):
+        raise sqlite3.OperationalError("database is locked")
+
+
+def test_failing_sink_does_not_stop_other_sinks(capsys):
+    failing, working = LockedDatabaseSink(batch_size=2), ListSink(batch_size=2)
+    sinks = SinkGroup([failing, working])
+    for proctime in range(5):
+        sinks.publish(proctime, make_process_line(1, 100.0, 1.0))
+    sinks.close()
+
+    assert (failing.written, failing.dropped) == (0, 5)
+    assert working.written == 5
+    assert "database is locked" in capsys.readouterr().out
+
+
+def test_file_sinks_from_specs(tmp_path):
+    specs = [f"jsonl:{tmp_path / 'samples.jsonl'}?batch=4", f"csv:{tmp_path / 'samples.csv'}",
+             f"sqlite:{tmp_path / 'samples.db'}?batch=5&flush=60"]
+    sinks = SinkGroup([create_sink(spec) for spec in specs])
+    assert (sinks.sinks[0].batch_size, sinks.sinks[2].batch_size, sinks.sinks[2].flush_interval) == (4, 5, 60.0)
+    for proctime in range(10):
+        sinks.publish(proctime, make_process_line(5, 121.0 + proctime, 2.1))
+    sinks.close()
+
+    with open(tmp_path / "samples.jsonl") as f:
+        records = [json.loads(line) for line in f]
+    assert [record["ProcTempr *C"] for record in records] == [121.0 + proctime for proctime in range(10)]
+    with open(tmp_path / "samples.csv", newline="") as f:
+        assert len(list(csv.DictReader(f))) == 10
+    with sqlite3.connect(tmp_path / "samples.db") as connection:
+        assert connection.execute('SELECT COUNT(*), MAX("Phase") FROM samples').fetchone() == (10, 5)
+
+
+def test_udp_line_protocol_sink_packs_batch():
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    receiver.settimeout(1.0)
+    sink = UdpLineProtocolSink("127.0.0.1", receiver.getsockname()[1], tags={"device": "PA 1"}, batch_size=3)
+    for proctime in range(3):
+        sink.publish(sample_record(proctime, make_process_line(1, 100.0, 1.0), timestamp=1700000000.0 + proctime))
+
+    lines = receiver.recv(65536).decode().splitlines()
+    sink.close()
+    receiver.close()
+    assert len(lines) == 3
+    assert lines[0].startswith("enbio,device=PA\\ 1 Time\\ (sec)=0i,ProcPress\\ (bar)=1.0,")
+    assert "ChHeat=false" in lines[0] and "Phase=1i" in lines[0]
+    assert lines[2].endswith(" 1700000002000000000")
@@ -0,0 +1,132 @@
+import socket
+import minimalmodbus
+import pytest
+import serial
+from enbio_wifi_machine.machine import EnbioWiFiMachine
+from enbio_wifi_machine.modbus_registers import ModbusRegister
+from enbio_wifi_machine.scheduler import TransactionScheduler, ScheduledTransport, Lane
+from enbio_wifi_machine.transport import TcpTransport, ModbusTcpConnection, plan_block_reads, is_link_lost, \
+    SerialTransport, ModbusTransport
+
+
+def test_tcp_read_write_roundtrip(tcp_standin):
+    transport = TcpTransport("127.0.0.1", tcp_standin.port, unit=1)
+    transport.write_registers(100, [1, 2, 3])
+
+    assert transport.read_registers(100, 3) == [1, 2, 3]
+    assert transport.read_register(101) == 2
+    transport.close()
+
+
+def test_tcp_illegal_address_raises(tcp_standin):
+    transport = TcpTransport("127.0.0.1", tcp_standin.port, unit=1)
+
+    with pytest.raises(minimalmodbus.IllegalRequestError):
+        transport.read_registers(4000, 2)
+    transport.close()
+
+
+def test_tcp_multiple_outstanding_transactions(tcp_standin):
+    tcp_standin.reorder_batch = 8
+    tcp_standin.slaves[1].registers.update({address: address * 3 for address in range(8)})
+    tcp_standin.slaves[2].registers.update({address: address * 5 for address in range(8)})
+
+    connection = ModbusTcpConnection("127.0.0.1", tcp_standin.port)
+    units = [TcpTransport(unit=1, connection=connection), TcpTransport(unit=2, connection=connection)]
+
+    # Gateway answers only after all 8 requests arrived, in reverse order
+    futures = [(unit, address, unit.read_registers_async(address, 1)) for address in range(4) for unit in units]
+    for unit, address, future in futures:
+        assert future.result(timeout=2) == [address * (3 if unit.unit == 1 else 5)]
+
+    assert tcp_standin.max_seen_in_flight == 8
+    connection.close()
+
+
+def test_machine_over_tcp(tcp_standin):
+    tcp_standin.slaves[2].registers[ModbusRegister.FIRMWARE_VERSION.value] = (7 << 9) | (5 << 4) | 4
+    machine = EnbioWiFiMachine.over_tcp("127.0.0.1", tcp_standin.port, address=2)
+    assert machine.address == 2
+
+    machine.set_device_id("STW02-XX-24-99999")
+
+    assert machine.get_device_id() == "STW02-XX-24-99999"
+    assert machine.get_firmware_version() == "7.5.4"
+    machine.close()
+
+
+def test_tcp_timeouts_free_in_flight_slots():
+    # Gateway accepting connection but never answering
+    silent = socket.create_server(("127.0.0.1", 0))
+    connection = ModbusTcpConnection("127.0.0.1", silent.getsockname()[1], timeout=0.02, max_in_flight=2)
+    transport = TcpTransport(unit=1, connection=connection)
+
+    for _ in range(5):
+        with pytest.raises(minimalmodbus.NoResponseError):
+            transport.read_registers(0, 1)
+    assert connection._pending == {}
+    connection.close()
+    silent.close()
+
+
+def test_transport_requires_register_access():
+    with pytest.raises(TypeError):
+        ModbusTransport()
+
+
+def test_plan_block_reads_bridges_small_gaps():
+    registers = [512, *range(514, 522), *range(526, 534), 223, 3498, 3506, 3507]
+
+    assert plan_block_reads(registers) == [(223, 1), (512, 1), (514, 8), (526, 8), (3498, 1), (3506, 2)]
+    assert plan_block_reads(registers, max_gap=8) == [(223, 1), (512, 22), (3498, 10)]
+    assert plan_block_reads(range(0, 300), max_count=125) == [(0, 125), (125, 125), (250, 50)]
+    assert plan_block_reads(registers, max_gap=8, boundaries=[522, 526]) == [(223, 1), (512, 10), (526, 8),
+                                                                             (3498, 10)]
+
+
+def test_link_lost_is_not_slave_error():
+    assert is_link_lost(serial.SerialException("device disconnected"))
+    assert is_link_lost(ConnectionResetError())
+    assert not is_link_lost(minimalmodbus.NoResponseError("No communication with the instrument"))
+    assert not is_link_lost(minimalmodbus.IllegalRequestError("Slave reported illegal data address"))
+
+
+class FakeInstrument:
+    def __init__(self, port, address, close_port_after_each_call=False, debug=False):
+        self.close_port_after_each_call = close_port_after_each_call
+        self.serial = serial.Serial()
+        self.closes = 0
+
+        def close():
+            self.closes += 1
+        self.serial.close = close
+
+
+class SlotCountingScheduler(TransactionScheduler):
+    def __init__(self):
+        super().__init__()
+        self.slots = 0
+
+    def acquire(self, key, lane: Lane | None = None, counted: bool = True) -> float:
+        self.slots += 1
+        return super().acquire(key, lane, counted)
+
+
+def test_serial_keep_open_is_reference_counted(monkeypatch):
+    monkeypatch.setattr(minimalmodbus, "Instrument", FakeInstrument)
+    scheduler = SlotCountingScheduler()
+    transport = ScheduledTransport(SerialTransport("COM_TEST"), scheduler, 1)
+    instrument = transport.inner.instrument
+
+    first = transport.keep_open()
+    first.__enter__()
+    with transport.keep_open():
+        assert not instrument.close_port_after_each_call
+    # Overlapping holder left, port must stay open for the first one
+    assert not instrument.close_port_after_each_call and instrument.closes == 0
+
+    first.__exit__(None, None, None)
+    assert instrument.close_port_after_each_call and instrument.closes == 1
+    # Toggling and closing happened in link slots, which are not counted as transactions
+    assert scheduler.slots == 4
+    assert scheduler.lane_stats()[Lane.CONTROL].transactions == 0
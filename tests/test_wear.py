@@ -0,0 +1,88 @@
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from conftest import make_process_line
+from enbio_wifi_machine import wear as wear_module
+from enbio_wifi_machine.common import HeatersToggleCounts
+from enbio_wifi_machine.recording import MeasurementRecorder, measurement_filepath
+from enbio_wifi_machine.wear import archive_wear, recording_wear
+
+heaters_off_row = "4,1.0,1.0,100,100,100,25,3" + ",False" * 9 + ",0,0,0,0,1\n"
+""" Recording row at 4 s with all heaters off """
+
+
+def record_heating(dirname: str, identifier: str, pattern: str) -> str:
+    """ Chamber heaters state per second from pattern of 0/1, gap row for '-' """
+    filepath = measurement_filepath(dirname, "121", 1.0, identifier)
+    with MeasurementRecorder(filepath) as recorder:
+        for proctime, state in enumerate(pattern):
+            if state == "-":
+                recorder.write_gap(proctime)
+                continue
+            pline = make_process_line(1, 100.0, 1.0)
+            pline.do_state.ch_heaters = state == "1"
+            recorder.write(proctime, pline)
+    return filepath
+
+
+def test_recording_wear_counts_edges_and_on_time(tmp_path):
+    wear = recording_wear(record_heating(str(tmp_path), "A", "1100111-10"))
+
+    assert wear["ChHeat"].switch_ons == 1
+    assert wear["ChHeat"].toggles == 3
+    # Held until next sample: 0-2, 4-7 and 8-9, time from 6 over gap row 7 to 8 is unknown
+    assert wear["ChHeat"].on_time == 5
+    assert wear["ChHeat"].recorded_time == 7
+    assert wear["ChHeat"].duty_cycle == 5 / 7
+    assert wear["Water"].toggles == 0
+
+
+def test_archive_wear_uses_cache_and_reconciles(tmp_path):
+    dirname = str(tmp_path / "measurements")
+    first = record_heating(dirname, "A", "0101")
+    second = record_heating(dirname, "B", "0011")
+    cache_path = str(tmp_path / "wear_cache.json")
+
+    report = archive_wear([first, second], cache_path, max_workers=2)
+    assert report.cached == 0 and report.totals["ChHeat"].switch_ons == 3
+
+    with open(second, "a") as f:
+        f.write(heaters_off_row)
+    report = archive_wear([first, second], cache_path, max_workers=2)
+    assert report.cached == 1
+    assert report.totals["ChHeat"].toggles == 5
+    assert report.reconcile(HeatersToggleCounts(sg_ab=0, ch_ab=10, sg_c=None)) == [("ch_ab", 10, 3), ("sg_ab", 0, 0)]
+
+    # Same named recording in other directory is counted and cached on its own
+    copy = os.path.join(str(tmp_path / "copy"), os.path.basename(first))
+    os.makedirs(os.path.dirname(copy))
+    shutil.copy(first, copy)
+    report = archive_wear([first, second, copy], cache_path, max_workers=2)
+    assert report.cached == 2 and len(report.recordings) == 3
+    assert report.totals["ChHeat"].switch_ons == 5
+
+
+def test_archive_wear_rereads_recording_grown_while_read(tmp_path, monkeypatch):
+    filepath = record_heating(str(tmp_path), "A", "0101")
+    cache_path = str(tmp_path / "wear_cache.json")
+
+    def read_then_grow(path):
+        wear = recording_wear(path)
+        with open(path, "a") as f:
+            f.write(heaters_off_row)
+        return wear
+
+    # Threads share patched function, row is appended right after worker read recording
+    monkeypatch.setattr(wear_module, "ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr(wear_module, "recording_wear", read_then_grow)
+    assert archive_wear([filepath], cache_path).totals["ChHeat"].toggles == 3
+
+    monkeypatch.undo()
+    report = archive_wear([filepath], cache_path)
+    assert report.cached == 0
+    assert report.totals["ChHeat"].toggles == 4
+
+
+def test_archive_wear_reports_missing_recording(tmp_path):
+    report = archive_wear([str(tmp_path / "missing.csv")])
+    assert list(report.failed) == [str(tmp_path / "missing.csv")]